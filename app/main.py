@@ -1,12 +1,13 @@
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
-import time
-import json
 import traceback
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
+from config.config import settings
 from internal.logger.logger import setup_logger
 from internal.api.endpoints import router as api_router
+from app.middleware import MetricsMiddleware, ProfilingMiddleware, QueryStatsMiddleware, RequestLoggingMiddleware
 
 
 app = FastAPI()
@@ -14,65 +15,14 @@ logger = setup_logger()
 
 
 app.include_router(api_router)
+app.add_middleware(RequestLoggingMiddleware, max_body_size=settings.log_body_max_size)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(QueryStatsMiddleware)
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware, directory=settings.profiling_dir, header=settings.profiling_header,
+                       sample_rate=settings.profiling_sample_rate)
 
 
-@app.middleware("http")
-async def logging_middleware(request: Request, call_next):
-    start_time = time.time()
-    response = None
-
-    async def sanitize_body(body: bytes) -> dict:
-        try:
-            data = json.loads(body)
-            for key in ["password", "token", "secret"]:
-                if key in data:
-                    data[key] = "***"
-            return data
-        except:
-            return {}
-
-    try:
-        body = await request.body()
-        cleaned_body = await sanitize_body(body)
-
-        logger.info(
-            "Request received",
-            extra={
-                "method": request.method,
-                "path": request.url.path,
-                "params": dict(request.query_params),
-                "body": cleaned_body,
-            }
-        )
-
-        response = await call_next(request)
-
-    except Exception as exc:
-        logger.critical(
-            "Unhandled exception",
-            exc_info=True,
-            extra={"traceback": traceback.format_exc()}
-        )
-        response = JSONResponse(
-            status_code=500,
-            content={"detail": "Internal server error"}
-        )
-
-    process_time = round((time.time() - start_time) * 1000, 2)
-
-    response_data = {
-        "status_code": response.status_code,
-        "process_time_ms": process_time,
-        "client_ip": request.client.host if request.client else None
-    }
-
-    if 400 <= response.status_code < 600:
-        logger.error("Request failed", extra=response_data)
-    else:
-        logger.info("Request succeeded", extra=response_data)
-
-    return response
-
 @app.exception_handler(StarletteHTTPException)
 async def http_handler(request: Request, exc: StarletteHTTPException):
     logger.error(
@@ -93,13 +43,14 @@ async def validation_handler(request: Request, exc: RequestValidationError):
     logger.warning(
         "Validation error",
         extra={
-            "errors": exc.errors(),
-            "body": exc.body.decode() if hasattr(exc, "body") else None
+            "errors": jsonable_encoder(exc.errors()),
+            # JSON bodies arrive already parsed, raw ones as bytes
+            "body": exc.body.decode() if isinstance(exc.body, bytes) else jsonable_encoder(exc.body)
         }
     )
     return JSONResponse(
         status_code=422,
-        content={"detail": "Validation error", "errors": exc.errors()}
+        content={"detail": "Validation error", "errors": jsonable_encoder(exc.errors())}
     )
 
 @app.exception_handler(Exception)
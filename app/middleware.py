@@ -0,0 +1,256 @@
+import json
+import logging
+import random
+import re
+import time
+import uuid
+from typing import List, Optional
+from urllib.parse import parse_qsl
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config.config import settings
+from internal.logger.logger import logger
+from internal.metrics.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT
+from internal.profiling.profiler import RequestProfile, current_profile, loop_profiler_lock
+from internal.storage.database import QueryStats, current_query_stats
+
+SENSITIVE_KEYS = ("password", "token", "secret")
+# A sensitive key with a string or scalar value, redacted in place on the raw text
+SENSITIVE_VALUE = re.compile(
+    rb'("(?:%s)"\s*:\s*)(?:"(?:[^"\\]|\\.)*"|[^\s,}\]{\["][^\s,}\]]*)' % b"|".join(k.encode() for k in SENSITIVE_KEYS)
+)
+SENSITIVE_NESTED = re.compile(rb'"(?:%s)"\s*:\s*[{\[]' % b"|".join(k.encode() for k in SENSITIVE_KEYS))
+BODY_METHODS = (b"POST", b"PUT", b"PATCH")
+# Incoming X-Request-ID values become file names, so only these are kept
+REQUEST_ID = re.compile(rb"[\w.-]{1,64}")
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {k: "***" if k in SENSITIVE_KEYS else redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+
+def redact_body(body: bytes):
+    # Most bodies carry no sensitive keys and are logged without parsing;
+    # only nested values under a sensitive key need a full parse
+    if SENSITIVE_NESTED.search(body):
+        try:
+            return redact(json.loads(body))
+        except ValueError:
+            return "<invalid json>"
+    return SENSITIVE_VALUE.sub(rb'\1"***"', body).decode("utf-8", "replace")
+
+
+class RequestLoggingMiddleware:
+    # Pure ASGI: the body is only read here for small JSON requests with a
+    # Content-Length under max_body_size, and the same message objects are
+    # then replayed to the app, so nothing is copied or buffered otherwise.
+
+    def __init__(self, app: ASGIApp, max_body_size: int = 4 * 1024):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    def _should_peek(self, scope: Scope) -> bool:
+        if scope["method"].encode() not in BODY_METHODS:
+            return False
+        content_type = content_length = None
+        for name, value in scope["headers"]:
+            if name == b"content-type":
+                content_type = value
+            elif name == b"content-length":
+                content_length = value
+        return (content_type is not None and content_type.startswith(b"application/json")
+                and content_length is not None and content_length.isdigit()
+                and int(content_length) <= self.max_body_size)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        if logger.isEnabledFor(logging.INFO):
+            received = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "params": dict(parse_qsl(scope["query_string"].decode("latin-1"))),
+            }
+            if self._should_peek(scope):
+                messages: List[Message] = []
+                while True:
+                    message = await receive()
+                    messages.append(message)
+                    if message["type"] != "http.request" or not message.get("more_body", False):
+                        break
+                chunks = [m.get("body", b"") for m in messages]
+                received["body"] = redact_body(chunks[0] if len(chunks) == 1 else b"".join(chunks))
+                receive = self._replay(messages, receive)
+            logger.info("Request received", extra=received)
+
+        status_code = 500
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_started
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            logger.critical("Unhandled exception", exc_info=True)
+            if response_started:
+                raise
+            status_code = 500
+            await JSONResponse(status_code=500, content={"detail": "Internal server error"})(scope, receive, send)
+
+        client = scope.get("client")
+        response_data = {
+            "status_code": status_code,
+            "process_time_ms": round((time.perf_counter() - start) * 1000, 2),
+            "client_ip": client[0] if client else None
+        }
+        query_stats = current_query_stats.get()
+        if query_stats is not None and query_stats.count:
+            response_data["db_queries"] = query_stats.count
+            response_data["db_time_ms"] = round(query_stats.seconds * 1000, 2)
+        if 400 <= status_code < 600:
+            logger.error("Request failed", extra=response_data)
+        else:
+            logger.info("Request succeeded", extra=response_data)
+
+    @staticmethod
+    def _replay(messages: List[Message], receive: Receive) -> Receive:
+        pending = iter(messages)
+
+        async def replay() -> Message:
+            message = next(pending, None)
+            return message if message is not None else await receive()
+
+        return replay
+
+
+class MetricsMiddleware:
+    # Latency per route template (not raw path, to bound the label values)
+    # and status, plus requests in flight
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the shared scope
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method,
+                                         getattr(route, "path", "<unmatched>"), str(status_code))
+            HTTP_REQUESTS_IN_FLIGHT.dec(method)
+
+
+class QueryStatsMiddleware:
+    # Gives each request a QueryStats that the engine events add to; with
+    # settings.db_stats_header, the totals so far go out as response headers
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(f"{scope['method']} {scope['path']}")
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Query-Count"] = str(stats.count)
+                headers["X-DB-Time-Ms"] = f"{stats.seconds * 1000:.3f}"
+            await send(message)
+
+        token = current_query_stats.set(stats)
+        try:
+            await self.app(scope, receive, send_wrapper if settings.db_stats_header else send)
+        finally:
+            current_query_stats.reset(token)
+
+
+class ProfilingMiddleware:
+    # Outermost, so a profile covers every other middleware, the endpoint and
+    # the storage backend. The profile is keyed by the request's X-Request-ID,
+    # or a generated id, which is returned as X-Profile-Id. Requests arriving
+    # while another one is being profiled run unprofiled, and work of other
+    # requests interleaved on the event loop shows up in the profile.
+
+    def __init__(self, app: ASGIApp, directory: str = "profiles", header: str = "X-Profile",
+                 sample_rate: float = 0.0):
+        self.app = app
+        self.directory = directory
+        self.header = header.lower().encode()
+        self.sample_rate = sample_rate
+
+    def _request_id(self, scope: Scope) -> Optional[str]:
+        wanted = self.sample_rate and random.random() < self.sample_rate
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                wanted = wanted or value.lower() not in (b"", b"0", b"false")
+            elif name == b"x-request-id" and REQUEST_ID.fullmatch(value):
+                request_id = value.decode()
+        if not wanted:
+            return None
+        return request_id or uuid.uuid4().hex
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_id = self._request_id(scope) if scope["type"] == "http" else None
+        if request_id is None or not loop_profiler_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(request_id)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = request_id
+            await send(message)
+
+        token = current_profile.set(profile)
+        try:
+            profile.profiler.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profile.profiler.disable()
+        finally:
+            current_profile.reset(token)
+            loop_profiler_lock.release()
+
+        try:
+            path = await run_in_threadpool(profile.dump, self.directory)
+        except OSError as e:
+            logger.error("Could not write profile: %s", str(e), extra={"request_id": request_id})
+            return
+        logger.info("Request profiled", extra={"request_id": request_id, "file": path})
@@ -0,0 +1,73 @@
+"""Rolls per second into a file-backed SQLite database: one POST /rolls/ per
+roll against POST /rolls/batch with a JSON array and with NDJSON.
+
+    python -m benchmarks.bench_batch --rolls 200000
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+
+from app.main import app
+from config.config import settings
+from internal.storage.database import create_db_engine, get_storage
+from internal.storage.database_storage import DatabaseStorage
+from internal.storage.migrations import migrate
+from internal.storage.sync_adapter import SyncStorageAdapter
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rolls", type=int, default=200_000)
+    parser.add_argument("--single", type=int, default=2_000, help="rolls sent one request each")
+    args = parser.parse_args()
+    logging.getLogger("api").setLevel(logging.WARNING)
+
+    rnd = random.Random(42)
+    rolls = [{"length": rnd.uniform(1, 100), "weight": rnd.uniform(1, 1000)} for _ in range(args.rolls)]
+    # Bodies are encoded up front so the client's JSON encoding is not timed
+    array_body = json.dumps(rolls)
+    ndjson_body = "\n".join(json.dumps(roll) for roll in rolls)
+
+    modes = (
+        ("POST /rolls/", args.single, lambda client: [client.post("/rolls/", json=roll) for roll in rolls[:args.single]]),
+        ("POST /rolls/batch JSON", args.rolls, lambda client: client.post(
+            "/rolls/batch", content=array_body, headers={"content-type": "application/json"})),
+        ("NDJSON", args.rolls, lambda client: client.post(
+            "/rolls/batch", content=ndjson_body, headers={"content-type": "application/x-ndjson"})),
+    )
+    print(f"chunk size {settings.batch_chunk_size}")
+    # Each mode gets an empty database: index maintenance slows down as the table grows
+    for label, count, send in modes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            migrate(engine)
+            session_factory = sessionmaker(bind=engine, autoflush=False)
+
+            def override():
+                db = session_factory()
+                try:
+                    yield SyncStorageAdapter(DatabaseStorage(db), offload=False)
+                finally:
+                    db.close()
+
+            app.dependency_overrides[get_storage] = override
+            with TestClient(app) as client:
+                started = time.perf_counter()
+                send(client)
+                elapsed = time.perf_counter() - started
+            with engine.connect() as conn:
+                assert conn.exec_driver_sql("SELECT count(*) FROM rolls").scalar() == count
+            print(f"  {label:>22}: {count / elapsed:10.0f} rolls/s ({count} rolls)")
+            app.dependency_overrides.clear()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Throughput of the API with 100 parallel clients for each way of reaching
+the database: sync storage called on the event loop (the old behaviour), sync
+storage through the thread pool, and AsyncDatabaseStorage on aiosqlite.
+"loop stall" is the longest time the event loop could not run a 1 ms timer,
+which is how long any other request (health checks, cheap reads) would wait.
+
+    python -m benchmarks.bench_concurrency --rows 200000 --clients 100
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from benchmarks.bench_stats import populate
+from internal.models.models import Base
+from internal.storage import rollup
+from internal.storage.async_database_storage import AsyncDatabaseStorage
+from internal.storage.database import async_database_url, get_storage
+from internal.storage.database_storage import DatabaseStorage
+from internal.storage.sync_adapter import SyncStorageAdapter
+
+
+def sync_storage(session_factory, offload):
+    def override():
+        db = session_factory()
+        try:
+            yield SyncStorageAdapter(DatabaseStorage(db), offload=offload)
+        finally:
+            db.close()
+    return override
+
+
+def async_storage(session_factory):
+    async def override():
+        async with session_factory() as session:
+            yield AsyncDatabaseStorage(session)
+    return override
+
+
+async def watch_loop(stalls, stop):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        stalls.append(time.perf_counter() - started - 0.001)
+
+
+async def run_clients(clients, requests_per_client, paths):
+    latencies = []
+    stalls = []
+    stop = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(n):
+            for i in range(requests_per_client):
+                path = paths[(n + i) % len(paths)]
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, (path, response.text)
+
+        watcher = asyncio.create_task(watch_loop(stalls, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await watcher
+    latencies.sort()
+    p50, p99 = latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+    return len(latencies) / elapsed, p50, p99, max(stalls) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    args = parser.parse_args()
+    logging.getLogger("api").setLevel(logging.WARNING)
+
+    start = datetime(2024, 1, 1)
+    paths = [
+        f"/rolls/stats/?start_date={start + timedelta(days=100)}&end_date={start + timedelta(days=130, hours=5)}",
+        "/rolls/?weight_range=500,501",
+        f"/rolls/inventory?at={start + timedelta(days=200)}",
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        # One connection per client: with the default 5 + 10 pool, sync storage
+        # on the event loop blocks on checkout while the holders cannot run
+        pool = {"pool_size": args.clients, "max_overflow": 0}
+        engine = create_engine(url, connect_args={"check_same_thread": False}, **pool)
+        Base.metadata.create_all(bind=engine)
+        populate(engine, args.rows, start)
+        session_factory = sessionmaker(bind=engine, autoflush=False)
+        with session_factory() as db:
+            rollup.backfill(db)
+        async_engine = create_async_engine(async_database_url(url), **pool)
+        async_session_factory = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+        print(f"{args.rows} rows, {args.clients} clients x {args.requests} requests")
+        for label, override in (
+            ("sync on event loop", sync_storage(session_factory, offload=False)),
+            ("sync in thread pool", sync_storage(session_factory, offload=True)),
+            ("async (aiosqlite)", async_storage(async_session_factory)),
+        ):
+            app.dependency_overrides[get_storage] = override
+            asyncio.run(run_clients(args.clients, 1, paths))
+            throughput, p50, p99, stall = asyncio.run(run_clients(args.clients, args.requests, paths))
+            print(f"  {label:>20}: {throughput:8.1f} req/s, p50 {p50:8.1f} ms, p99 {p99:8.1f} ms, "
+                  f"loop stall {stall:8.1f} ms")
+        app.dependency_overrides.clear()
+        asyncio.run(async_engine.dispose())
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""POST /rolls/ throughput with many concurrent creators, with each create
+committed on its own (write_coalesce_ms=0) and with group commit, for the
+sync backend in the thread pool and the async backend, and the same creates
+made straight on AsyncDatabaseStorage without the HTTP stack.
+
+    python -m benchmarks.bench_group_commit --clients 200 --requests 10 --synchronous FULL
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+import httpx
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from benchmarks.bench_concurrency import async_storage, sync_storage
+from config.config import settings
+from internal.models.schemas import RollCreate
+from internal.storage.async_database_storage import AsyncDatabaseStorage
+from internal.storage.database import create_async_db_engine, create_db_engine, get_storage
+from internal.storage.migrations import migrate
+
+
+async def run_clients(clients, requests_per_client):
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(n):
+            for i in range(requests_per_client):
+                started = time.perf_counter()
+                response = await client.post("/rolls/", json={"length": n + 1, "weight": i + 1})
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+                assert response.json()["length"] == n + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+async def run_storage(session_factory, clients, requests_per_client):
+    # Without the HTTP stack in between, lone commits can outwait SQLite's busy timeout
+    failed = 0
+
+    async def worker(n):
+        nonlocal failed
+        for i in range(requests_per_client):
+            async with session_factory() as db:
+                try:
+                    await AsyncDatabaseStorage(db).create_roll(RollCreate(length=n + 1, weight=i + 1))
+                except OperationalError:
+                    failed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(clients)))
+    return (clients * requests_per_client - failed) / (time.perf_counter() - started), failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    parser.add_argument("--synchronous", default="FULL", help="SQLite synchronous pragma; FULL fsyncs every commit")
+    parser.add_argument("--window-ms", type=float, default=settings.write_coalesce_ms)
+    args = parser.parse_args()
+    logging.getLogger("api").setLevel(logging.ERROR)
+    settings.sqlite_synchronous = args.synchronous
+    settings.slow_query_ms = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_db_engine(url)
+        migrate(engine)
+        async_engine = create_async_db_engine(url)
+        async_session_factory = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+        backends = (
+            ("sync in thread pool", sync_storage(sessionmaker(bind=engine, autoflush=False), offload=True)),
+            ("async (aiosqlite)", async_storage(async_session_factory)),
+        )
+        print(f"{args.clients} clients x {args.requests} creates, synchronous={args.synchronous}")
+        for label, override in backends:
+            app.dependency_overrides[get_storage] = override
+            for window in (0.0, args.window_ms):
+                settings.write_coalesce_ms = window
+                throughput, p50, p99 = asyncio.run(run_clients(args.clients, args.requests))
+                print(f"  {label:>20}, window {window:4.1f} ms: {throughput:8.1f} creates/s, "
+                      f"p50 {p50:7.1f} ms, p99 {p99:7.1f} ms")
+        app.dependency_overrides.clear()
+        for window in (0.0, args.window_ms):
+            settings.write_coalesce_ms = window
+            # A new loop per run, and the pool's connections belong to the last one
+            asyncio.run(async_engine.dispose())
+            throughput, failed = asyncio.run(run_storage(async_session_factory, args.clients, args.requests))
+            print(f"  {'storage only':>20}, window {window:4.1f} ms: {throughput:8.1f} creates/s, "
+                  f"{failed} failed with database is locked")
+        asyncio.run(async_engine.dispose())
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Memory and latency of the columnar InMemoryStorage against the old list of
+pydantic models.
+
+    python -m benchmarks.bench_in_memory_storage --sizes 1000000,10000000
+"""
+import argparse
+import gc
+import logging
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta, UTC
+
+from internal.models.schemas import RollCreate, RollResponse
+from internal.storage.in_memory_storage import InMemoryStorage
+
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def traced(fn):
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def fill_columnar(n):
+    rnd = random.Random(42)
+    storage = InMemoryStorage()
+    for _ in range(n):
+        storage.create_roll(RollCreate(length=rnd.uniform(1, 100), weight=rnd.uniform(1, 1000)))
+    return storage
+
+
+def fill_legacy(n):
+    rnd = random.Random(42)
+    rolls = []
+    for i in range(n):
+        rolls.append(RollResponse(
+            id=i + 1, length=rnd.uniform(1, 100), weight=rnd.uniform(1, 1000),
+            added_at=datetime.now(UTC), removed_at=None
+        ))
+    return rolls
+
+
+def legacy_stats(rolls, start, end):
+    filtered = [r for r in rolls if start <= r.added_at <= end]
+    lengths = [r.length for r in filtered]
+    weights = [r.weight for r in filtered]
+    return (len(filtered), sum(lengths) / len(lengths), sum(weights) / len(weights),
+            max(lengths), min(lengths), max(weights), min(weights), sum(weights))
+
+
+def run(n, legacy):
+    now = datetime.now(UTC)
+    window = (now - timedelta(days=1), now + timedelta(days=1))
+    filters = {"weight_range": "500,500.5"}
+
+    storage, columnar_bytes = traced(lambda: fill_columnar(n))
+    print(f"{n:>10} columnar  {columnar_bytes / n:8.1f} B/roll"
+          f"  weight filter {best_of(lambda: storage.get_rolls(filters)):9.2f} ms"
+          f"  stats {best_of(lambda: storage.get_stats(*window), 3):9.2f} ms")
+    del storage
+
+    if not legacy:
+        return
+    rolls, legacy_bytes = traced(lambda: fill_legacy(n))
+    print(f"{n:>10} legacy    {legacy_bytes / n:8.1f} B/roll"
+          f"  weight filter {best_of(lambda: [r for r in rolls.copy() if 500 <= r.weight <= 500.5]):9.2f} ms"
+          f"  stats {best_of(lambda: legacy_stats(rolls, *window), 3):9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000000,10000000")
+    parser.add_argument("--legacy-max", type=int, default=1_000_000,
+                        help="skip the list-of-models baseline above this size")
+    args = parser.parse_args()
+    logging.getLogger("api").setLevel(logging.WARNING)
+    for n in map(int, args.sizes.split(",")):
+        run(n, n <= args.legacy_max)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Throughput of InMemoryStorage with writer and reader threads running at
+once. Writers serialize on the write lock; readers work from the published
+version without locking, so adding readers should not slow writers down
+beyond their share of the GIL.
+
+    python -m benchmarks.bench_in_memory_threads --rows 1000000 --writers 2 --readers 0 1 4 8
+"""
+import argparse
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta, UTC
+
+from internal.models.schemas import RollCreate
+from internal.storage.in_memory_storage import InMemoryStorage
+
+BATCH = 100_000
+
+
+def run(storage, writers, readers, seconds):
+    stop = threading.Event()
+    counts = {"write": [0] * writers, "read": [0] * readers}
+    now = datetime.now(UTC)
+
+    def write(i):
+        rnd = random.Random(i)
+        while not stop.is_set():
+            if rnd.random() < 0.8:
+                storage.create_roll(RollCreate.model_construct(length=rnd.uniform(1, 100), weight=rnd.uniform(1, 1000)))
+            else:
+                storage.delete_roll(rnd.randint(1, len(storage)))
+            counts["write"][i] += 1
+
+    def read(i):
+        rnd = random.Random(-i)
+        while not stop.is_set():
+            low = rnd.uniform(1, 999)
+            storage.get_rolls({"weight_range": f"{low},{low + 1}"}, limit=100)
+            storage.get_inventory(now)
+            counts["read"][i] += 2
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=read, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts["write"]) / seconds, sum(counts["read"]) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, nargs="+", default=[0, 1, 4, 8])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    logging.getLogger("api").setLevel(logging.ERROR)
+    rnd = random.Random(42)
+
+    storage = InMemoryStorage()
+    for _ in range(args.rows // BATCH):
+        storage.create_rolls([RollCreate.model_construct(length=rnd.uniform(1, 100), weight=rnd.uniform(1, 1000))
+                              for _ in range(BATCH)])
+    storage.get_stats(datetime.now(UTC) - timedelta(days=1), datetime.now(UTC))
+    print(f"{len(storage):,} rolls, {args.writers} writer threads")
+    for readers in args.readers:
+        writes, reads = run(storage, args.writers, readers, args.seconds)
+        print(f"{readers:2d} readers: {writes:9,.0f} writes/s {reads:9,.0f} reads/s")
+
+
+if __name__ == "__main__":
+    main()
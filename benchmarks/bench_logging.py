@@ -0,0 +1,71 @@
+"""Time a request thread spends per log record with the handlers from
+instance/logging.ini called inline, against the DroppingQueueHandler and
+QueueListener setup. stdout goes to /dev/null and the log file to a
+temporary directory.
+
+    python -m benchmarks.bench_logging --records 20000
+"""
+import argparse
+import logging
+import os
+import queue
+import sys
+import tempfile
+import time
+
+from pythonjsonlogger.jsonlogger import JsonFormatter
+
+from internal.logger.handlers import DroppingQueueHandler, LogListener, ReopeningRotatingFileHandler
+
+FORMAT = "%(asctime)s %(levelname)s %(message)s %(module)s %(funcName)s"
+
+
+def handlers(directory, stream):
+    console = logging.StreamHandler(stream)
+    console.setFormatter(logging.Formatter(FORMAT))
+    file = ReopeningRotatingFileHandler(os.path.join(directory, "api.log"), "a", 5242880, 3, "utf-8")
+    file.setFormatter(JsonFormatter(FORMAT, json_ensure_ascii=False))
+    return [console, file]
+
+
+def emit(log, records):
+    started = time.perf_counter()
+    for i in range(records):
+        log.info("Fetching rolls", extra={"filters": {"weight_range": "1,10"}, "after_id": i, "limit": 100})
+        log.debug("Found %d rolls", i)
+    return (time.perf_counter() - started) / (2 * records) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--queue-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    log = logging.getLogger("bench")
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        inline = handlers(tmp, devnull)
+        log.handlers = inline
+        print(f"inline handlers:  {emit(log, args.records):6.1f} us/record on the request thread")
+        for h in inline:
+            h.close()
+
+        q = queue.Queue(args.queue_size)
+        listener = LogListener(q, *handlers(tmp, devnull), respect_handler_level=True)
+        handler = DroppingQueueHandler(q)
+        log.handlers = [handler]
+        listener.start()
+        caller = emit(log, args.records)
+        started = time.perf_counter()
+        listener.stop()
+        drain = (time.perf_counter() - started) * 1000
+        print(f"queue + listener: {caller:6.1f} us/record on the request thread, "
+              f"{handler.dropped} dropped, {drain:.0f} ms to drain the rest")
+        for h in listener.handlers:
+            h.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""Per-request overhead of the request logging middleware: no middleware,
+the original @app.middleware("http") version and RequestLoggingMiddleware.
+A minimal app is called as a bare ASGI callable, and the "api" logger goes
+to a NullHandler, so the numbers are the middleware's own cost rather than
+the endpoint's or the log output's.
+
+    python -m benchmarks.bench_middleware --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+import traceback
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.middleware import RequestLoggingMiddleware
+
+
+def legacy_logging_middleware(logger):
+    # app/main.py before the pure ASGI rewrite
+    async def logging_middleware(request: Request, call_next):
+        start_time = time.time()
+
+        async def sanitize_body(body: bytes) -> dict:
+            try:
+                data = json.loads(body)
+                for key in ["password", "token", "secret"]:
+                    if key in data:
+                        data[key] = "***"
+                return data
+            except:
+                return {}
+
+        try:
+            body = await request.body()
+            cleaned_body = await sanitize_body(body)
+            logger.info("Request received", extra={
+                "method": request.method, "path": request.url.path,
+                "params": dict(request.query_params), "body": cleaned_body,
+            })
+            response = await call_next(request)
+        except Exception:
+            logger.critical("Unhandled exception", exc_info=True, extra={"traceback": traceback.format_exc()})
+            response = JSONResponse(status_code=500, content={"detail": "Internal server error"})
+        process_time = round((time.time() - start_time) * 1000, 2)
+        logger.info("Request succeeded", extra={
+            "status_code": response.status_code, "process_time_ms": process_time,
+            "client_ip": request.client.host if request.client else None
+        })
+        return response
+
+    return logging_middleware
+
+
+def make_app(mode):
+    app = FastAPI()
+
+    @app.get("/rolls/")
+    async def get_rolls(weight_range: str = None):
+        return []
+
+    @app.post("/rolls/batch")
+    async def create_rolls(request: Request):
+        count = 0
+        async for chunk in request.stream():
+            count += len(chunk)
+        return {"count": count}
+
+    if mode == "legacy":
+        app.middleware("http")(legacy_logging_middleware(logging.getLogger("api")))
+    elif mode == "asgi":
+        app.add_middleware(RequestLoggingMiddleware)
+    return app
+
+
+async def call(app, method, path, query, body, content_type):
+    chunks = [body[i:i + 64 * 1024] for i in range(0, len(body), 64 * 1024)] or [b""]
+    messages = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    scope = {
+        "type": "http", "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": query,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+    pending = iter(messages)
+
+    async def receive():
+        return next(pending, {"type": "http.disconnect"})
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def run(app, request, count, rounds=5):
+    for _ in range(50):
+        await call(app, *request)
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(count):
+            await call(app, *request)
+        best = min(best, (time.perf_counter() - started) / count * 1e6)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5_000)
+    args = parser.parse_args()
+    logger = logging.getLogger("api")
+    logger.handlers = [logging.NullHandler()]
+
+    rolls = [{"length": i % 100 + 1, "weight": i % 1000 + 1} for i in range(20_000)]
+    requests = {
+        "GET with filter": ("GET", "/rolls/", b"weight_range=1,10", b"", b"application/json"),
+        "POST small JSON": ("POST", "/rolls/batch", b"", json.dumps(rolls[:3]).encode(), b"application/json"),
+        "POST 0.7 MB JSON": ("POST", "/rolls/batch", b"", json.dumps(rolls).encode(), b"application/json"),
+    }
+    apps = {mode: make_app(mode) for mode in ("none", "legacy", "asgi")}
+    for name, request in requests.items():
+        count = args.requests // 5 if len(request[3]) < 1024 else args.requests // 100
+        timings = {mode: asyncio.run(run(app, request, count)) for mode, app in apps.items()}
+        overheads = ", ".join(f"{mode} +{timings[mode] - timings['none']:7.1f} us" for mode in ("legacy", "asgi"))
+        print(f"{name:>17}: none {timings['none']:8.1f} us/request; {overheads}")
+
+
+if __name__ == "__main__":
+    main()
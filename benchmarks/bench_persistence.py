@@ -0,0 +1,78 @@
+"""Write latency of a journaled InMemoryStorage, with and without a snapshot
+being written in the background, and the time to restart from a snapshot
+plus a journal tail.
+
+    python -m benchmarks.bench_persistence --rows 10000000
+"""
+import argparse
+import gc
+import logging
+import random
+import statistics
+import tempfile
+import time
+
+from internal.models.schemas import RollCreate
+from internal.storage.in_memory_storage import InMemoryStorage
+
+BATCH = 100_000
+
+
+def latencies(storage, rnd, count):
+    samples = []
+    for _ in range(count):
+        roll = RollCreate.model_construct(length=rnd.uniform(1, 100), weight=rnd.uniform(1, 1000))
+        started = time.perf_counter()
+        storage.create_roll(roll)
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return f"p50 {statistics.median(samples):5.1f} us, p99 {samples[int(len(samples) * 0.99)]:6.1f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--tail", type=int, default=100_000, help="single-roll writes left in the journal")
+    args = parser.parse_args()
+    logging.getLogger("api").setLevel(logging.WARNING)
+    rnd = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"memory only:       {latencies(InMemoryStorage(), rnd, 20_000)} per create_roll")
+
+        storage = InMemoryStorage()
+        # Snapshots are started by hand below
+        storage.enable_persistence(directory, snapshot_every=2 ** 62)
+        started = time.perf_counter()
+        for _ in range(args.rows // BATCH):
+            storage.create_rolls([RollCreate.model_construct(length=rnd.uniform(1, 100), weight=rnd.uniform(1, 1000))
+                                  for _ in range(BATCH)])
+        storage.remove_rolls(ids=rnd.sample(range(1, args.rows + 1), args.rows // 10))
+        # Builds the sorted index runs, which the snapshot keeps
+        storage.get_rolls({"weight_range": "1,2", "length_range": "1,2"})
+        print(f"loaded {len(storage):,} rolls in {time.perf_counter() - started:.1f} s")
+
+        print(f"journaled:         {latencies(storage, rnd, 20_000)} per create_roll")
+        started = time.perf_counter()
+        storage._start_snapshot()
+        during = latencies(storage, rnd, 20_000)
+        storage._snapshot_thread.join()
+        print(f"during a snapshot: {during} per create_roll, "
+              f"snapshot took {time.perf_counter() - started:.1f} s")
+
+        for _ in range(args.tail):
+            storage.create_roll(RollCreate.model_construct(length=rnd.uniform(1, 100), weight=rnd.uniform(1, 1000)))
+        storage.close()
+        del storage
+        gc.collect()
+
+        started = time.perf_counter()
+        restored = InMemoryStorage()
+        restored.enable_persistence(directory)
+        print(f"restart:           {time.perf_counter() - started:.2f} s for {len(restored):,} rolls, "
+              f"{args.tail + 20_000:,} of them replayed from the journal")
+        restored.close()
+
+
+if __name__ == "__main__":
+    main()
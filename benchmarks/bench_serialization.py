@@ -0,0 +1,93 @@
+"""Rows/s encoded to JSON bytes for a GET /rolls/ result: the previous path
+(ORM entities or models validated by response_model, then dumped) against
+encode_rolls over column Rows and in-memory RollRecords. Database fetch
+time is excluded; in memory, building the per-row objects is included.
+
+    python -m benchmarks.bench_serialization --rows 100000
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bench_stats import populate
+from internal.models.models import Roll
+from internal.models.schemas import RollCreate, RollResponse
+from internal.models.serialization import encode_rolls
+from internal.storage import crud
+from internal.storage.database import create_db_engine
+from internal.storage.in_memory_storage import InMemoryStorage
+from internal.storage.migrations import migrate
+
+response_adapter = TypeAdapter(list[RollResponse])
+
+
+def response_model_path(rolls):
+    # What FastAPI does for response_model=list[RollResponse]: validate, then dump
+    return response_adapter.dump_json(response_adapter.validate_python(rolls, from_attributes=True))
+
+
+def measure(fn, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn(rows)
+        best = min(best, time.perf_counter() - started)
+    return len(rows) / best, body
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    logging.getLogger("api").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        migrate(engine)
+        populate(engine, args.rows, datetime(2024, 1, 1))
+        db = sessionmaker(bind=engine)()
+        entities = db.query(Roll).order_by(Roll.id).all()
+        rows = crud.get_rolls(db, {})
+
+        storage = InMemoryStorage()
+        storage.create_rolls([RollCreate(length=r.length, weight=r.weight) for r in rows])
+        for row in range(0, len(storage), 5):
+            storage.delete_roll(row + 1)
+
+        cases = [
+            ("database: ORM entities, response_model", response_model_path, entities),
+            ("database: ORM entities, stdlib json",
+             lambda rolls: json.dumps(jsonable_encoder(
+                 [RollResponse.model_validate(r, from_attributes=True) for r in rolls])).encode(),
+             entities),
+            ("database: column Rows, encode_rolls", encode_rolls, rows),
+            # In memory the per-row objects are built from the columns on every request
+            ("in_memory: RollResponse models, response_model",
+             lambda rows: response_model_path([storage._to_response(r) for r in rows]), range(len(storage))),
+            ("in_memory: RollRecords, encode_rolls",
+             lambda rows: encode_rolls([storage._to_record(r) for r in rows]), range(len(storage))),
+        ]
+        print(f"{args.rows} rows")
+        bodies = {}
+        for name, fn, data in cases:
+            rate, body = measure(fn, data, args.repeat)
+            bodies[name] = body
+            print(f"  {name:<48} {rate:>12,.0f} rows/s")
+        assert bodies[cases[0][0]] == bodies[cases[2][0]]
+        assert bodies[cases[3][0]] == bodies[cases[4][0]]
+
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Read throughput of SharedInMemoryStorage as worker processes are added.
+Every worker maps the same segment and runs filtered get_rolls pages and
+get_stats calls for a fixed time without taking a lock; the total should
+grow with the worker count up to the number of cores.
+
+    python -m benchmarks.bench_shared_memory --rows 1000000 --workers 1 2 4 8
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, UTC
+
+from internal.models.schemas import RollCreate
+from internal.storage.shared_memory import SharedColumns, SharedInMemoryStorage
+
+BATCH = 100_000
+
+
+def read(name, rows, seconds, start, results):
+    logging.getLogger("api").setLevel(logging.WARNING)
+    storage = SharedInMemoryStorage(SharedColumns(name, rows))
+    rnd = random.Random(os.getpid())
+    now = datetime.now(UTC)
+    window = (now - timedelta(days=1), now + timedelta(days=1))
+    # Builds this worker's indexes before the clock starts
+    storage.get_rolls({"weight_range": "1,2"}, limit=100)
+    start.wait()
+    calls, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        low = rnd.uniform(1, 999)
+        storage.get_rolls({"weight_range": f"{low},{low + 1}"}, limit=100)
+        storage.get_stats(*window)
+        calls += 2
+    results.put(calls)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    logging.getLogger("api").setLevel(logging.WARNING)
+    rnd = random.Random(42)
+    name = f"rolls-bench-{uuid.uuid4().hex[:8]}"
+    columns = SharedColumns(name, args.rows)
+    try:
+        storage = SharedInMemoryStorage(columns)
+        for _ in range(args.rows // BATCH):
+            storage.create_rolls([RollCreate.model_construct(length=rnd.uniform(1, 100), weight=rnd.uniform(1, 1000))
+                                  for _ in range(BATCH)])
+        storage.remove_rolls(ids=rnd.sample(range(1, args.rows + 1), args.rows // 10))
+        print(f"{len(storage):,} rolls in {columns.path}, {os.cpu_count()} CPUs")
+
+        context = multiprocessing.get_context("spawn")
+        for workers in args.workers:
+            start, results = context.Barrier(workers + 1), context.Queue()
+            processes = [context.Process(target=read, args=(name, args.rows, args.seconds, start, results))
+                         for _ in range(workers)]
+            for process in processes:
+                process.start()
+            start.wait()
+            calls = sum(results.get() for _ in processes)
+            for process in processes:
+                process.join()
+            print(f"{workers:2d} workers: {calls / args.seconds:9,.0f} reads/s, "
+                  f"{calls / args.seconds / workers:8,.0f} per worker")
+    finally:
+        columns.unlink()
+
+
+if __name__ == "__main__":
+    main()
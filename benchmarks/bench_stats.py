@@ -0,0 +1,105 @@
+"""Latency of crud.get_stats against the original multi-statement version.
+The rollup table is backfilled before measuring.
+
+    python -m benchmarks.bench_stats --rows 1000000
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, create_engine, event, func, insert
+from sqlalchemy.orm import sessionmaker
+
+from internal.models.models import Base, Roll
+from internal.storage import crud, rollup
+
+
+def legacy_get_stats(db, start_date, end_date):
+    # crud.get_stats before the single-statement rewrite
+    query = db.query(Roll).filter(and_(
+        Roll.added_at <= end_date,
+        (Roll.removed_at >= start_date) | (Roll.removed_at.is_(None))
+    ))
+    total_added = query.filter(Roll.added_at.between(start_date, end_date)).count()
+    total_removed = query.filter(Roll.removed_at.between(start_date, end_date)).count()
+    stats = db.query(
+        func.avg(Roll.length), func.avg(Roll.weight), func.max(Roll.length), func.min(Roll.length),
+        func.max(Roll.weight), func.min(Roll.weight), func.sum(Roll.weight)
+    ).first()
+    time_diff_subq = db.query(
+        func.julianday(Roll.removed_at) - func.julianday(Roll.added_at)
+    ).filter(Roll.removed_at.is_not(None)).subquery()
+    max_time_diff = db.query(func.max(time_diff_subq.c[0])).scalar()
+    min_time_diff = db.query(func.min(time_diff_subq.c[0])).scalar()
+    daily_stats = db.query(
+        func.date(Roll.added_at), func.count(Roll.id), func.sum(Roll.weight)
+    ).group_by(func.date(Roll.added_at)).all()
+    return total_added, total_removed, stats, max_time_diff, min_time_diff, len(daily_stats)
+
+
+def populate(engine, rows, start):
+    rnd = random.Random(42)
+    step = timedelta(days=365) / rows
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            added_at = start + i * step
+            removed_at = added_at + timedelta(hours=rnd.uniform(1, 24 * 60)) if rnd.random() < 0.8 else None
+            batch.append({"length": rnd.uniform(1, 100), "weight": rnd.uniform(1, 1000),
+                          "added_at": added_at, "removed_at": removed_at})
+            if len(batch) == 50_000:
+                conn.execute(insert(Roll), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Roll), batch)
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings), sorted(timings)[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    logging.getLogger("api").setLevel(logging.WARNING)
+
+    start = datetime(2024, 1, 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        populate(engine, args.rows, start)
+        db = sessionmaker(bind=engine)()
+        rollup.backfill(db)
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *a: statements.append(1))
+
+        windows = {
+            "1 day": (start + timedelta(days=100), start + timedelta(days=101)),
+            "30 days": (start + timedelta(days=100), start + timedelta(days=130)),
+            "full year": (start, start + timedelta(days=366)),
+        }
+        print(f"{args.rows} rows")
+        for name, window in windows.items():
+            for label, fn in (("before", legacy_get_stats), ("after", crud.get_stats)):
+                statements.clear()
+                fn(db, *window)
+                count = len(statements)
+                best, median = measure(lambda: fn(db, *window), args.repeat)
+                print(f"  {name:>9} {label:>6}: {count} statements, best {best:8.1f} ms, median {median:8.1f} ms")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Peak memory and time of GET /rolls/ as one JSON array against the NDJSON
+stream, for growing result sizes. The app is called as a bare ASGI callable
+whose send() discards the body, so the peak is the server side only (test
+clients buffer the whole response).
+
+    python -m benchmarks.bench_streaming --sizes 10000,100000,500000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from benchmarks.bench_stats import populate
+from internal.storage.database import create_db_engine, get_storage
+from internal.storage.database_storage import DatabaseStorage
+from internal.storage.migrations import migrate
+from internal.storage.sync_adapter import SyncStorageAdapter
+
+
+async def fetch(headers, rows):
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/rolls/", "raw_path": b"/rolls/", "root_path": "",
+        "query_string": f"id_range=1,{rows}".encode(), "headers": headers,
+        "server": ("bench", 80), "client": ("127.0.0.1", 1),
+    }
+    size = 0
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            # Later calls wait for a disconnect that never comes
+            await asyncio.Event().wait()
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,500000")
+    args = parser.parse_args()
+    logging.getLogger("api").setLevel(logging.WARNING)
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        migrate(engine)
+        populate(engine, max(sizes), datetime(2024, 1, 1))
+        session_factory = sessionmaker(bind=engine, autoflush=False)
+
+        def override():
+            db = session_factory()
+            try:
+                yield SyncStorageAdapter(DatabaseStorage(db))
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_storage] = override
+        for rows in sizes:
+            for label, headers in (("JSON", []), ("NDJSON", [(b"accept", b"application/x-ndjson")])):
+                elapsed, peak, size = asyncio.run(fetch(headers, rows))
+                print(f"  {rows:>8} rows {label:>6}: {elapsed:7.2f} s, peak {peak / 2 ** 20:8.1f} MiB, "
+                      f"body {size / 2 ** 20:7.1f} MiB")
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,70 @@ logger = logging.getLogger("api")
 class Settings(BaseSettings):
     database_url: str = "sqlite:///./default.db"
     storage_type: str = "in_memory"
+    # Rolls per transaction in POST /rolls/batch
+    batch_chunk_size: int = 5_000
+
+    # get_stats results kept per backend, 0 disables. Writes made by other
+    # processes are not seen, so use 0 when several workers share a database
+    stats_cache_size: int = 128
+    # ETags on GET /rolls/ and /rolls/stats/ come from the same per-process
+    # write version and have the same limitation
+    etags_enabled: bool = True
+
+    # With a directory, InMemoryStorage journals every write there and is
+    # restored from it on start. The journal is fsynced every
+    # journal_fsync_interval_ms, and a snapshot is written in the background
+    # every snapshot_every journaled rolls, which bounds the replay on start.
+    in_memory_data_dir: str = ""
+    journal_fsync_interval_ms: float = 10.0
+    snapshot_every: int = 100_000
+    # With a name, the in-memory rolls live in /dev/shm/<name>, shared by
+    # every worker process (uvicorn --workers) instead of one copy each.
+    # The segment holds at most in_memory_shared_capacity rolls, is sized by
+    # whichever worker creates it, and stays until removed. Not combinable
+    # with in_memory_data_dir.
+    in_memory_shared_name: str = ""
+    in_memory_shared_capacity: int = 10_000_000
+
+    # Single-roll creates on the database backends that arrive while another
+    # group is committing are gathered for up to write_coalesce_ms, or until
+    # write_coalesce_max_rolls have arrived, and committed in one
+    # transaction; a create with nothing in flight commits at once, and 0
+    # commits each on its own
+    write_coalesce_ms: float = 2.0
+    write_coalesce_max_rolls: int = 200
+
+    # Connection pool, ignored for in-memory SQLite which has a single connection
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 3600
+
+    # Applied to every new SQLite connection
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size: int = -64 * 1024  # negative means KiB
+
+    # Statements at least this slow are logged with their query plan; 0 disables
+    slow_query_ms: float = 100.0
+    # Adds X-DB-Query-Count and X-DB-Time-Ms to every response
+    db_stats_header: bool = False
+
+    # Requests sending profiling_header, or a profiling_sample_rate share of
+    # all requests, are run under cProfile and written to
+    # <profiling_dir>/<request id>.prof. Nothing is installed unless enabled.
+    profiling_enabled: bool = False
+    profiling_header: str = "X-Profile"
+    profiling_sample_rate: float = 0.0
+    profiling_dir: str = "profiles"
+
+    # Larger or non-JSON request bodies are not read for the request log
+    log_body_max_size: int = 4 * 1024
+    # Records waiting for the background log writer; once half full only
+    # one in log_debug_sample_rate DEBUG records is kept
+    log_queue_size: int = 10_000
+    log_debug_sample_rate: int = 10
 
     model_config = SettingsConfigDict(
         env_file=".env",
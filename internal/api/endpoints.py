@@ -1,43 +1,176 @@
-from fastapi import APIRouter, Depends, HTTPException
-from datetime import datetime
-from typing import Optional
-from ..logger.logger import logger
+from hashlib import blake2b
+from urllib.parse import parse_qsl, urlencode
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta
+from pydantic import TypeAdapter, ValidationError
+from typing import AsyncIterator, List, Optional, Sequence
+from config.config import settings
+from ..logger.logger import lazy, logger
+from ..metrics.metrics import CONTENT_TYPE, render
 from ..models import schemas
+from ..models.serialization import (ROLL_FIELDS, encode_roll_lines, encode_rolls, encode_stats, encode_stats_series,
+                                   parse_fields)
 from ..storage.database import get_storage
-from ..storage.storage import StorageInterface
+from ..storage.storage import AsyncStorageInterface
 
 router = APIRouter()
 
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl")
+MAX_PAGE_SIZE = 10_000
+STREAM_BUFFER_SIZE = 64 * 1024
+roll_list_adapter = TypeAdapter(list[schemas.RollCreate])
+
+
+async def ndjson_rolls(first, rest: AsyncIterator, fields: Sequence[str] = ROLL_FIELDS) -> AsyncIterator[bytes]:
+    # Rows are written as they are fetched, buffered only up to STREAM_BUFFER_SIZE
+    buffer = bytearray()
+    roll = first
+    while roll is not None:
+        buffer += encode_roll_lines((roll,), fields)
+        if len(buffer) >= STREAM_BUFFER_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+        roll = await anext(rest, None)
+    if buffer:
+        yield bytes(buffer)
+
+
+def resource_etag(request: Request, storage: AsyncStorageInterface, variant: str = "") -> Optional[str]:
+    # Same write version, same parameters and representation: same body
+    version = storage.write_version()
+    if version is None or not settings.etags_enabled:
+        return None
+    query = urlencode(sorted(parse_qsl(request.url.query, keep_blank_values=True)))
+    digest = blake2b(f"{request.url.path}?{query}#{variant}".encode(), digest_size=8).hexdigest()
+    return f'"{version}-{digest}"'
+
+
+def not_modified(request: Request, etag: Optional[str]) -> Optional[Response]:
+    if_none_match = request.headers.get("if-none-match")
+    if etag is None or not if_none_match:
+        return None
+    if any(tag.strip() in ("*", etag, f"W/{etag}") for tag in if_none_match.split(",")):
+        logger.debug("Not modified", extra={"etag": etag})
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept"})
+    return None
+
+
+def cache_headers(etag: Optional[str]) -> dict:
+    return {"ETag": etag, "Vary": "Accept"} if etag is not None else {}
+
+
+async def json_chunks(request: Request, chunk_size: int) -> AsyncIterator[List[schemas.RollCreate]]:
+    # The whole array is validated before the first chunk is stored
+    rolls = roll_list_adapter.validate_json(await request.body())
+    for start in range(0, len(rolls), chunk_size):
+        yield rolls[start:start + chunk_size]
+
+
+async def ndjson_chunks(request: Request, chunk_size: int) -> AsyncIterator[List[schemas.RollCreate]]:
+    # One RollCreate per line; chunks are stored while the rest is still arriving
+    chunk, pending = [], b""
+    async for data in request.stream():
+        *lines, pending = (pending + data).split(b"\n")
+        for line in lines:
+            if line.strip():
+                chunk.append(schemas.RollCreate.model_validate_json(line))
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+    if pending.strip():
+        chunk.append(schemas.RollCreate.model_validate_json(pending))
+    if chunk:
+        yield chunk
+
+
 @router.post("/rolls/", response_model=schemas.RollResponse)
 async def create_roll(
     roll: schemas.RollCreate,
-    storage: StorageInterface = Depends(get_storage)
+    storage: AsyncStorageInterface = Depends(get_storage)
 ):
-    logger.info("Creating roll", extra={"data": roll.model_dump()})
+    logger.info("Creating roll", extra={"data": lazy(roll.model_dump)})
     try:
-        result = storage.create_roll(roll)
+        result = await storage.create_roll(roll)
         logger.debug("Roll created", extra={"roll_id": result.id})
         return result
     except Exception as e:
         logger.error("Roll creation failed", exc_info=True)
         raise HTTPException(500, "Creation error")
 
+@router.post("/rolls/batch", response_model=schemas.RollBatchResponse)
+async def create_rolls(
+    request: Request,
+    storage: AsyncStorageInterface = Depends(get_storage)
+):
+    content_type = request.headers.get("content-type", "")
+    logger.info("Creating rolls in batch", extra={"content_type": content_type})
+    chunks = ndjson_chunks if content_type.startswith(NDJSON_TYPES) else json_chunks
+    count, id_ranges = 0, []
+    try:
+        async for chunk in chunks(request, settings.batch_chunk_size):
+            ids = await storage.create_rolls(chunk)
+            if id_ranges and id_ranges[-1][1] + 1 == ids.start:
+                id_ranges[-1][1] = ids[-1]
+            else:
+                id_ranges.append([ids.start, ids[-1]])
+            count += len(ids)
+    except ValidationError as e:
+        logger.warning("Invalid roll in batch", extra={"error": str(e), "stored": count})
+        # NDJSON chunks before the bad line are already stored
+        raise HTTPException(422, {
+            "message": "Invalid roll in batch",
+            "errors": e.errors(include_url=False, include_context=False, include_input=False),
+            "created": {"count": count, "id_ranges": id_ranges},
+        })
+    except Exception as e:
+        logger.error("Batch creation failed", exc_info=True)
+        raise HTTPException(500, "Creation error")
+    logger.debug("Rolls created", extra={"count": count})
+    return schemas.RollBatchResponse(count=count, id_ranges=id_ranges)
+
 @router.get("/rolls/", response_model=list[schemas.RollResponse])
 async def get_rolls(
+    request: Request,
     id_range: Optional[str] = None,
     weight_range: Optional[str] = None,
     length_range: Optional[str] = None,
     added_at_range: Optional[str] = None,
     removed_at_range: Optional[str] = None,
-    storage: StorageInterface = Depends(get_storage)
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description=f"Comma-separated subset of {','.join(ROLL_FIELDS)}"),
+    storage: AsyncStorageInterface = Depends(get_storage)
 ):
-    filters = {k: v for k, v in locals().items() if k != "storage"}
-    logger.info("Fetching rolls", extra={"filters": filters})
+    filters = {k: v for k, v in locals().items() if k in schemas.RollFilter.model_fields}
+    logger.info("Fetching rolls", extra={"filters": filters, "after_id": after_id, "limit": limit, "fields": fields})
+    try:
+        fields = parse_fields(fields)
+    except ValueError as e:
+        logger.warning("Invalid fields", extra={"error": str(e)})
+        raise HTTPException(422, str(e))
+    # The id is still fetched, after the requested fields, when the next page needs it
+    columns = fields if "id" in fields or limit is None else (*fields, "id")
+    ndjson = request.headers.get("accept", "").startswith(NDJSON_TYPES)
+    etag = resource_etag(request, storage, "ndjson" if ndjson else "json")
+    if (response := not_modified(request, etag)) is not None:
+        return response
 
     try:
-        result = storage.get_rolls(filters)
-        logger.debug(f"Found {len(result)} rolls")
-        return result
+        if ndjson:
+            rolls = storage.iter_rolls(filters, after_id, limit, fields)
+            # Pull the first row here so bad filters still get a 400
+            first = await anext(rolls, None)
+            return StreamingResponse(ndjson_rolls(first, rolls, fields), media_type=NDJSON_TYPES[0],
+                                     headers=cache_headers(etag))
+        result = await storage.get_rolls(filters, after_id, limit, columns)
+        logger.debug("Found %d rolls", len(result))
+        # Rows are encoded directly; response_model only documents the schema
+        response = Response(encode_rolls(result, fields), media_type="application/json",
+                            headers=cache_headers(etag))
+        if limit is not None and len(result) == limit:
+            response.headers["X-Next-After-Id"] = str(result[-1][columns.index("id")])
+        return response
     except ValueError as e:
         logger.warning("Invalid filter format", extra={"error": str(e)})
         raise HTTPException(400, "Invalid filter format")
@@ -48,32 +181,124 @@ async def get_rolls(
 @router.delete("/rolls/{roll_id}", response_model=schemas.RollResponse)
 async def delete_roll(
     roll_id: int,
-    storage: StorageInterface = Depends(get_storage)
+    storage: AsyncStorageInterface = Depends(get_storage)
 ):
-    logger.info(f"Deleting roll {roll_id}")
+    logger.info("Deleting roll %d", roll_id)
     try:
-        result = storage.delete_roll(roll_id)
+        result = await storage.delete_roll(roll_id)
         if not result:
             logger.warning("Roll not found", extra={"roll_id": roll_id})
             raise HTTPException(404, "Roll not found")
         logger.debug("Roll deleted", extra={"roll_id": roll_id})
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Deletion failed", exc_info=True)
         raise HTTPException(500, "Deletion error")
 
+@router.post("/rolls/remove", response_model=schemas.RollRemoveResponse)
+async def remove_rolls(
+    request: schemas.RollRemoveRequest,
+    storage: AsyncStorageInterface = Depends(get_storage)
+):
+    filters = request.filters.model_dump() if request.filters is not None else None
+    logger.info("Removing rolls", extra={
+        "ids": len(request.ids) if request.ids is not None else None,
+        "filters": filters
+    })
+    try:
+        result = await storage.remove_rolls(request.ids, filters)
+        logger.debug("Rolls removed")
+        return result
+    except ValueError as e:
+        logger.warning("Invalid filter format", extra={"error": str(e)})
+        raise HTTPException(400, "Invalid filter format")
+    except Exception as e:
+        logger.error("Removal failed", exc_info=True)
+        raise HTTPException(500, "Removal error")
+
 @router.get("/rolls/stats/", response_model=schemas.RollStats)
 async def get_stats(
+    request: Request,
     start_date: datetime,
     end_date: datetime,
-    storage: StorageInterface = Depends(get_storage)
+    storage: AsyncStorageInterface = Depends(get_storage)
 ):
     logger.info("Calculating stats", extra={
         "start_date": start_date.isoformat(),
         "end_date": end_date.isoformat()
     })
+    etag = resource_etag(request, storage)
+    if (response := not_modified(request, etag)) is not None:
+        return response
     try:
-        return storage.get_stats(start_date, end_date)
+        stats = await storage.get_stats(start_date, end_date)
+        return Response(encode_stats(stats), media_type="application/json", headers=cache_headers(etag))
     except Exception as e:
         logger.error("Stats calculation failed", exc_info=True)
-        raise HTTPException(500, "Stats error")
\ No newline at end of file
+        raise HTTPException(500, "Stats error")
+
+@router.get("/rolls/stats/series", response_model=list[schemas.StatsBucket])
+async def get_stats_series(
+    request: Request,
+    start_date: datetime,
+    end_date: datetime,
+    bucket: str = Query("day", pattern="^(hour|day|week)$"),
+    storage: AsyncStorageInterface = Depends(get_storage)
+):
+    logger.info("Calculating stats series", extra={
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "bucket": bucket
+    })
+    etag = resource_etag(request, storage)
+    if (response := not_modified(request, etag)) is not None:
+        return response
+    try:
+        series = await storage.get_stats_series(start_date, end_date, bucket)
+        return Response(encode_stats_series(series), media_type="application/json", headers=cache_headers(etag))
+    except ValueError as e:
+        logger.warning("Invalid series parameters", extra={"error": str(e)})
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        logger.error("Stats series calculation failed", exc_info=True)
+        raise HTTPException(500, "Stats error")
+
+@router.get("/rolls/inventory", response_model=schemas.InventorySnapshot)
+async def get_inventory(
+    at: datetime,
+    include_rolls: bool = False,
+    storage: AsyncStorageInterface = Depends(get_storage)
+):
+    logger.info("Calculating inventory", extra={"at": at.isoformat()})
+    try:
+        return await storage.get_inventory(at, include_rolls)
+    except Exception as e:
+        logger.error("Inventory calculation failed", exc_info=True)
+        raise HTTPException(500, "Inventory error")
+
+@router.get("/rolls/inventory/series", response_model=list[schemas.InventoryPoint])
+async def get_inventory_series(
+    start_date: datetime,
+    end_date: datetime,
+    step: timedelta,
+    storage: AsyncStorageInterface = Depends(get_storage)
+):
+    logger.info("Calculating inventory series", extra={
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "step": step.total_seconds()
+    })
+    try:
+        return await storage.get_inventory_series(start_date, end_date, step)
+    except ValueError as e:
+        logger.warning("Invalid series parameters", extra={"error": str(e)})
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        logger.error("Inventory series calculation failed", exc_info=True)
+        raise HTTPException(500, "Inventory error")
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,163 @@
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Callable
+
+
+class lazy:
+    # A log argument or extra value computed only if the record is emitted:
+    # logger.info("Creating roll: %s", lazy(roll.model_dump))
+    __slots__ = ("fn",)
+
+    def __init__(self, fn: Callable):
+        self.fn = fn
+
+    def __str__(self) -> str:
+        return str(self.fn())
+
+
+class DroppingQueueHandler(QueueHandler):
+    # Never blocks the request path on a full queue for records below WARNING.
+    # Once the queue is half full only one in debug_sample_rate DEBUG records
+    # is kept; when it is full INFO and DEBUG are dropped, and WARNING and up
+    # wait up to block_timeout seconds. Drops are counted and reported by a
+    # WARNING record once the queue is back under half full.
+
+    def __init__(self, q: queue.Queue, debug_sample_rate: int = 10, block_timeout: float = 1.0):
+        super().__init__(q)
+        self.debug_sample_rate = max(debug_sample_rate, 1)
+        self.block_timeout = block_timeout
+        self.pressure_size = q.maxsize // 2 if q.maxsize > 0 else None
+        self.dropped = 0
+        self._reported = 0
+        self._sampled = 0
+        self._count_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Records stay in this process, so only msg % args is merged here;
+        # tracebacks and the JSON formatting are left to the listener thread
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        for key, value in record.__dict__.items():
+            if isinstance(value, lazy):
+                record.__dict__[key] = value.fn()
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # Dropping and sampling are decided before prepare(), so records that
+        # are not kept cost no formatting or lazy evaluation
+        try:
+            if record.levelno >= logging.WARNING:
+                try:
+                    self.queue.put(self.prepare(record), timeout=self.block_timeout)
+                except queue.Full:
+                    self._drop()
+                return
+            if self.queue.full() or not self._keep_sampled(record):
+                self._drop()
+                return
+            try:
+                self.queue.put_nowait(self.prepare(record))
+            except queue.Full:
+                self._drop()
+                return
+            if self.dropped != self._reported and (not self.pressure_size or self.queue.qsize() < self.pressure_size):
+                self._report()
+        except Exception:
+            self.handleError(record)
+
+    def _keep_sampled(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or not self.pressure_size or self.queue.qsize() < self.pressure_size:
+            return True
+        with self._count_lock:
+            self._sampled += 1
+            return self._sampled % self.debug_sample_rate == 0
+
+    def _drop(self) -> None:
+        with self._count_lock:
+            self.dropped += 1
+
+    def _report(self) -> None:
+        with self._count_lock:
+            dropped, self._reported = self.dropped - self._reported, self.dropped
+        summary = logging.LogRecord("api", logging.WARNING, __file__, 0,
+                                    "Dropped %d log records under load (%d in total)",
+                                    (dropped, self._reported), None, "_report")
+        summary.dropped = dropped
+        try:
+            self.queue.put_nowait(self.prepare(summary))
+        except queue.Full:
+            with self._count_lock:
+                self._reported -= dropped
+
+
+class LogListener(QueueListener):
+    # QueueListener.stop() raises queue.Full on a full bounded queue;
+    # waiting for room lets the listener drain it first
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+class StdoutHandler(logging.StreamHandler):
+    # Writes to whatever sys.stdout is when the record is handled, not the
+    # stream it was configured with: the listener thread outlives streams
+    # that test runners swap in for stdout and close
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value) -> None:
+        pass
+
+
+class ReopeningRotatingFileHandler(RotatingFileHandler):
+    # Rotates by size like RotatingFileHandler, and also reopens the file when
+    # something else (logrotate, another worker's rollover) moved or deleted it,
+    # the way WatchedFileHandler does
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stat_stream()
+
+    def _stat_stream(self) -> None:
+        if self.stream is None:
+            self.dev = self.ino = -1
+            return
+        st = os.fstat(self.stream.fileno())
+        self.dev, self.ino = st.st_dev, st.st_ino
+
+    def _reopen_if_needed(self) -> None:
+        try:
+            st = os.stat(self.baseFilename)
+            moved = (st.st_dev, st.st_ino) != (self.dev, self.ino)
+        except FileNotFoundError:
+            moved = True
+        if moved and self.stream is not None:
+            self.stream.flush()
+            self.stream.close()
+            self.stream = None
+        if self.stream is None:
+            self.stream = self._open()
+            self._stat_stream()
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self._stat_stream()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._reopen_if_needed()
+        except OSError:
+            self.handleError(record)
+            return
+        super().emit(record)
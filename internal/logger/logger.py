@@ -1,10 +1,45 @@
+import atexit
 import logging
 import os
+import queue
 from logging.config import fileConfig
+from typing import Optional
+from config.config import settings
+from ..metrics.metrics import CallbackGauge
+from .handlers import DroppingQueueHandler, LogListener, lazy
+
+# The handlers configured in instance/logging.ini run on a QueueListener
+# thread; the loggers themselves only hold a DroppingQueueHandler.
+_listener: Optional[LogListener] = None
+
+
+def stop_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 def setup_logger():
+    global _listener
+    stop_logging()
     os.makedirs("logs", exist_ok=True)
     fileConfig("instance/logging.ini")
-    return logging.getLogger("api")
+    logger = logging.getLogger("api")
+    q = queue.Queue(settings.log_queue_size)
+    _listener = LogListener(q, *logger.handlers, respect_handler_level=True)
+    logger.handlers = [DroppingQueueHandler(q, settings.log_debug_sample_rate)]
+    _listener.start()
+    return logger
+
+
+def dropped_records() -> int:
+    return sum(h.dropped for h in logging.getLogger("api").handlers if isinstance(h, DroppingQueueHandler))
+
+
+CallbackGauge("log_records_dropped", "Log records dropped by the background log queue since start",
+              dropped_records)
+
+atexit.register(stop_logging)
 
-logger: logging.Logger = setup_logger()
\ No newline at end of file
+logger: logging.Logger = setup_logger()
@@ -0,0 +1,254 @@
+import functools
+import inspect
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Prometheus text exposition without a client library. Every metric keeps one
+# dict per thread, so recording never takes a lock or contends with other
+# threads; collect() sums the shards. When a thread exits its shard is added
+# to a retired total and dropped, so pools that replace idle threads do not
+# grow the shard list. Label values are positional, in the order the metric
+# declares them.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY: List["Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _add(totals: Dict[tuple, list], shard: dict) -> None:
+    for labels, row in shard.copy().items():
+        total = totals.get(labels)
+        if total is None:
+            totals[labels] = list(row)
+        else:
+            for i, value in enumerate(row):
+                total[i] += value
+
+
+class _ShardOwner:
+    # Kept in the thread-local next to the shard; freed when its thread exits
+    __slots__ = ("__weakref__",)
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        # Live shards by id, and what the shards of exited threads added up to
+        self._shards: Dict[int, dict] = {}
+        self._retired: Dict[tuple, list] = {}
+        self._lock = threading.RLock()
+        REGISTRY.append(self)
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            # Once per thread
+            shard = self._local.shard = {}
+            owner = self._local.owner = _ShardOwner()
+            with self._lock:
+                self._shards[id(shard)] = shard
+            weakref.finalize(owner, self._retire, shard)
+            return shard
+
+    def _retire(self, shard: dict) -> None:
+        with self._lock:
+            _add(self._retired, shard)
+            del self._shards[id(shard)]
+
+    def _merged(self) -> Dict[tuple, list]:
+        # Under the lock, so a shard retired meanwhile is counted exactly once
+        totals: Dict[tuple, list] = {}
+        with self._lock:
+            _add(totals, self._retired)
+            for shard in self._shards.values():
+                _add(totals, shard)
+        return totals
+
+    def collect(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.collect())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        shard = self._shard()
+        row = shard.get(labels)
+        if row is None:
+            row = shard[labels] = [0]
+        row[0] += amount
+
+    def value(self, *labels) -> float:
+        return self._merged().get(labels, [0])[0]
+
+    def collect(self) -> Iterator[str]:
+        for labels, (value,) in sorted(self._merged().items()):
+            yield f"{self.name}{_format_labels(self.labels, labels)} {value}"
+
+
+class Gauge(Counter):
+    # Per-thread shards add up, so inc/dec may even happen on different threads
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class CallbackGauge(Metric):
+    # Read from fn() at scrape time
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.fn = fn
+
+    def collect(self) -> Iterator[str]:
+        yield f"{self.name} {self.fn()}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels) -> None:
+        shard = self._shard()
+        row = shard.get(labels)
+        if row is None:
+            # One slot per bucket, +Inf, then sum and count
+            row = shard[labels] = [0] * (len(self.buckets) + 3)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def snapshot(self, *labels) -> Tuple[int, float]:
+        row = self._merged().get(labels)
+        return (row[-1], row[-2]) if row else (0, 0.0)
+
+    def collect(self) -> Iterator[str]:
+        for labels, row in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), row):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels((*self.labels, 'le'), (*labels, bound))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {row[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {row[-1]}"
+
+
+def render() -> bytes:
+    return ("\n\n".join(metric.render() for metric in REGISTRY) + "\n").encode()
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time from request start to the end of the response body",
+    ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being handled", ("method",)
+)
+STORAGE_SECONDS = Histogram(
+    "storage_operation_duration_seconds", "Time spent in a storage backend method, streams until exhausted",
+    ("backend", "method")
+)
+STORAGE_ROWS = Histogram(
+    "storage_rows_returned", "Rolls returned by a storage backend listing method",
+    ("backend", "method"), ROW_BUCKETS
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Time per SQL statement, by its leading keyword", ("statement",)
+)
+STATS_CACHE_LOOKUPS = Counter(
+    "stats_cache_lookups_total", "get_stats calls answered from the stats cache (hit) or computed (miss)",
+    ("cache", "result")
+)
+POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds", "Time waiting for a connection from the SQLAlchemy pool", ("engine",)
+)
+
+
+def timed_storage(method: str):
+    # Times a storage method under its backend's class name. Lists and
+    # streams also record how many rows they returned; streams are timed
+    # until they are exhausted or closed.
+    def decorate(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def stream(self, *args, **kwargs):
+                backend, started, rows = type(self).__name__, time.perf_counter(), 0
+                try:
+                    async for item in fn(self, *args, **kwargs):
+                        rows += 1
+                        yield item
+                finally:
+                    STORAGE_SECONDS.observe(time.perf_counter() - started, backend, method)
+                    STORAGE_ROWS.observe(rows, backend, method)
+            return stream
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def call(self, *args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    result = await fn(self, *args, **kwargs)
+                finally:
+                    STORAGE_SECONDS.observe(time.perf_counter() - started, type(self).__name__, method)
+                if isinstance(result, list):
+                    STORAGE_ROWS.observe(len(result), type(self).__name__, method)
+                return result
+            return call
+
+        def count_rows(items, backend, started):
+            rows = 0
+            try:
+                for item in items:
+                    rows += 1
+                    yield item
+            finally:
+                STORAGE_SECONDS.observe(time.perf_counter() - started, backend, method)
+                STORAGE_ROWS.observe(rows, backend, method)
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = fn(self, *args, **kwargs)
+            except Exception:
+                STORAGE_SECONDS.observe(time.perf_counter() - started, type(self).__name__, method)
+                raise
+            if isinstance(result, Iterator):
+                return count_rows(result, type(self).__name__, started)
+            STORAGE_SECONDS.observe(time.perf_counter() - started, type(self).__name__, method)
+            if isinstance(result, list):
+                STORAGE_ROWS.observe(len(result), type(self).__name__, method)
+            return result
+        return wrapper
+    return decorate
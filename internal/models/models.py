@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import Column, Integer, Float, DateTime
+from sqlalchemy import Column, Integer, Float, Date, DateTime, Index
 from sqlalchemy.orm import declarative_base
 from datetime import datetime
 
@@ -14,8 +14,39 @@ class Roll(Base):
     added_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     removed_at = Column(DateTime, nullable=True)
 
+    # A roll is in stock over [added_at, removed_at). Keep in step with
+    # internal/storage/migrations.py, which creates these on existing databases.
+    __table_args__ = (
+        Index("ix_rolls_added_at", "added_at", "removed_at", "length", "weight"),
+        Index("ix_rolls_removed_at_added_at", "removed_at", "added_at", "weight"),
+        Index("ix_rolls_weight", "weight"),
+        Index("ix_rolls_length", "length"),
+    )
+
     def __repr__(self):
         return f"<Roll(id={self.id}, length={self.length}, weight={self.weight})>"
 
     def __str__(self):
-        return self.__repr__()
\ No newline at end of file
+        return self.__repr__()
+
+
+class RollDailyRollup(Base):
+    __tablename__ = "roll_daily_rollup"
+
+    # UTC day; added_* columns describe rolls added that day, removed_* and
+    # the lifetimes (in days) describe rolls removed that day
+    day = Column(Date, primary_key=True)
+    added_count = Column(Integer, nullable=False, default=0)
+    added_weight = Column(Float, nullable=False, default=0.0)
+    added_length = Column(Float, nullable=False, default=0.0)
+    min_length = Column(Float, nullable=True)
+    max_length = Column(Float, nullable=True)
+    min_weight = Column(Float, nullable=True)
+    max_weight = Column(Float, nullable=True)
+    removed_count = Column(Integer, nullable=False, default=0)
+    removed_weight = Column(Float, nullable=False, default=0.0)
+    min_lifetime = Column(Float, nullable=True)
+    max_lifetime = Column(Float, nullable=True)
+
+    def __repr__(self):
+        return f"<RollDailyRollup(day={self.day}, added={self.added_count}, removed={self.removed_count})>"
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 from typing import Optional
 from datetime import datetime
 
@@ -15,6 +15,12 @@ class RollResponse(BaseModel):
     removed_at: Optional[datetime]
 
 
+class RollBatchResponse(BaseModel):
+    count: int
+    # Inclusive [first, last] runs of the assigned ids, in insertion order
+    id_ranges: list[tuple[int, int]]
+
+
 class RollFilter(BaseModel):
     id_range: Optional[str] = None
     weight_range: Optional[str] = None
@@ -22,6 +28,26 @@ class RollFilter(BaseModel):
     added_at_range: Optional[str] = None
     removed_at_range: Optional[str] = None
 
+class RollRemoveRequest(BaseModel):
+    # Exactly one of: explicit ids, or range filters with at least one range set
+    ids: Optional[list[int]] = None
+    filters: Optional[RollFilter] = None
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if (self.ids is None) == (self.filters is None):
+            raise ValueError("Pass either ids or filters")
+        if self.filters is not None and not any(self.filters.model_dump().values()):
+            raise ValueError("Filters must set at least one range")
+        return self
+
+
+class RollRemoveResponse(BaseModel):
+    removed: list[int]
+    # Requested ids that do not exist or were already removed
+    not_found: list[int]
+
+
 class RollStats(BaseModel):
     total_added: int
     total_removed: int
@@ -35,3 +61,25 @@ class RollStats(BaseModel):
     max_time_diff: Optional[float]
     min_time_diff: Optional[float]
 
+
+class InventoryPoint(BaseModel):
+    at: datetime
+    count: int
+    total_weight: float
+
+class InventorySnapshot(InventoryPoint):
+    rolls: Optional[list[RollResponse]] = None
+
+
+class StatsBucket(BaseModel):
+    start: datetime
+    end: datetime
+    # Rolls added and removed within [start, end); totals and averages are of the added ones
+    added_count: int
+    removed_count: int
+    total_length: float
+    avg_length: float
+    total_weight: float
+    avg_weight: float
+    # Rolls in stock at the end of the bucket
+    on_hand: int
@@ -0,0 +1,81 @@
+from datetime import datetime
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from pydantic import TypeAdapter
+from typing_extensions import TypedDict  # pydantic needs it before Python 3.12
+from .schemas import RollStats, StatsBucket
+
+# Roll lists are encoded straight from (id, length, weight, added_at, removed_at)
+# tuples: SQLAlchemy Rows from a column select or RollRecords built from the
+# in-memory columns. The bytes match what response_model=list[RollResponse]
+# produces, without building and revalidating a model per row.
+
+
+class RollRecord(NamedTuple):
+    id: int
+    length: float
+    weight: float
+    added_at: datetime
+    removed_at: Optional[datetime]
+
+
+class RollJSON(TypedDict, total=False):
+    id: int
+    length: float
+    weight: float
+    added_at: datetime
+    removed_at: Optional[datetime]
+
+
+class StatsBucketJSON(TypedDict):
+    start: datetime
+    end: datetime
+    added_count: int
+    removed_count: int
+    total_length: float
+    avg_length: float
+    total_weight: float
+    avg_weight: float
+    on_hand: int
+
+
+ROLL_FIELDS = RollRecord._fields
+
+roll_list_serializer = TypeAdapter(List[RollJSON])
+roll_serializer = TypeAdapter(RollJSON)
+bucket_list_serializer = TypeAdapter(List[StatsBucketJSON])
+bucket_model_list_serializer = TypeAdapter(List[StatsBucket])
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    # "id,weight" -> ("id", "weight"); all fields when not given
+    if fields is None:
+        return ROLL_FIELDS
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",")))
+    invalid = [name for name in names if name not in ROLL_FIELDS]
+    if invalid or not names:
+        raise ValueError(f"Invalid fields: {', '.join(invalid) or fields!r}, expected any of {', '.join(ROLL_FIELDS)}")
+    return names
+
+
+def encode_rolls(rows: Iterable[tuple], fields: Sequence[str] = ROLL_FIELDS) -> bytes:
+    # Extra trailing columns (the id kept for pagination) are cut off by zip()
+    return roll_list_serializer.dump_json([dict(zip(fields, row)) for row in rows])
+
+
+def encode_roll_lines(rows: Iterable[tuple], fields: Sequence[str] = ROLL_FIELDS) -> bytes:
+    # NDJSON: one object per line
+    return b"".join(roll_serializer.dump_json(dict(zip(fields, row))) + b"\n" for row in rows)
+
+
+def encode_stats(stats) -> bytes:
+    # crud returns a dict with extra keys; they are dropped like response_model would
+    if not isinstance(stats, RollStats):
+        stats = RollStats.model_validate(stats)
+    return stats.model_dump_json().encode()
+
+
+def encode_stats_series(series: Sequence) -> bytes:
+    # crud returns plain dicts, InMemoryStorage StatsBucket models; both dump without revalidation
+    if series and isinstance(series[0], StatsBucket):
+        return bucket_model_list_serializer.dump_json(series)
+    return bucket_list_serializer.dump_json(series)
@@ -0,0 +1,37 @@
+import cProfile
+import os
+import pstats
+import threading
+from contextvars import ContextVar
+from typing import List, Optional
+
+# cProfile only sees the thread it was enabled on. A request is profiled on
+# the event loop thread, and storage calls offloaded to the thread pool run
+# under a profiler of their own (see SyncStorageAdapter); dump() merges them.
+# Only one profiler can be active on a thread, hence the loop-wide lock.
+loop_profiler_lock = threading.Lock()
+current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.profiler = cProfile.Profile()
+        self._offloaded: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def runcall(self, fn, *args):
+        profiler = cProfile.Profile()
+        with self._lock:
+            self._offloaded.append(profiler)
+        return profiler.runcall(fn, *args)
+
+    def dump(self, directory: str) -> str:
+        stats = pstats.Stats(self.profiler)
+        with self._lock:
+            for profiler in self._offloaded:
+                stats.add(profiler)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.request_id}.prof")
+        stats.dump_stats(path)
+        return path
@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta, UTC
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+from config.config import settings
+from .storage import AsyncStorageInterface
+from ..models.schemas import (RollStats, RollCreate, RollResponse, RollRemoveResponse,
+                              InventoryPoint, InventorySnapshot, StatsBucket)
+from ..models.serialization import ROLL_FIELDS
+from . import crud
+from ..metrics.metrics import timed_storage
+from .stats_cache import database_stats_cache
+from .write_coalescer import async_write_coalescer
+from .timestamps import to_us
+from ..logger.logger import lazy, logger
+
+
+class AsyncDatabaseStorage(AsyncStorageInterface):
+    # Runs the crud functions through AsyncSession.run_sync: the SQL is the same
+    # as DatabaseStorage's, but every round trip is awaited on aiosqlite instead
+    # of blocking the event loop. The session must use expire_on_commit=False so
+    # returned rows can be serialized outside the greenlet.
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.stats_cache = database_stats_cache(db.bind.sync_engine)
+        logger.debug("AsyncDatabaseStorage initialized with session %s", id(db))
+
+    @timed_storage("create_roll")
+    async def create_roll(self, roll: RollCreate) -> RollResponse:
+        try:
+            logger.info("Attempting to create roll: %s", lazy(roll.model_dump))
+            with self.stats_cache.writing(to_us(datetime.now(UTC))):
+                if settings.write_coalesce_ms > 0:
+                    result = await async_write_coalescer(self.db.bind).create_roll(self.db.bind, roll)
+                else:
+                    result = await self.db.run_sync(crud.create_roll, roll)
+            logger.debug("Roll created successfully. ID: %d", result.id)
+            return result
+        except SQLAlchemyError as e:
+            logger.error("Database error during roll creation: %s", str(e))
+            raise
+
+    @timed_storage("create_rolls")
+    async def create_rolls(self, rolls: List[RollCreate]) -> range:
+        try:
+            logger.info("Attempting to create %d rolls", len(rolls))
+            with self.stats_cache.writing(to_us(datetime.now(UTC))):
+                result = await self.db.run_sync(crud.create_rolls, rolls)
+            logger.debug("Rolls created successfully. IDs: %s", result)
+            return result
+        except SQLAlchemyError as e:
+            logger.error("Database error during batch creation: %s", str(e))
+            raise
+
+    @timed_storage("get_rolls")
+    async def get_rolls(self, filters: Dict[str, Optional[str]], after_id: Optional[int] = None,
+                        limit: Optional[int] = None, fields: Sequence[str] = ROLL_FIELDS) -> List[tuple]:
+        try:
+            logger.info("Fetching rolls with filters: %s", filters)
+            result = await self.db.run_sync(crud.get_rolls, filters, after_id, limit, fields)
+            logger.debug("Found %d rolls matching filters", len(result))
+            return result
+        except SQLAlchemyError as e:
+            logger.error("Database error in get_rolls: %s", str(e))
+            raise
+        except ValueError as e:
+            logger.error("Invalid filter format: %s", str(e))
+            raise
+
+    @timed_storage("iter_rolls")
+    async def iter_rolls(self, filters: Dict[str, Optional[str]], after_id: Optional[int] = None,
+                         limit: Optional[int] = None, fields: Sequence[str] = ROLL_FIELDS) -> AsyncIterator[tuple]:
+        try:
+            logger.info("Streaming rolls with filters: %s", filters)
+            query = crud.rolls_query(filters, after_id, limit, fields)
+            result = await self.db.stream(query.execution_options(yield_per=crud.STREAM_BATCH_SIZE))
+            async for roll in result:
+                yield roll
+        except SQLAlchemyError as e:
+            logger.error("Database error in iter_rolls: %s", str(e))
+            raise
+
+    @timed_storage("delete_roll")
+    async def delete_roll(self, roll_id: int) -> Optional[RollResponse]:
+        try:
+            logger.info("Attempting to delete roll ID: %d", roll_id)
+            with self.stats_cache.writing(to_us(datetime.now(UTC))):
+                result = await self.db.run_sync(crud.delete_roll, roll_id)
+            if result:
+                logger.debug("Successfully marked roll %d as removed", roll_id)
+            else:
+                logger.warning("Roll %d not found for deletion", roll_id)
+            return result
+        except SQLAlchemyError as e:
+            logger.error("Database error during deletion: %s", str(e))
+            raise
+
+    @timed_storage("remove_rolls")
+    async def remove_rolls(self, ids: Optional[List[int]] = None,
+                           filters: Optional[Dict[str, Optional[str]]] = None) -> RollRemoveResponse:
+        try:
+            logger.info("Attempting to remove rolls: ids=%s filters=%s",
+                        len(ids) if ids is not None else None, filters)
+            with self.stats_cache.writing(to_us(datetime.now(UTC))):
+                result = await self.db.run_sync(crud.remove_rolls, ids, filters)
+            logger.debug("Removed %d rolls, %d not found", len(result["removed"]), len(result["not_found"]))
+            return result
+        except SQLAlchemyError as e:
+            logger.error("Database error during removal: %s", str(e))
+            raise
+        except ValueError as e:
+            logger.error("Invalid filter format: %s", str(e))
+            raise
+
+    @timed_storage("get_stats")
+    async def get_stats(self, start_date: datetime, end_date: datetime) -> RollStats:
+        try:
+            logger.info("Calculating stats from %s to %s",
+                        start_date.isoformat(), end_date.isoformat())
+            cached, generation = self.stats_cache.get(start_date, end_date)
+            if cached is not None:
+                return cached
+            result = await self.db.run_sync(crud.get_stats, start_date, end_date)
+            self.stats_cache.put(start_date, end_date, generation, result)
+            logger.debug("Stats calculation completed. Total entries: %d", result["total_added"])
+            return result
+        except SQLAlchemyError as e:
+            logger.error("Database error in get_stats: %s", str(e))
+            raise
+
+    @timed_storage("get_inventory")
+    async def get_inventory(self, at: datetime, include_rolls: bool = False) -> InventorySnapshot:
+        try:
+            logger.info("Calculating inventory at %s", at.isoformat())
+            return await self.db.run_sync(crud.get_inventory, at, include_rolls)
+        except SQLAlchemyError as e:
+            logger.error("Database error in get_inventory: %s", str(e))
+            raise
+
+    @timed_storage("get_inventory_series")
+    async def get_inventory_series(self, start_date: datetime, end_date: datetime,
+                                   step: timedelta) -> List[InventoryPoint]:
+        try:
+            logger.info("Calculating inventory series from %s to %s",
+                        start_date.isoformat(), end_date.isoformat())
+            return await self.db.run_sync(crud.get_inventory_series, start_date, end_date, step)
+        except SQLAlchemyError as e:
+            logger.error("Database error in get_inventory_series: %s", str(e))
+            raise
+
+    @timed_storage("get_stats_series")
+    async def get_stats_series(self, start_date: datetime, end_date: datetime,
+                               bucket: str) -> List[StatsBucket]:
+        try:
+            logger.info("Calculating %s stats series from %s to %s",
+                        bucket, start_date.isoformat(), end_date.isoformat())
+            return await self.db.run_sync(crud.get_stats_series, start_date, end_date, bucket)
+        except SQLAlchemyError as e:
+            logger.error("Database error in get_stats_series: %s", str(e))
+            raise
+
+    def write_version(self) -> Optional[str]:
+        return self.stats_cache.version
@@ -1,12 +1,17 @@
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, Boolean
-from datetime import datetime, UTC
-from ..models.models import Roll
-from ..models.schemas import RollCreate
+from sqlalchemy import and_, or_, true, Boolean, case, literal, select, union_all, update
+from datetime import datetime, timedelta, UTC
+from ..models.models import Roll, RollDailyRollup
+from ..models.schemas import RollCreate, RollResponse
+from ..models.serialization import ROLL_FIELDS
 from sqlalchemy import func
-from ..logger.logger import logger
-from typing import cast
+from ..logger.logger import lazy, logger
+from .rollup import record_added, record_added_many, record_removed, record_removed_many
+from .storage import series_points, stats_buckets
+from .timestamps import MICROSECOND, as_naive_utc, day_to_date, epoch_us, from_us, lifetime_days, split_days, to_us
+from typing import Dict, Iterator, List, Optional, Sequence, cast
 
 
 def parse_range(range_str: str):
@@ -59,13 +64,30 @@ def apply_filters(query, filters: dict):
     return query
 
 
-def get_rolls(db: Session, filters: dict = None):
+# Rows fetched per round trip when streaming
+STREAM_BATCH_SIZE = 1_000
+
+
+def rolls_query(filters: Optional[dict] = None, after_id: Optional[int] = None, limit: Optional[int] = None,
+                fields: Sequence[str] = ROLL_FIELDS):
+    # Plain column tuples of just the requested fields, no ORM entities to build.
+    # Keyset pagination on the primary key: the page after after_id, in id order
+    query = select(*(Roll.__table__.c[name] for name in fields))
+    if filters:
+        query = apply_filters(query, filters)
+    if after_id is not None:
+        query = query.where(Roll.id > after_id)
+    query = query.order_by(Roll.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def get_rolls(db: Session, filters: dict = None, after_id: Optional[int] = None, limit: Optional[int] = None,
+              fields: Sequence[str] = ROLL_FIELDS):
     try:
         logger.info("Fetching rolls with filters: %s", filters)
-        query = db.query(Roll)
-        if filters:
-            query = apply_filters(query, filters)
-        result = query.all()
+        result = db.execute(rolls_query(filters, after_id, limit, fields)).all()
         logger.debug("Found %d rolls", len(result))
         return result
     except SQLAlchemyError as e:
@@ -73,15 +95,28 @@ def get_rolls(db: Session, filters: dict = None):
         raise
 
 
+def iter_rolls(db: Session, filters: dict = None, after_id: Optional[int] = None,
+               limit: Optional[int] = None, fields: Sequence[str] = ROLL_FIELDS) -> Iterator[Row]:
+    # Fetches STREAM_BATCH_SIZE rows at a time, so memory does not grow with the result
+    try:
+        logger.info("Streaming rolls with filters: %s", filters)
+        query = rolls_query(filters, after_id, limit, fields).execution_options(yield_per=STREAM_BATCH_SIZE)
+        yield from db.execute(query)
+    except SQLAlchemyError as e:
+        logger.error("Database error in iter_rolls: %s", str(e))
+        raise
+
+
 def create_roll(db: Session, roll: RollCreate):
     try:
-        logger.info("Creating roll: %s", roll.model_dump())
+        logger.info("Creating roll: %s", lazy(roll.model_dump))
         new_roll = Roll(
             length=roll.length,
             weight=roll.weight,
             added_at=datetime.now(UTC)  # Setting timezone
         )
         db.add(new_roll)
+        record_added(db, new_roll.added_at, new_roll.length, new_roll.weight)
         db.commit()
         return new_roll
     except SQLAlchemyError as e:
@@ -90,13 +125,54 @@ def create_roll(db: Session, roll: RollCreate):
         raise
 
 
+def create_rolls(db: Session, rolls: List[RollCreate], added_at: Optional[datetime] = None) -> range:
+    # One transaction and one driver-level executemany for the whole list;
+    # callers chunk. The INSERT holds the write lock until commit, so the
+    # INTEGER PRIMARY KEY hands out consecutive ids ending at last_insert_rowid().
+    try:
+        logger.info("Creating %d rolls", len(rolls))
+        if not rolls:
+            return range(0)
+        added_at = added_at or datetime.now(UTC)
+        stamp = as_naive_utc(added_at).isoformat(" ", "microseconds")
+        conn = db.connection()
+        conn.exec_driver_sql(
+            "INSERT INTO rolls (length, weight, added_at) VALUES (?, ?, ?)",
+            [(roll.length, roll.weight, stamp) for roll in rolls]
+        )
+        last_id = conn.exec_driver_sql("SELECT last_insert_rowid()").scalar()
+        record_added_many(db, added_at, [roll.length for roll in rolls], [roll.weight for roll in rolls])
+        db.commit()
+        return range(last_id - len(rolls) + 1, last_id + 1)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Database error: %s", e)
+        raise
+
+
+def create_roll_group(db: Session, rolls: List[RollCreate]) -> List[RollResponse]:
+    # Single rolls from concurrent requests, committed together by the write
+    # coalescer; each comes back as the row a later read would return
+    added_at = datetime.now(UTC)
+    ids = create_rolls(db, rolls, added_at)
+    added_at = as_naive_utc(added_at)
+    return [RollResponse.model_construct(id=roll_id, length=roll.length, weight=roll.weight,
+                                         added_at=added_at, removed_at=None)
+            for roll_id, roll in zip(ids, rolls)]
+
+
+# Ids per UPDATE, well under SQLite's bound parameter limit
+REMOVE_CHUNK_SIZE = 10_000
+
+
 def delete_roll(db: Session, roll_id: int):
     try:
-        roll = db.query(Roll).get(roll_id)
-        if not roll:
+        roll = db.get(Roll, roll_id)
+        if not roll or roll.removed_at is not None:
             return None
 
         roll.removed_at = datetime.now(UTC)
+        record_removed(db, roll.added_at, roll.removed_at, roll.weight)
         db.commit()
         return roll
     except SQLAlchemyError as e:
@@ -105,6 +181,45 @@ def delete_roll(db: Session, roll_id: int):
         raise
 
 
+def remove_rolls(db: Session, ids: Optional[List[int]] = None, filters: Optional[Dict[str, Optional[str]]] = None):
+    # Set-based: rolls still in stock are marked removed by UPDATE ... RETURNING,
+    # one statement per chunk of ids (or one for a filter), in a single transaction
+    try:
+        removed_at = datetime.now(UTC)
+        in_stock = (
+            update(Roll)
+            .where(Roll.removed_at.is_(None))
+            .values(removed_at=removed_at)
+            .returning(Roll.id, Roll.added_at, Roll.weight)
+            .execution_options(synchronize_session=False)
+        )
+        rows = []
+        if ids is not None:
+            logger.info("Removing %d rolls by id", len(ids))
+            requested = list(dict.fromkeys(ids))
+            for start in range(0, len(requested), REMOVE_CHUNK_SIZE):
+                chunk = requested[start:start + REMOVE_CHUNK_SIZE]
+                rows += db.execute(in_stock.where(Roll.id.in_(chunk))).all()
+        else:
+            logger.info("Removing rolls matching filters: %s", filters)
+            rows = db.execute(apply_filters(in_stock, filters)).all()
+        if rows:
+            record_removed_many(db, removed_at, [row.added_at for row in rows], [row.weight for row in rows])
+        db.commit()
+
+        removed_ids = {row.id for row in rows}
+        if ids is not None:
+            return {
+                "removed": [roll_id for roll_id in requested if roll_id in removed_ids],
+                "not_found": [roll_id for roll_id in requested if roll_id not in removed_ids],
+            }
+        return {"removed": sorted(removed_ids), "not_found": []}
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Removal error: %s", e)
+        raise
+
+
 def get_roll_by_id(db: Session, roll_id: int) -> Roll | None:
     try:
         logger.debug("Attempting to fetch roll with ID: %d", roll_id)
@@ -141,76 +256,103 @@ def get_stats(db: Session, start_date: datetime, end_date: datetime):
     try:
         logger.info("Calculating stats from %s to %s",
                     start_date.isoformat(), end_date.isoformat())
-
-        query = db.query(Roll).filter(
-            and_(
-                Roll.added_at <= end_date,
-                (Roll.removed_at >= start_date) | (Roll.removed_at.is_(None))
-            )
+        start, end = as_naive_utc(start_date), as_naive_utc(end_date)
+
+        # Everything is scoped to the window: length/weight aggregates and the
+        # busiest/quietest days cover rolls added in it, lifetimes cover rolls
+        # removed in it. Whole days are read from roll_daily_rollup and only
+        # the partial days at the edges touch raw rows.
+        full_days, edges = split_days(to_us(start_date), to_us(end_date))
+        edges = [(as_naive_utc(from_us(lo)), as_naive_utc(from_us(hi))) for lo, hi in edges]
+        rollup_days = and_(
+            RollDailyRollup.day >= day_to_date(full_days.start),
+            RollDailyRollup.day < day_to_date(full_days.stop)
         )
 
-        logger.debug("Executing total added query")
-        total_added = query.filter(Roll.added_at.between(start_date, end_date)).count()
-
-        logger.debug("Executing total removed query")
-        total_removed = query.filter(Roll.removed_at.between(start_date, end_date)).count()
-
-        logger.debug("Calculating aggregate stats")
-        stats = db.query(
-            func.avg(Roll.length).label('avg_length'),
-            func.avg(Roll.weight).label('avg_weight'),
-            func.max(Roll.length).label('max_length'),
-            func.min(Roll.length).label('min_length'),
-            func.max(Roll.weight).label('max_weight'),
-            func.min(Roll.weight).label('min_weight'),
-            func.sum(Roll.weight).label('total_weight')
-        ).first()
-
-        avg_length = stats.avg_length or 0
-        avg_weight = stats.avg_weight or 0
-        max_length = stats.max_length or 0
-        min_length = stats.min_length or 0
-        max_weight = stats.max_weight or 0
-        min_weight = stats.min_weight or 0
-        total_weight = stats.total_weight or 0
-
-        logger.debug("Calculating time differences")
-        time_diff_subq = db.query(
-            func.julianday(Roll.removed_at) - func.julianday(Roll.added_at)
-        ).filter(Roll.removed_at.is_not(None)).subquery()
-
-        max_time_diff = db.query(func.max(time_diff_subq.c[0])).scalar() or 0
-        min_time_diff = db.query(func.min(time_diff_subq.c[0])).scalar() or 0
-
-        logger.debug("Calculating daily stats")
-        daily_stats = db.query(
-            func.date(Roll.added_at).label('date'),
-            func.count(Roll.id).label('rolls_count'),
-            func.sum(Roll.weight).label('total_weight')
-        ).group_by(func.date(Roll.added_at)).all()
-
-        min_rolls_day = min(daily_stats, key=lambda x: x.rolls_count, default=None)
-        max_rolls_day = max(daily_stats, key=lambda x: x.rolls_count, default=None)
-        min_weight_day = min(daily_stats, key=lambda x: x.total_weight, default=None)
-        max_weight_day = max(daily_stats, key=lambda x: x.total_weight, default=None)
-
+        day = func.date(Roll.added_at)
+        daily = union_all(
+            select(
+                func.date(RollDailyRollup.day).label('day'),
+                RollDailyRollup.added_count.label('rolls_count'),
+                RollDailyRollup.added_weight.label('total_weight'),
+                RollDailyRollup.added_length.label('total_length'),
+                RollDailyRollup.max_length.label('max_length'),
+                RollDailyRollup.min_length.label('min_length'),
+                RollDailyRollup.max_weight.label('max_weight'),
+                RollDailyRollup.min_weight.label('min_weight')
+            ).where(rollup_days, RollDailyRollup.added_count > 0),
+            *(select(
+                day,
+                func.count(Roll.id),
+                func.sum(Roll.weight),
+                func.sum(Roll.length),
+                func.max(Roll.length),
+                func.min(Roll.length),
+                func.max(Roll.weight),
+                func.min(Roll.weight)
+            ).where(Roll.added_at.between(lo, hi)).group_by(day) for lo, hi in edges)
+        ).cte('daily')
+
+        time_diff = lifetime_days(Roll.added_at, Roll.removed_at)
+        removed_parts = union_all(
+            select(
+                func.coalesce(func.sum(RollDailyRollup.removed_count), 0).label('total_removed'),
+                func.max(RollDailyRollup.max_lifetime).label('max_time_diff'),
+                func.min(RollDailyRollup.min_lifetime).label('min_time_diff')
+            ).where(rollup_days),
+            *(select(
+                func.count(Roll.id),
+                func.max(time_diff),
+                func.min(time_diff)
+            ).where(Roll.removed_at.between(lo, hi)) for lo, hi in edges)
+        ).subquery('removed_parts')
+        removed = select(
+            func.sum(removed_parts.c.total_removed).label('total_removed'),
+            func.max(removed_parts.c.max_time_diff).label('max_time_diff'),
+            func.min(removed_parts.c.min_time_diff).label('min_time_diff')
+        ).subquery('removed')
+
+        def pick_day(*order_by):
+            return select(daily.c.day).order_by(*order_by, daily.c.day).limit(1).scalar_subquery()
+
+        logger.debug("Executing stats query")
+        stats = db.execute(
+            select(
+                func.coalesce(func.sum(daily.c.rolls_count), 0).label('total_added'),
+                func.max(removed.c.total_removed).label('total_removed'),
+                func.total(daily.c.total_length).label('total_length'),
+                func.total(daily.c.total_weight).label('total_weight'),
+                func.max(daily.c.max_length).label('max_length'),
+                func.min(daily.c.min_length).label('min_length'),
+                func.max(daily.c.max_weight).label('max_weight'),
+                func.min(daily.c.min_weight).label('min_weight'),
+                func.max(removed.c.max_time_diff).label('max_time_diff'),
+                func.min(removed.c.min_time_diff).label('min_time_diff'),
+                pick_day(daily.c.rolls_count).label('min_rolls_day'),
+                pick_day(daily.c.rolls_count.desc()).label('max_rolls_day'),
+                pick_day(daily.c.total_weight).label('min_weight_day'),
+                pick_day(daily.c.total_weight.desc()).label('max_weight_day')
+            ).select_from(removed.outerjoin(daily, true()))
+        ).one()
+
+        total_added = stats.total_added
         logger.info("Stats calculation completed successfully")
         return {
             "total_added": total_added,
-            "total_removed": total_removed,
-            "avg_length": avg_length,
-            "avg_weight": avg_weight,
-            "max_length": max_length,
-            "min_length": min_length,
-            "max_weight": max_weight,
-            "min_weight": min_weight,
-            "total_weight": total_weight,
-            "max_time_diff": max_time_diff,
-            "min_time_diff": min_time_diff,
-            "min_rolls_day": min_rolls_day.date if min_rolls_day else None,
-            "max_rolls_day": max_rolls_day.date if max_rolls_day else None,
-            "min_weight_day": min_weight_day.date if min_weight_day else None,
-            "max_weight_day": max_weight_day.date if max_weight_day else None,
+            "total_removed": stats.total_removed,
+            "avg_length": stats.total_length / total_added if total_added else 0,
+            "avg_weight": stats.total_weight / total_added if total_added else 0,
+            "max_length": stats.max_length or 0,
+            "min_length": stats.min_length or 0,
+            "max_weight": stats.max_weight or 0,
+            "min_weight": stats.min_weight or 0,
+            "total_weight": stats.total_weight,
+            "max_time_diff": stats.max_time_diff or 0,
+            "min_time_diff": stats.min_time_diff or 0,
+            "min_rolls_day": stats.min_rolls_day,
+            "max_rolls_day": stats.max_rolls_day,
+            "min_weight_day": stats.min_weight_day,
+            "max_weight_day": stats.max_weight_day,
         }
 
     except SQLAlchemyError as e:
@@ -222,3 +364,129 @@ def get_stats(db: Session, start_date: datetime, end_date: datetime):
     except Exception as e:
         logger.critical("Unexpected error in get_stats: %s", str(e))
         raise
+
+
+def in_stock(at: datetime):
+    return and_(
+        Roll.added_at <= at,
+        or_(Roll.removed_at.is_(None), Roll.removed_at > at)
+    )
+
+
+def get_inventory(db: Session, at: datetime, include_rolls: bool = False):
+    try:
+        logger.info("Calculating inventory at %s", at.isoformat())
+        moment = as_naive_utc(at)
+        count, total_weight = db.query(
+            func.count(Roll.id),
+            func.total(Roll.weight)
+        ).filter(in_stock(moment)).one()
+
+        rolls = None
+        if include_rolls:
+            rolls = db.query(Roll).filter(in_stock(moment)).order_by(Roll.id).all()
+
+        return {"at": at, "count": count, "total_weight": total_weight, "rolls": rolls}
+    except SQLAlchemyError as e:
+        logger.error("Database error in get_inventory: %s", str(e))
+        raise
+
+
+def get_inventory_series(db: Session, start_date: datetime, end_date: datetime, step: timedelta):
+    try:
+        logger.info("Calculating inventory series from %s to %s",
+                    start_date.isoformat(), end_date.isoformat())
+        points = series_points(start_date, end_date, step)
+        if not points:
+            return []
+
+        # Every add (+1) and removal (-1) is assigned to the first point at or
+        # after it, so one grouped pass yields per-point deltas
+        start_us, step_us = to_us(start_date), step // MICROSECOND
+        last = as_naive_utc(points[-1])
+
+        def bucket(column):
+            offset = epoch_us(column) - start_us
+            return case((offset <= 0, 0), else_=(offset + step_us - 1) // step_us)
+
+        events = union_all(
+            select(bucket(Roll.added_at).label("bucket"),
+                   literal(1).label("delta"),
+                   Roll.weight.label("weight"))
+            .where(Roll.added_at <= last),
+            select(bucket(Roll.removed_at), literal(-1), -Roll.weight)
+            .where(Roll.removed_at <= last)
+        ).subquery()
+        rows = db.execute(
+            select(events.c.bucket, func.sum(events.c.delta), func.total(events.c.weight))
+            .group_by(events.c.bucket)
+        )
+        deltas = {bucket_no: (delta, weight) for bucket_no, delta, weight in rows}
+
+        series, count, total_weight = [], 0, 0.0
+        for bucket_no, at in enumerate(points):
+            delta, weight = deltas.get(bucket_no, (0, 0.0))
+            count += delta
+            total_weight += weight
+            series.append({"at": at, "count": count, "total_weight": total_weight})
+        return series
+    except SQLAlchemyError as e:
+        logger.error("Database error in get_inventory_series: %s", str(e))
+        raise
+
+
+def get_stats_series(db: Session, start_date: datetime, end_date: datetime, bucket: str):
+    try:
+        logger.info("Calculating %s stats series from %s to %s",
+                    bucket, start_date.isoformat(), end_date.isoformat())
+        bounds = stats_buckets(start_date, end_date, bucket)
+        if not bounds:
+            return []
+
+        # Adds and removals are grouped by bucket in one pass; the ones before
+        # the first bucket fall into bucket -1, which only seeds on_hand
+        first, size = bounds[0], bounds[1] - bounds[0]
+        end = as_naive_utc(from_us(bounds[-1]))
+
+        def bucket_of(column):
+            offset = epoch_us(column) - first
+            return case((offset < 0, -1), else_=offset // size)
+
+        events = union_all(
+            select(bucket_of(Roll.added_at).label("bucket"),
+                   literal(1).label("added"),
+                   literal(0).label("removed"),
+                   Roll.length.label("length"),
+                   Roll.weight.label("weight"))
+            .where(Roll.added_at < end),
+            select(bucket_of(Roll.removed_at), literal(0), literal(1), literal(0.0), literal(0.0))
+            .where(Roll.removed_at < end)
+        ).subquery()
+        rows = db.execute(
+            select(events.c.bucket, func.sum(events.c.added), func.sum(events.c.removed),
+                   func.total(events.c.length), func.total(events.c.weight))
+            .group_by(events.c.bucket)
+        )
+        totals = {bucket_no: (added, removed, length, weight)
+                  for bucket_no, added, removed, length, weight in rows}
+
+        added, removed, _, _ = totals.get(-1, (0, 0, 0.0, 0.0))
+        series, on_hand = [], added - removed
+        for bucket_no, (start_us, end_us) in enumerate(zip(bounds, bounds[1:])):
+            added, removed, length, weight = totals.get(bucket_no, (0, 0, 0.0, 0.0))
+            on_hand += added - removed
+            series.append({
+                "start": from_us(start_us),
+                "end": from_us(end_us),
+                "added_count": added,
+                "removed_count": removed,
+                "total_length": length,
+                "avg_length": length / added if added else 0,
+                "total_weight": weight,
+                "avg_weight": weight / added if added else 0,
+                "on_hand": on_hand,
+            })
+        return series
+    except SQLAlchemyError as e:
+        logger.error("Database error in get_stats_series: %s", str(e))
+        raise
@@ -1,20 +1,170 @@
-from sqlalchemy import create_engine
+import atexit
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from ..logger.logger import logger
+from ..metrics.metrics import DB_QUERY_SECONDS, POOL_CHECKOUT_SECONDS
 from config.config import settings
 from .in_memory_storage import InMemoryStorage
+from .shared_memory import SharedColumns, SharedInMemoryStorage
 from .database_storage import DatabaseStorage
+from .async_database_storage import AsyncDatabaseStorage
+from .sync_adapter import SyncStorageAdapter
+from .migrations import migrate
 
 
 
 DATABASE_URL = settings.database_url
 
+
+def async_database_url(url: str) -> str:
+    # Same database, reached through the aiosqlite driver
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+def engine_options(url: str) -> dict:
+    options = {}
+    if "sqlite" in url:
+        options["connect_args"] = {"check_same_thread": False}
+    if make_url(url).database not in (None, "", ":memory:"):
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+        )
+    return options
+
+
+class TimedCheckout:
+    # Records how long each checkout waited for a free (or new) connection
+    engine_kind = ""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started, self.engine_kind)
+
+
+class TimedQueuePool(TimedCheckout, QueuePool):
+    engine_kind = "sync"
+
+
+class TimedAsyncAdaptedQueuePool(TimedCheckout, AsyncAdaptedQueuePool):
+    engine_kind = "async"
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        cursor.execute(f"PRAGMA cache_size={int(settings.sqlite_cache_size)}")
+    finally:
+        cursor.close()
+
+
+slow_query_logger = logging.getLogger("api.slow_query")
+
+
+class QueryStats:
+    # Statements executed on behalf of one request, across threads and greenlets
+    __slots__ = ("request", "count", "seconds")
+
+    def __init__(self, request: str = ""):
+        self.request = request
+        self.count = 0
+        self.seconds = 0.0
+
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+def query_plan(conn, statement: str, parameters) -> list:
+    # Raw DBAPI cursor on the same connection, so no events fire for it
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        return [row[3] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+    DB_QUERY_SECONDS.observe(elapsed, statement.lstrip().split(None, 1)[0].upper())
+    if settings.slow_query_ms and elapsed * 1000 >= settings.slow_query_ms:
+        plan = None
+        if conn.dialect.name == "sqlite" and not executemany:
+            try:
+                plan = query_plan(conn, statement, parameters)
+            except Exception as e:
+                plan = [f"unavailable: {e}"]
+        slow_query_logger.warning("Slow query", extra={
+            "statement": statement,
+            "duration_ms": round(elapsed * 1000, 3),
+            "plan": plan,
+            "request": stats.request if stats is not None else None
+        })
+
+
+def handle_error(exception_context) -> None:
+    # after_cursor_execute does not run for a failed statement
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def instrument_queries(engine) -> None:
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+def create_db_engine(url: str):
+    options = engine_options(url)
+    if "pool_size" in options:
+        options["poolclass"] = TimedQueuePool
+    engine = create_engine(url, **options)
+    if "sqlite" in url:
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    instrument_queries(engine)
+    return engine
+
+
+def create_async_db_engine(url: str):
+    options = engine_options(url)
+    if "pool_size" in options:
+        options["poolclass"] = TimedAsyncAdaptedQueuePool
+    async_engine = create_async_engine(async_database_url(url), **options)
+    if "sqlite" in url:
+        event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+    instrument_queries(async_engine.sync_engine)
+    return async_engine
+
+
 try:
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-    )
+    engine = create_db_engine(DATABASE_URL)
     SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
     Base = declarative_base()
     logger.info("Database engine initialized")
@@ -22,18 +172,48 @@ except SQLAlchemyError as e:
     logger.critical("Database connection failed: %s", str(e))
     raise
 
-def get_storage():
+if settings.storage_type not in ("in_memory", "database_sync"):
+    try:
+        async_engine = create_async_db_engine(DATABASE_URL)
+        AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+        logger.info("Async database engine initialized")
+    except SQLAlchemyError as e:
+        logger.critical("Async database connection failed: %s", str(e))
+        raise
+
+if settings.storage_type != "in_memory":
+    migrate(engine)
+
+# One engine per process: every request must see the same rolls
+if settings.storage_type != "in_memory":
+    in_memory_storage = None
+elif settings.in_memory_shared_name:
+    in_memory_storage = SharedInMemoryStorage(SharedColumns(settings.in_memory_shared_name,
+                                                            settings.in_memory_shared_capacity))
+else:
+    in_memory_storage = InMemoryStorage()
+if in_memory_storage is not None and settings.in_memory_data_dir:
+    in_memory_storage.enable_persistence(settings.in_memory_data_dir, settings.journal_fsync_interval_ms,
+                                         settings.snapshot_every)
+    atexit.register(in_memory_storage.close)
+
+async def get_storage():
+    # Sessions live exactly as long as the request and always go back to the pool
     try:
         if settings.storage_type == "in_memory":
             logger.debug("Using InMemoryStorage")
-            return InMemoryStorage()
-        else:
-            logger.debug("Initializing DatabaseStorage")
+            yield SyncStorageAdapter(in_memory_storage, offload=False)
+        elif settings.storage_type == "database_sync":
+            logger.debug("Initializing DatabaseStorage in thread pool")
             db = SessionLocal()
-            return DatabaseStorage(db)
+            try:
+                yield SyncStorageAdapter(DatabaseStorage(db))
+            finally:
+                db.close()
+        else:
+            logger.debug("Initializing AsyncDatabaseStorage")
+            async with AsyncSessionLocal() as session:
+                yield AsyncDatabaseStorage(session)
     except SQLAlchemyError as e:
         logger.error("Database session error: %s", str(e))
         raise
-    except Exception as e:
-        logger.critical("Storage initialization failed: %s", str(e))
-        raise
\ No newline at end of file
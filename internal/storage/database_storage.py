@@ -1,22 +1,36 @@
-from datetime import datetime
+from datetime import datetime, timedelta, UTC
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from typing import Dict, Optional, List
+from typing import Dict, Iterator, List, Optional, Sequence
+from config.config import settings
 from .storage import StorageInterface
-from ..models.schemas import RollStats, RollCreate, RollResponse
-from .crud import create_roll, get_rolls, delete_roll, get_stats
-from ..logger.logger import logger
+from ..models.schemas import (RollStats, RollCreate, RollResponse, RollRemoveResponse,
+                              InventoryPoint, InventorySnapshot, StatsBucket)
+from ..models.serialization import ROLL_FIELDS
+from .crud import (create_roll, create_rolls, get_rolls, iter_rolls, delete_roll, remove_rolls, get_stats,
+                   get_inventory, get_inventory_series, get_stats_series)
+from ..metrics.metrics import timed_storage
+from .stats_cache import database_stats_cache
+from .write_coalescer import database_write_coalescer
+from .timestamps import to_us
+from ..logger.logger import lazy, logger
 
 
 class DatabaseStorage(StorageInterface):
     def __init__(self, db: Session):
         self.db = db
+        self.stats_cache = database_stats_cache(db.get_bind())
         logger.debug("DatabaseStorage initialized with session %s", id(db))
 
+    @timed_storage("create_roll")
     def create_roll(self, roll: RollCreate) -> RollResponse:
         try:
-            logger.info("Attempting to create roll: %s", roll.model_dump())
-            result = create_roll(self.db, roll)
+            logger.info("Attempting to create roll: %s", lazy(roll.model_dump))
+            with self.stats_cache.writing(to_us(datetime.now(UTC))):
+                if settings.write_coalesce_ms > 0:
+                    result = database_write_coalescer(self.db.get_bind()).create_roll(self.db, roll)
+                else:
+                    result = create_roll(self.db, roll)
             logger.debug("Roll created successfully. ID: %d", result.id)
             return result
         except SQLAlchemyError as e:
@@ -26,10 +40,27 @@ class DatabaseStorage(StorageInterface):
             logger.critical("Unexpected error in create_roll: %s", str(e))
             raise
 
-    def get_rolls(self, filters: Dict[str, Optional[str]]) -> List[RollResponse]:
+    @timed_storage("create_rolls")
+    def create_rolls(self, rolls: List[RollCreate]) -> range:
+        try:
+            logger.info("Attempting to create %d rolls", len(rolls))
+            with self.stats_cache.writing(to_us(datetime.now(UTC))):
+                result = create_rolls(self.db, rolls)
+            logger.debug("Rolls created successfully. IDs: %s", result)
+            return result
+        except SQLAlchemyError as e:
+            logger.error("Database error during batch creation: %s", str(e))
+            raise
+        except Exception as e:
+            logger.critical("Unexpected error in create_rolls: %s", str(e))
+            raise
+
+    @timed_storage("get_rolls")
+    def get_rolls(self, filters: Dict[str, Optional[str]], after_id: Optional[int] = None,
+                  limit: Optional[int] = None, fields: Sequence[str] = ROLL_FIELDS) -> List[tuple]:
         try:
             logger.info("Fetching rolls with filters: %s", filters)
-            result = get_rolls(self.db, filters)
+            result = get_rolls(self.db, filters, after_id, limit, fields)
             logger.debug("Found %d rolls matching filters", len(result))
             return result
         except SQLAlchemyError as e:
@@ -42,10 +73,18 @@ class DatabaseStorage(StorageInterface):
             logger.critical("Unexpected error in get_rolls: %s", str(e))
             raise
 
+    @timed_storage("iter_rolls")
+    def iter_rolls(self, filters: Dict[str, Optional[str]], after_id: Optional[int] = None,
+                   limit: Optional[int] = None, fields: Sequence[str] = ROLL_FIELDS) -> Iterator[tuple]:
+        logger.info("Streaming rolls with filters: %s", filters)
+        return iter_rolls(self.db, filters, after_id, limit, fields)
+
+    @timed_storage("delete_roll")
     def delete_roll(self, roll_id: int) -> Optional[RollResponse]:
         try:
             logger.info("Attempting to delete roll ID: %d", roll_id)
-            result = delete_roll(self.db, roll_id)
+            with self.stats_cache.writing(to_us(datetime.now(UTC))):
+                result = delete_roll(self.db, roll_id)
             if result:
                 logger.debug("Successfully marked roll %d as removed", roll_id)
             else:
@@ -58,11 +97,36 @@ class DatabaseStorage(StorageInterface):
             logger.critical("Unexpected error in delete_roll: %s", str(e))
             raise
 
+    @timed_storage("remove_rolls")
+    def remove_rolls(self, ids: Optional[List[int]] = None,
+                     filters: Optional[Dict[str, Optional[str]]] = None) -> RollRemoveResponse:
+        try:
+            logger.info("Attempting to remove rolls: ids=%s filters=%s",
+                        len(ids) if ids is not None else None, filters)
+            with self.stats_cache.writing(to_us(datetime.now(UTC))):
+                result = remove_rolls(self.db, ids, filters)
+            logger.debug("Removed %d rolls, %d not found", len(result["removed"]), len(result["not_found"]))
+            return result
+        except SQLAlchemyError as e:
+            logger.error("Database error during removal: %s", str(e))
+            raise
+        except ValueError as e:
+            logger.error("Invalid filter format: %s", str(e))
+            raise
+        except Exception as e:
+            logger.critical("Unexpected error in remove_rolls: %s", str(e))
+            raise
+
+    @timed_storage("get_stats")
     def get_stats(self, start_date: datetime, end_date: datetime) -> RollStats:
         try:
             logger.info("Calculating stats from %s to %s",
                       start_date.isoformat(), end_date.isoformat())
+            cached, generation = self.stats_cache.get(start_date, end_date)
+            if cached is not None:
+                return cached
             result = get_stats(self.db, start_date, end_date)
+            self.stats_cache.put(start_date, end_date, generation, result)
             logger.debug("Stats calculation completed. Total entries: %d", result["total_added"])
             return result
         except SQLAlchemyError as e:
@@ -76,4 +140,53 @@ class DatabaseStorage(StorageInterface):
             raise
         except Exception as e:
             logger.critical("Unexpected error in get_stats: %s", str(e))
-            raise
\ No newline at end of file
+            raise
+
+    @timed_storage("get_inventory")
+    def get_inventory(self, at: datetime, include_rolls: bool = False) -> InventorySnapshot:
+        try:
+            logger.info("Calculating inventory at %s", at.isoformat())
+            return get_inventory(self.db, at, include_rolls)
+        except SQLAlchemyError as e:
+            logger.error("Database error in get_inventory: %s", str(e))
+            raise
+        except Exception as e:
+            logger.critical("Unexpected error in get_inventory: %s", str(e))
+            raise
+
+    @timed_storage("get_inventory_series")
+    def get_inventory_series(self, start_date: datetime, end_date: datetime,
+                             step: timedelta) -> List[InventoryPoint]:
+        try:
+            logger.info("Calculating inventory series from %s to %s",
+                        start_date.isoformat(), end_date.isoformat())
+            return get_inventory_series(self.db, start_date, end_date, step)
+        except SQLAlchemyError as e:
+            logger.error("Database error in get_inventory_series: %s", str(e))
+            raise
+        except ValueError as e:
+            logger.error("Invalid series parameters: %s", str(e))
+            raise
+        except Exception as e:
+            logger.critical("Unexpected error in get_inventory_series: %s", str(e))
+            raise
+
+    @timed_storage("get_stats_series")
+    def get_stats_series(self, start_date: datetime, end_date: datetime,
+                         bucket: str) -> List[StatsBucket]:
+        try:
+            logger.info("Calculating %s stats series from %s to %s",
+                        bucket, start_date.isoformat(), end_date.isoformat())
+            return get_stats_series(self.db, start_date, end_date, bucket)
+        except SQLAlchemyError as e:
+            logger.error("Database error in get_stats_series: %s", str(e))
+            raise
+        except ValueError as e:
+            logger.error("Invalid series parameters: %s", str(e))
+            raise
+        except Exception as e:
+            logger.critical("Unexpected error in get_stats_series: %s", str(e))
+            raise
+
+    def write_version(self) -> Optional[str]:
+        return self.stats_cache.version
@@ -1,130 +1,547 @@
-from datetime import datetime, UTC
-from typing import List, Dict, Optional
-from ..models.schemas import RollStats, RollCreate, RollResponse
-from .storage import StorageInterface
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta, UTC
+from itertools import accumulate, compress, islice
+from functools import partial
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from ..models.schemas import (RollStats, RollCreate, RollResponse, RollRemoveResponse,
+                              InventoryPoint, InventorySnapshot, StatsBucket)
+from ..models.serialization import ROLL_FIELDS, RollRecord
+from .storage import StorageInterface, series_points, stats_buckets
+from .persistence import (ADDED, REMOVED, ROLL, ROW, SNAPSHOT_CHUNK, Journal, Section, column_chunks,
+                          read_snapshot, replay_journal, write_snapshot)
+from .sorted_index import SortedIndex
+from .stats_cache import StatsCache
+from .timestamps import DAY_US, split_days, to_us, from_us
+from ..metrics.metrics import timed_storage
 from ..logger.logger import logger
 
 
+# removed_at value of a roll that is still in stock; larger than any real timestamp
+NOT_REMOVED = 2 ** 63 - 1
+# removed_until before anything has been removed
+NONE_REMOVED = -2 ** 63
+
+INF = float("inf")
+# Rows iter_rolls checks per step when the filters leave too many candidates to sort
+STREAM_CHUNK = 10_000
+
+
+class DailyRollup:
+    # In-memory counterpart of the roll_daily_rollup table
+    __slots__ = ("added_count", "added_weight", "added_length", "min_length", "max_length",
+                 "min_weight", "max_weight", "removed_count", "removed_weight",
+                 "min_lifetime", "max_lifetime")
+
+    def __init__(self):
+        self.added_count = self.removed_count = 0
+        self.added_weight = self.added_length = self.removed_weight = 0.0
+        self.min_length = self.min_weight = self.min_lifetime = INF
+        self.max_length = self.max_weight = self.max_lifetime = -INF
+
+    def add(self, length: float, weight: float) -> None:
+        self.added_count += 1
+        self.added_weight += weight
+        self.added_length += length
+        self.min_length = min(self.min_length, length)
+        self.max_length = max(self.max_length, length)
+        self.min_weight = min(self.min_weight, weight)
+        self.max_weight = max(self.max_weight, weight)
+
+    def add_many(self, lengths: array, weights: array) -> None:
+        self.added_count += len(lengths)
+        self.added_weight += sum(weights)
+        self.added_length += sum(lengths)
+        self.min_length = min(self.min_length, min(lengths))
+        self.max_length = max(self.max_length, max(lengths))
+        self.min_weight = min(self.min_weight, min(weights))
+        self.max_weight = max(self.max_weight, max(weights))
+
+    def remove(self, weight: float, lifetime: float) -> None:
+        self.removed_count += 1
+        self.removed_weight += weight
+        self.min_lifetime = min(self.min_lifetime, lifetime)
+        self.max_lifetime = max(self.max_lifetime, lifetime)
+
+    def copy(self) -> "DailyRollup":
+        rollup = DailyRollup.__new__(DailyRollup)
+        rollup.added_count, rollup.added_weight, rollup.added_length = \
+            self.added_count, self.added_weight, self.added_length
+        rollup.min_length, rollup.max_length = self.min_length, self.max_length
+        rollup.min_weight, rollup.max_weight = self.min_weight, self.max_weight
+        rollup.removed_count, rollup.removed_weight = self.removed_count, self.removed_weight
+        rollup.min_lifetime, rollup.max_lifetime = self.min_lifetime, self.max_lifetime
+        return rollup
+
+
+class Version(NamedTuple):
+    # What readers see: rows below `rows`, the first `removed` entries of the
+    # removal log, and removals stamped up to `removed_until`. Removal times
+    # strictly increase, so removed_at, the one column changed in place, is
+    # cut at the same point as the removal log. The daily rollups and their
+    # sorted day numbers are the ones written up to the same point; neither
+    # is changed once published.
+    rows: int
+    removed: int
+    removed_until: int
+    daily: Dict[int, "DailyRollup"]
+    days: array
+
+
 class InMemoryStorage(StorageInterface):
+    # Rolls are kept column-wise in typed arrays (8 bytes per field) instead of a
+    # list of pydantic models. Ids are dense and never reused, so row i holds the
+    # roll with id i + 1 and the id column is implicit. added_at never goes
+    # backwards, so time windows are bisected instead of scanned; weight, length
+    # and removal time have their own sorted indexes.
+    #
+    # Writers take _write_lock, append or stamp in place, then publish a new
+    # Version; readers take the published Version once and never look past
+    # it, so they need no lock and copy nothing. The daily rollups are copied
+    # on write and published with the Version. Index runs are replaced rather
+    # than changed, so a reader sees each one either before or after a write,
+    # though possibly after one its Version misses.
     def __init__(self):
-        self.rolls = []
-        self._next_id = 1
+        self._lengths = array("d")
+        self._weights = array("d")
+        self._added_at = array("q")
+        self._removed_at = array("q")
+        # Rows in the order they were removed, i.e. sorted by removed_at
+        self._removed_rows = array("q")
+        # Running weight totals in row order and in removal order, one entry longer
+        # than the rows they cover; stock at T is a difference of two prefixes
+        self._added_weight_sums = array("d", [0.0])
+        self._removed_weight_sums = array("d", [0.0])
+        # UTC day number -> DailyRollup, plus the day numbers in sorted order;
+        # the writer's copies, which become the published ones on _publish
+        self._daily: Dict[int, DailyRollup] = {}
+        self._days = array("q")
+        self._weight_index = SortedIndex(self._weights)
+        self._length_index = SortedIndex(self._lengths)
+        self.stats_cache = StatsCache("in_memory")
+        # Reentrant for SharedInMemoryStorage, which catches up inside writes
+        self._write_lock = threading.RLock()
+        self._version = Version(0, 0, NONE_REMOVED, self._daily, self._days)
+        # Set by enable_persistence
+        self._journal: Optional[Journal] = None
+        self._directory = None
+        self._snapshot_every = 0
+        self._journaled = 0
+        self._snapshot_thread: Optional[threading.Thread] = None
         logger.info("InMemoryStorage initialized with empty storage")
 
+    def __len__(self) -> int:
+        return self._version.rows
+
+    def _publish(self) -> None:
+        removed = len(self._removed_rows)
+        until = self._removed_at[self._removed_rows[-1]] if removed else NONE_REMOVED
+        self._version = Version(len(self._added_at), removed, until, self._daily, self._days)
+
+    def _to_response(self, row: int, removed_until: int) -> RollResponse:
+        removed_at = self._removed_at[row]
+        return RollResponse.model_construct(
+            id=row + 1,
+            length=self._lengths[row],
+            weight=self._weights[row],
+            added_at=from_us(self._added_at[row]),
+            removed_at=None if removed_at > removed_until else from_us(removed_at)
+        )
+
+    def _to_record(self, removed_until: int, row: int) -> RollRecord:
+        removed_at = self._removed_at[row]
+        return RollRecord(
+            row + 1,
+            self._lengths[row],
+            self._weights[row],
+            from_us(self._added_at[row]),
+            None if removed_at > removed_until else from_us(removed_at)
+        )
+
+    def _projection(self, fields: Sequence[str], removed_until: int) -> Callable[[int], tuple]:
+        # Only the requested columns are read and converted
+        if tuple(fields) == ROLL_FIELDS:
+            return partial(self._to_record, removed_until)
+        removed_at = self._removed_at
+        getters = {
+            "id": lambda row: row + 1,
+            "length": self._lengths.__getitem__,
+            "weight": self._weights.__getitem__,
+            "added_at": lambda row: from_us(self._added_at[row]),
+            "removed_at": lambda row: None if removed_at[row] > removed_until else from_us(removed_at[row]),
+        }
+        columns = [getters[name] for name in fields]
+        return lambda row: tuple(column(row) for column in columns)
+
+    def _rollup(self, at: int) -> DailyRollup:
+        # A private copy of the day's rollup, made visible by _put_rollup
+        rollup = self._daily.get(at // DAY_US)
+        return DailyRollup() if rollup is None else rollup.copy()
+
+    def _put_rollup(self, at: int, rollup: DailyRollup) -> None:
+        # The published dict and days stay as they are; a write copies each at most once
+        day = at // DAY_US
+        version = self._version
+        if self._daily is version.daily:
+            self._daily = dict(self._daily)
+        new_day = day not in self._daily
+        self._daily[day] = rollup
+        if new_day:
+            if self._days is version.days:
+                self._days = array("q", self._days)
+            insort(self._days, day)
+
+    def _next_added_at(self) -> int:
+        added_at = to_us(datetime.now(UTC))
+        if self._added_at and added_at < self._added_at[-1]:
+            added_at = self._added_at[-1]
+        return added_at
+
+    def _add_roll(self, added_at: int, length: float, weight: float) -> None:
+        self._lengths.append(length)
+        self._weights.append(weight)
+        self._added_at.append(added_at)
+        self._removed_at.append(NOT_REMOVED)
+        self._added_weight_sums.append(self._added_weight_sums[-1] + weight)
+        rollup = self._rollup(added_at)
+        rollup.add(length, weight)
+        self._put_rollup(added_at, rollup)
+
+    def _add_rolls(self, added_at: int, lengths: array, weights: array) -> None:
+        row = len(self._added_at)
+        self._lengths.extend(lengths)
+        self._weights.extend(weights)
+        self._added_at.extend(array("q", [added_at]) * len(lengths))
+        self._removed_at.extend(array("q", [NOT_REMOVED]) * len(lengths))
+        self._added_weight_sums.extend(accumulate(weights, initial=self._added_weight_sums[-1]))
+        # accumulate repeats the starting total; drop it
+        del self._added_weight_sums[row + 1]
+        rollup = self._rollup(added_at)
+        rollup.add_many(lengths, weights)
+        self._put_rollup(added_at, rollup)
+
+    def _written(self, since: int, rolls: int) -> None:
+        # Published first: a reader that sees the new generation sees the write
+        self._publish()
+        self.stats_cache.invalidate(since)
+        if self._journal is not None:
+            self._journaled += rolls
+            if self._journaled >= self._snapshot_every and not self.snapshot_running():
+                self._start_snapshot()
+
+    @timed_storage("create_roll")
     def create_roll(self, roll: RollCreate) -> RollResponse:
         try:
-            roll_data = RollResponse(
-                id=self._next_id,
-                length=roll.length,
-                weight=roll.weight,
-                added_at=datetime.now(UTC),
-                removed_at=None
-            )
-            self.rolls.append(roll_data)
-            logger.debug("Created in-memory roll ID: %d", self._next_id)
-            self._next_id += 1
-            return roll_data
+            with self._write_lock:
+                row = len(self._added_at)
+                added_at = self._next_added_at()
+                # Journaled first: a roll that is not in the journal is never visible
+                if self._journal is not None:
+                    self._journal.write(ADDED, added_at, 1, ROLL.pack(roll.length, roll.weight))
+                self._add_roll(added_at, roll.length, roll.weight)
+                self._written(added_at, 1)
+                removed_until = self._version.removed_until
+            logger.debug("Created in-memory roll ID: %d", row + 1)
+            return self._to_response(row, removed_until)
         except Exception as e:
             logger.error("Failed to create in-memory roll: %s", str(e))
             raise
 
-    def get_rolls(self, filters: Dict[str, Optional[str]]) -> List[RollResponse]:
+    @timed_storage("create_rolls")
+    def create_rolls(self, rolls: List[RollCreate]) -> range:
+        try:
+            if not rolls:
+                return range(0)
+            lengths = array("d", [roll.length for roll in rolls])
+            weights = array("d", [roll.weight for roll in rolls])
+            with self._write_lock:
+                row = len(self._added_at)
+                added_at = self._next_added_at()
+                if self._journal is not None:
+                    self._journal.write(ADDED, added_at, len(rolls), lengths.tobytes() + weights.tobytes())
+                self._add_rolls(added_at, lengths, weights)
+                self._written(added_at, len(rolls))
+            logger.debug("Created in-memory rolls ID: %d-%d", row + 1, row + len(rolls))
+            return range(row + 1, row + len(rolls) + 1)
+        except Exception as e:
+            logger.error("Failed to create in-memory rolls: %s", str(e))
+            raise
+
+    def _plan(self, filters: Dict[str, Optional[str]], version: Version) -> Tuple[int, int, list]:
+        # The row span the id and added_at filters leave, and a (rows, count,
+        # check) candidate for every index that can drive the lookup
+        size = version.rows
+        # id and added_at both grow with the row number, so they narrow one row span
+        row_lo, row_hi = 0, size
+        candidates = []
+
+        if filters.get("id_range"):
+            try:
+                id_min, id_max = map(int, filters["id_range"].split(","))
+                row_lo, row_hi = max(row_lo, id_min - 1), min(row_hi, id_max)
+                logger.debug("Applied ID filter: %d-%d", id_min, id_max)
+            except ValueError as e:
+                logger.error("Invalid ID range format: %s", str(e))
+                raise
+
+        if filters.get("weight_range"):
+            try:
+                weight_min, weight_max = map(float, filters["weight_range"].split(","))
+                spans, tail = self._weight_index.search(weight_min, weight_max, size)
+                check = (self._weights, weight_min, weight_max)
+                candidates.append((SortedIndex.rows(spans, tail), SortedIndex.count(spans, tail), check))
+                logger.debug("Applied weight filter: %.2f-%.2f", weight_min, weight_max)
+            except ValueError as e:
+                logger.error("Invalid weight range format: %s", str(e))
+                raise
+
+        if filters.get("length_range"):
+            try:
+                length_min, length_max = map(float, filters["length_range"].split(","))
+                spans, tail = self._length_index.search(length_min, length_max, size)
+                check = (self._lengths, length_min, length_max)
+                candidates.append((SortedIndex.rows(spans, tail), SortedIndex.count(spans, tail), check))
+                logger.debug("Applied length filter: %.2f-%.2f", length_min, length_max)
+            except ValueError as e:
+                logger.error("Invalid length range format: %s", str(e))
+                raise
+
+        if filters.get("added_at_range"):
+            try:
+                added_min, added_max = map(datetime.fromisoformat, filters["added_at_range"].split(","))
+                row_lo = max(row_lo, bisect_left(self._added_at, to_us(added_min), 0, size))
+                row_hi = min(row_hi, bisect_right(self._added_at, to_us(added_max), 0, size))
+                logger.debug("Applied added_at filter: %s - %s", added_min, added_max)
+            except ValueError as e:
+                logger.error("Invalid added_at range format: %s", str(e))
+                raise
+
+        if filters.get("removed_at_range"):
+            try:
+                removed_min, removed_max = map(datetime.fromisoformat, filters["removed_at_range"].split(","))
+                lo, hi = to_us(removed_min), to_us(removed_max)
+                key = self._removed_at.__getitem__
+                log_lo = bisect_left(self._removed_rows, lo, 0, version.removed, key=key)
+                log_hi = max(bisect_right(self._removed_rows, hi, 0, version.removed, key=key), log_lo)
+                # NOT_REMOVED and later removals are above the upper bound, so they fail this check
+                check = (self._removed_at, lo, min(hi, version.removed_until))
+                candidates.append((self._removed_rows[log_lo:log_hi], log_hi - log_lo, check))
+                logger.debug("Applied removed_at filter: %s - %s", removed_min, removed_max)
+            except ValueError as e:
+                logger.error("Invalid removed_at range format: %s", str(e))
+                raise
+
+        return row_lo, row_hi, candidates
+
+    def _filter_rows(self, filters: Dict[str, Optional[str]], version: Version) -> Sequence[int]:
+        # Row numbers matching the range filters, in id order
+        return self._matching(*self._plan(filters, version))
+
+    @staticmethod
+    def _matching(row_lo: int, row_hi: int, candidates: list) -> Sequence[int]:
+        span = range(row_lo, max(row_hi, row_lo))
+        candidates = [*candidates, (span, len(span), None)]
+        # Start from the most selective index and check the rest per row
+        rows, _, driver_check = min(candidates, key=lambda c: c[1])
+        for _, _, check in candidates:
+            if check is not None and check is not driver_check:
+                column, low, high = check
+                rows = [r for r in rows if low <= column[r] <= high]
+        if driver_check is not None:
+            rows = sorted(r for r in rows if row_lo <= r < row_hi)
+        return rows
+
+    def _page(self, filters: Dict[str, Optional[str]], after_id: Optional[int],
+              limit: Optional[int], version: Version) -> Sequence[int]:
+        rows = self._filter_rows(filters, version)
+        # Rows are in id order and row = id - 1, so the cursor is a bisect
+        start = bisect_left(rows, after_id) if after_id is not None else 0
+        return rows[start:] if limit is None else rows[start:start + limit]
+
+    def _stream(self, filters: Dict[str, Optional[str]], after_id: Optional[int],
+                limit: Optional[int], version: Version) -> Iterator[int]:
+        # _page without building the whole match list: when no index narrows
+        # the candidates to a chunk, the span is checked one chunk at a time
+        row_lo, row_hi, candidates = self._plan(filters, version)
+        if after_id is not None:
+            row_lo = max(row_lo, after_id)
+        span = range(row_lo, max(row_hi, row_lo))
+        if any(count <= STREAM_CHUNK and count < len(span) for _, count, _ in candidates):
+            rows = iter(self._matching(row_lo, row_hi, candidates))
+        else:
+            rows = self._scan(span, [check for _, _, check in candidates])
+        return rows if limit is None else islice(rows, limit)
+
+    @staticmethod
+    def _scan(span: range, checks: list) -> Iterator[int]:
+        for start in range(span.start, span.stop, STREAM_CHUNK):
+            rows = range(start, min(start + STREAM_CHUNK, span.stop))
+            for column, low, high in checks:
+                rows = [r for r in rows if low <= column[r] <= high]
+            yield from rows
+
+    @timed_storage("get_rolls")
+    def get_rolls(self, filters: Dict[str, Optional[str]], after_id: Optional[int] = None,
+                  limit: Optional[int] = None, fields: Sequence[str] = ROLL_FIELDS) -> List[tuple]:
         try:
             logger.debug("Applying filters: %s", filters)
-            filtered = self.rolls.copy()
-
-            if filters.get("id_range"):
-                try:
-                    id_min, id_max = map(int, filters["id_range"].split(","))
-                    filtered = [r for r in filtered if id_min <= r.id <= id_max]
-                    logger.debug("Applied ID filter: %d-%d", id_min, id_max)
-                except ValueError as e:
-                    logger.error("Invalid ID range format: %s", str(e))
-                    raise
-
-            if filters.get("weight_range"):
-                try:
-                    weight_min, weight_max = map(float, filters["weight_range"].split(","))
-                    filtered = [r for r in filtered if weight_min <= r.weight <= weight_max]
-                    logger.debug("Applied weight filter: %.2f-%.2f", weight_min, weight_max)
-                except ValueError as e:
-                    logger.error("Invalid weight range format: %s", str(e))
-                    raise
-
-            if filters.get("length_range"):
-                try:
-                    length_min, length_max = map(float, filters["length_range"].split(","))
-                    filtered = [r for r in filtered if length_min <= r.length <= length_max]
-                    logger.debug("Applied length filter: %.2f-%.2f", length_min, length_max)
-                except ValueError as e:
-                    logger.error("Invalid length range format: %s", str(e))
-                    raise
-
-            if filters.get("added_at_range"):
-                try:
-                    added_min, added_max = map(datetime.fromisoformat, filters["added_at_range"].split(","))
-                    filtered = [r for r in filtered if added_min <= r.added_at <= added_max]
-                    logger.debug("Applied added_at filter: %s - %s", added_min, added_max)
-                except ValueError as e:
-                    logger.error("Invalid added_at range format: %s", str(e))
-                    raise
-
-            if filters.get("removed_at_range"):
-                try:
-                    removed_min, removed_max = map(datetime.fromisoformat, filters["removed_at_range"].split(","))
-                    filtered = [r for r in filtered if r.removed_at and removed_min <= r.removed_at <= removed_max]
-                    logger.debug("Applied removed_at filter: %s - %s", removed_min, removed_max)
-                except ValueError as e:
-                    logger.error("Invalid removed_at range format: %s", str(e))
-                    raise
-
-            logger.info("Returning %d filtered rolls", len(filtered))
-            return filtered
+            version = self._version
+            rows = self._page(filters, after_id, limit, version)
+            logger.info("Returning %d filtered rolls", len(rows))
+            return list(map(self._projection(fields, version.removed_until), rows))
         except Exception as e:
             logger.error("Failed to filter rolls: %s", str(e))
             raise
 
+    @timed_storage("iter_rolls")
+    def iter_rolls(self, filters: Dict[str, Optional[str]], after_id: Optional[int] = None,
+                   limit: Optional[int] = None, fields: Sequence[str] = ROLL_FIELDS) -> Iterator[tuple]:
+        try:
+            logger.debug("Streaming rolls with filters: %s", filters)
+            version = self._version
+            return map(self._projection(fields, version.removed_until), self._stream(filters, after_id, limit, version))
+        except Exception as e:
+            logger.error("Failed to filter rolls: %s", str(e))
+            raise
+
+    def _remove_row(self, row: int, removed_at: int) -> None:
+        # Strictly increasing removal times keep _removed_rows sorted by removed_at
+        if self._removed_rows:
+            removed_at = max(removed_at, self._removed_at[self._removed_rows[-1]] + 1)
+        self._removed_at[row] = removed_at
+        self._removed_rows.append(row)
+        self._removed_weight_sums.append(self._removed_weight_sums[-1] + self._weights[row])
+        rollup = self._rollup(removed_at)
+        rollup.remove(self._weights[row], (removed_at - self._added_at[row]) / DAY_US)
+        self._put_rollup(removed_at, rollup)
+
+    @timed_storage("delete_roll")
     def delete_roll(self, roll_id: int) -> Optional[RollResponse]:
         try:
             logger.debug("Attempting to delete roll ID: %d", roll_id)
-            for index, roll in enumerate(self.rolls):
-                if roll.id == roll_id:
-                    self.rolls[index] = roll.copy(update={"removed_at": datetime.now(UTC)})
-                    logger.info("Marked roll %d as removed", roll_id)
-                    return self.rolls[index]
-            logger.warning("Roll %d not found for deletion", roll_id)
-            return None
+            row = roll_id - 1
+            with self._write_lock:
+                if not 0 <= row < len(self._added_at) or self._removed_at[row] != NOT_REMOVED:
+                    logger.warning("Roll %d not found for deletion", roll_id)
+                    return None
+                removed_at = to_us(datetime.now(UTC))
+                if self._journal is not None:
+                    self._journal.write(REMOVED, removed_at, 1, ROW.pack(row))
+                self._remove_row(row, removed_at)
+                self._written(removed_at, 1)
+                removed_until = self._version.removed_until
+            logger.info("Marked roll %d as removed", roll_id)
+            return self._to_response(row, removed_until)
         except Exception as e:
             logger.error("Failed to delete roll %d: %s", roll_id, str(e))
             raise
 
+    @timed_storage("remove_rolls")
+    def remove_rolls(self, ids: Optional[List[int]] = None,
+                     filters: Optional[Dict[str, Optional[str]]] = None) -> RollRemoveResponse:
+        try:
+            with self._write_lock:
+                removed_at = to_us(datetime.now(UTC))
+                size = len(self._added_at)
+                rows, not_found = array("q"), []
+                if ids is not None:
+                    logger.debug("Attempting to remove %d rolls by id", len(ids))
+                    for roll_id in dict.fromkeys(ids):
+                        row = roll_id - 1
+                        if 0 <= row < size and self._removed_at[row] == NOT_REMOVED:
+                            rows.append(row)
+                        else:
+                            not_found.append(roll_id)
+                else:
+                    logger.debug("Attempting to remove rolls matching filters: %s", filters)
+                    rows.extend(row for row in self._filter_rows(filters, self._version)
+                                if self._removed_at[row] == NOT_REMOVED)
+                if rows:
+                    if self._journal is not None:
+                        self._journal.write(REMOVED, removed_at, len(rows), rows.tobytes())
+                    for row in rows:
+                        self._remove_row(row, removed_at)
+                    self._written(removed_at, len(rows))
+            removed = [row + 1 for row in rows]
+            logger.info("Marked %d rolls as removed, %d not found", len(removed), len(not_found))
+            return RollRemoveResponse(removed=removed, not_found=not_found)
+        except Exception as e:
+            logger.error("Failed to remove rolls: %s", str(e))
+            raise
+
+    @timed_storage("get_stats")
     def get_stats(self, start_date: datetime, end_date: datetime) -> RollStats:
+        stats, generation = self.stats_cache.get(start_date, end_date)
+        if stats is None:
+            stats = self._compute_stats(start_date, end_date)
+            self.stats_cache.put(start_date, end_date, generation, stats)
+        return stats
+
+    def _compute_stats(self, start_date: datetime, end_date: datetime) -> RollStats:
         try:
             logger.info("Calculating stats between %s and %s",
                         start_date.isoformat(), end_date.isoformat())
 
-            filtered = [r for r in self.rolls if start_date <= r.added_at <= end_date]
-            total_added = len(filtered)
-            total_removed = len([r for r in filtered if r.removed_at])
+            # Same window semantics as crud.get_stats: whole days come from the
+            # daily rollups, partial days at the edges from the columns
+            version = self._version
+            days = version.days
+            full_days, edges = split_days(to_us(start_date), to_us(end_date))
+            total = DailyRollup()
+            first = bisect_left(days, full_days.start)
+            last = bisect_left(days, full_days.stop)
+            for day in days[first:last]:
+                rollup = version.daily[day]
+                total.added_count += rollup.added_count
+                total.added_weight += rollup.added_weight
+                total.added_length += rollup.added_length
+                total.min_length = min(total.min_length, rollup.min_length)
+                total.max_length = max(total.max_length, rollup.max_length)
+                total.min_weight = min(total.min_weight, rollup.min_weight)
+                total.max_weight = max(total.max_weight, rollup.max_weight)
+                total.removed_count += rollup.removed_count
+                total.min_lifetime = min(total.min_lifetime, rollup.min_lifetime)
+                total.max_lifetime = max(total.max_lifetime, rollup.max_lifetime)
 
-            lengths = [r.length for r in filtered]
-            weights = [r.weight for r in filtered]
-            time_diffs = [(r.removed_at - r.added_at).days for r in filtered if r.removed_at]
+            key = self._removed_at.__getitem__
+            for lo, hi in edges:
+                first = bisect_left(self._added_at, lo, 0, version.rows)
+                last = bisect_right(self._added_at, hi, 0, version.rows)
+                if last > first:
+                    lengths, weights = self._lengths[first:last], self._weights[first:last]
+                    total.added_count += last - first
+                    total.added_weight += sum(weights)
+                    total.added_length += sum(lengths)
+                    total.min_length = min(total.min_length, min(lengths))
+                    total.max_length = max(total.max_length, max(lengths))
+                    total.min_weight = min(total.min_weight, min(weights))
+                    total.max_weight = max(total.max_weight, max(weights))
+                first = bisect_left(self._removed_rows, lo, 0, version.removed, key=key)
+                last = bisect_right(self._removed_rows, hi, 0, version.removed, key=key)
+                for row in self._removed_rows[first:last]:
+                    lifetime = (self._removed_at[row] - self._added_at[row]) / DAY_US
+                    total.removed_count += 1
+                    total.min_lifetime = min(total.min_lifetime, lifetime)
+                    total.max_lifetime = max(total.max_lifetime, lifetime)
 
-            logger.debug("Processed %d entries for stats", len(filtered))
+            logger.debug("Processed %d entries for stats", total.added_count)
 
+            added = total.added_count
             return RollStats(
-                total_added=total_added,
-                total_removed=total_removed,
-                avg_length=sum(lengths) / len(lengths) if lengths else 0,
-                avg_weight=sum(weights) / len(weights) if weights else 0,
-                max_length=max(lengths) if lengths else 0,
-                min_length=min(lengths) if lengths else 0,
-                max_weight=max(weights) if weights else 0,
-                min_weight=min(weights) if weights else 0,
-                total_weight=sum(weights) if weights else 0,
-                max_time_diff=max(time_diffs) if time_diffs else None,
-                min_time_diff=min(time_diffs) if time_diffs else None
+                total_added=added,
+                total_removed=total.removed_count,
+                avg_length=total.added_length / added if added else 0,
+                avg_weight=total.added_weight / added if added else 0,
+                max_length=total.max_length if added else 0,
+                min_length=total.min_length if added else 0,
+                max_weight=total.max_weight if added else 0,
+                min_weight=total.min_weight if added else 0,
+                total_weight=total.added_weight,
+                max_time_diff=total.max_lifetime if total.removed_count else None,
+                min_time_diff=total.min_lifetime if total.removed_count else None
             )
         except ZeroDivisionError:
             logger.error("Empty dataset for stats calculation")
@@ -143,4 +560,226 @@ class InMemoryStorage(StorageInterface):
             )
         except Exception as e:
             logger.critical("Failed to calculate stats: %s", str(e))
-            raise
\ No newline at end of file
+            raise
+
+    def write_version(self) -> Optional[str]:
+        return self.stats_cache.version
+
+    def _on_hand(self, at: int, version: Version) -> Tuple[int, int]:
+        # Rolls removed by `at` were also added by then, so both counts are prefixes
+        added = bisect_right(self._added_at, at, 0, version.rows)
+        removed = bisect_right(self._removed_rows, at, 0, version.removed, key=self._removed_at.__getitem__)
+        return added, removed
+
+    @timed_storage("get_inventory")
+    def get_inventory(self, at: datetime, include_rolls: bool = False) -> InventorySnapshot:
+        try:
+            logger.debug("Calculating inventory at %s", at.isoformat())
+            at_us = to_us(at)
+            version = self._version
+            added, removed = self._on_hand(at_us, version)
+            rolls = None
+            if include_rolls:
+                until = min(at_us, version.removed_until)
+                in_stock = compress(range(added), map(until.__lt__, self._removed_at[:added]))
+                rolls = [self._to_response(r, version.removed_until) for r in in_stock]
+            return InventorySnapshot(
+                at=at,
+                count=added - removed,
+                total_weight=self._added_weight_sums[added] - self._removed_weight_sums[removed],
+                rolls=rolls
+            )
+        except Exception as e:
+            logger.error("Failed to calculate inventory: %s", str(e))
+            raise
+
+    @timed_storage("get_inventory_series")
+    def get_inventory_series(self, start_date: datetime, end_date: datetime,
+                             step: timedelta) -> List[InventoryPoint]:
+        try:
+            logger.debug("Calculating inventory series from %s to %s",
+                         start_date.isoformat(), end_date.isoformat())
+            series, version = [], self._version
+            for at in series_points(start_date, end_date, step):
+                added, removed = self._on_hand(to_us(at), version)
+                series.append(InventoryPoint(
+                    at=at,
+                    count=added - removed,
+                    total_weight=self._added_weight_sums[added] - self._removed_weight_sums[removed]
+                ))
+            return series
+        except Exception as e:
+            logger.error("Failed to calculate inventory series: %s", str(e))
+            raise
+
+    @timed_storage("get_stats_series")
+    def get_stats_series(self, start_date: datetime, end_date: datetime,
+                         bucket: str) -> List[StatsBucket]:
+        try:
+            logger.debug("Calculating %s stats series from %s to %s",
+                         bucket, start_date.isoformat(), end_date.isoformat())
+            bounds = stats_buckets(start_date, end_date, bucket)
+            version = self._version
+            # Both the added_at column and the removal log are in time order, so
+            # one bisect per boundary splits each into buckets, and the rows
+            # added in a bucket are a contiguous slice
+            key = self._removed_at.__getitem__
+            added = [bisect_left(self._added_at, at, 0, version.rows) for at in bounds]
+            removed = [bisect_left(self._removed_rows, at, 0, version.removed, key=key) for at in bounds]
+            series = []
+            for i in range(len(bounds) - 1):
+                first, last = added[i], added[i + 1]
+                count = last - first
+                length = sum(self._lengths[first:last])
+                weight = self._added_weight_sums[last] - self._added_weight_sums[first]
+                series.append(StatsBucket(
+                    start=from_us(bounds[i]),
+                    end=from_us(bounds[i + 1]),
+                    added_count=count,
+                    removed_count=removed[i + 1] - removed[i],
+                    total_length=length,
+                    avg_length=length / count if count else 0,
+                    total_weight=weight,
+                    avg_weight=weight / count if count else 0,
+                    on_hand=last - removed[i + 1]
+                ))
+            return series
+        except Exception as e:
+            logger.error("Failed to calculate stats series: %s", str(e))
+            raise
+
+    def enable_persistence(self, directory: str, fsync_interval_ms: float = 10.0,
+                           snapshot_every: int = 100_000) -> None:
+        # Loads the last snapshot, replays the journal written after it, and
+        # from then on journals every write before applying it. A snapshot is
+        # started in the background every snapshot_every journaled rolls,
+        # which bounds the replay on the next start.
+        try:
+            if len(self._added_at) or self._journal is not None:
+                raise ValueError("Persistence must be enabled on an empty storage")
+            started = time.perf_counter()
+            os.makedirs(directory, exist_ok=True)
+            snapshot = read_snapshot(directory)
+            first_segment = 0
+            if snapshot is not None:
+                self._restore(*snapshot)
+                first_segment = snapshot[0]["segment"]
+            replayed = sum(self._replay(kind, timestamp, payload)
+                           for kind, timestamp, payload in replay_journal(directory, first_segment))
+            self._publish()
+            self._journal = Journal(directory, fsync_interval_ms / 1000)
+            self._directory = directory
+            self._snapshot_every = snapshot_every
+            self._journaled = replayed
+            logger.info("Loaded %d rolls from %s in %.0f ms, %d replayed from the journal",
+                        len(self._added_at), directory, (time.perf_counter() - started) * 1000, replayed)
+        except (OSError, ValueError) as e:
+            logger.critical("Failed to load in-memory storage from %s: %s", directory, str(e))
+            raise
+
+    def close(self) -> None:
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def snapshot_running(self) -> bool:
+        return self._snapshot_thread is not None and self._snapshot_thread.is_alive()
+
+    def _replay(self, kind: bytes, timestamp: int, payload: memoryview) -> int:
+        if kind == ADDED:
+            count = len(payload) // ROLL.size
+            if count == 1:
+                self._add_roll(timestamp, *ROLL.unpack(payload))
+            else:
+                lengths, weights = array("d"), array("d")
+                lengths.frombytes(payload[:count * 8])
+                weights.frombytes(payload[count * 8:])
+                self._add_rolls(timestamp, lengths, weights)
+            return count
+        rows = array("q")
+        rows.frombytes(payload)
+        # The same starting time gives the same removal times as before
+        for row in rows:
+            self._remove_row(row, timestamp)
+        return len(rows)
+
+    def _start_snapshot(self) -> None:
+        # Runs between two writes, so the state here is exactly the journal
+        # before the new segment. Only removed_at changes in place; the other
+        # columns and the index runs are append-only or replaced, so the
+        # background thread can copy their prefixes while writes go on.
+        segment = self._journal.rotate()
+        rows, removed = len(self._added_at), len(self._removed_rows)
+        weight_runs, weight_indexed = self._weight_index.state()
+        length_runs, length_indexed = self._length_index.state()
+        header = {
+            "segment": segment,
+            "daily": [[day, *(getattr(self._daily[day], name) for name in DailyRollup.__slots__)]
+                      for day in self._days],
+            "weight_runs": [len(run) for run in weight_runs],
+            "weight_indexed": weight_indexed,
+            "length_runs": [len(run) for run in length_runs],
+            "length_indexed": length_indexed,
+        }
+        sections: List[Section] = [
+            ("lengths", "d", rows, column_chunks(self._lengths, rows)),
+            ("weights", "d", rows, column_chunks(self._weights, rows)),
+            ("added_at", "q", rows, column_chunks(self._added_at, rows)),
+            ("removed_at", "q", rows, self._removed_at_chunks(rows, removed)),
+            ("removed_rows", "q", removed, column_chunks(self._removed_rows, removed)),
+            ("added_weight_sums", "d", rows + 1, column_chunks(self._added_weight_sums, rows + 1)),
+            ("removed_weight_sums", "d", removed + 1, column_chunks(self._removed_weight_sums, removed + 1)),
+            ("weight_runs", "q", sum(header["weight_runs"]), weight_runs),
+            ("length_runs", "q", sum(header["length_runs"]), length_runs),
+        ]
+        self._journaled = 0
+        self._snapshot_thread = threading.Thread(target=self._write_snapshot, args=(header, sections),
+                                                 name="snapshot", daemon=True)
+        self._snapshot_thread.start()
+
+    def _removed_at_chunks(self, rows: int, removed: int) -> Iterator[array]:
+        # Rolls removed after the snapshot started are written as still in stock
+        for start in range(0, rows, SNAPSHOT_CHUNK):
+            stop = min(start + SNAPSHOT_CHUNK, rows)
+            chunk = self._removed_at[start:stop]
+            for row in self._removed_rows[removed:]:
+                if start <= row < stop:
+                    chunk[row - start] = NOT_REMOVED
+            yield chunk
+
+    def _write_snapshot(self, header: dict, sections: List[Section]) -> None:
+        started = time.perf_counter()
+        try:
+            write_snapshot(self._directory, header, sections)
+            self._journal.drop_before(header["segment"])
+            logger.info("Snapshot of %d rolls written in %.0f ms", sections[0][2],
+                        (time.perf_counter() - started) * 1000)
+        except OSError as e:
+            # The journal segments stay, so nothing is lost
+            logger.error("Failed to write snapshot: %s", str(e))
+
+    def _restore(self, header: dict, sections: Dict[str, array]) -> None:
+        self._lengths, self._weights = sections["lengths"], sections["weights"]
+        self._added_at, self._removed_at = sections["added_at"], sections["removed_at"]
+        self._removed_rows = sections["removed_rows"]
+        self._added_weight_sums = sections["added_weight_sums"]
+        self._removed_weight_sums = sections["removed_weight_sums"]
+        self._daily = {}
+        for day, *values in header["daily"]:
+            rollup = self._daily[day] = DailyRollup()
+            for name, value in zip(DailyRollup.__slots__, values):
+                setattr(rollup, name, value)
+        self._days = array("q", (day for day, *_ in header["daily"]))
+        self._weight_index = SortedIndex(self._weights)
+        self._weight_index.restore(split_runs(sections["weight_runs"], header["weight_runs"]),
+                                   header["weight_indexed"])
+        self._length_index = SortedIndex(self._lengths)
+        self._length_index.restore(split_runs(sections["length_runs"], header["length_runs"]),
+                                   header["length_indexed"])
+
+
+def split_runs(runs: array, lengths: List[int]) -> List[array]:
+    starts = list(accumulate(lengths, initial=0))
+    return [runs[start:start + length] for start, length in zip(starts, lengths)]
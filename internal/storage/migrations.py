@@ -0,0 +1,125 @@
+from typing import Callable, List, Tuple
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+from ..logger.logger import logger
+
+# The schema version lives in SQLite's PRAGMA user_version. Migrations are
+# frozen DDL, never derived from the current models, and are safe to re-run.
+
+
+def _create_rolls(conn: Connection) -> None:
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS rolls (
+            id INTEGER NOT NULL,
+            length FLOAT NOT NULL,
+            weight FLOAT NOT NULL,
+            added_at DATETIME NOT NULL,
+            removed_at DATETIME,
+            PRIMARY KEY (id)
+        )
+    """)
+
+
+def _create_roll_indexes(conn: Connection) -> None:
+    # added_at/removed_at indexes cover every column the stats, rollup and
+    # inventory queries read, so those never visit the table itself
+    for statement in (
+        "DROP INDEX IF EXISTS ix_rolls_added_at",
+        "DROP INDEX IF EXISTS ix_rolls_removed_at_added_at",
+        "CREATE INDEX ix_rolls_added_at ON rolls (added_at, removed_at, length, weight)",
+        "CREATE INDEX ix_rolls_removed_at_added_at ON rolls (removed_at, added_at, weight)",
+        "CREATE INDEX IF NOT EXISTS ix_rolls_weight ON rolls (weight)",
+        "CREATE INDEX IF NOT EXISTS ix_rolls_length ON rolls (length)",
+    ):
+        conn.exec_driver_sql(statement)
+
+
+def _create_daily_rollup(conn: Connection) -> None:
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS roll_daily_rollup (
+            day DATE NOT NULL,
+            added_count INTEGER NOT NULL,
+            added_weight FLOAT NOT NULL,
+            added_length FLOAT NOT NULL,
+            min_length FLOAT,
+            max_length FLOAT,
+            min_weight FLOAT,
+            max_weight FLOAT,
+            removed_count INTEGER NOT NULL,
+            removed_weight FLOAT NOT NULL,
+            min_lifetime FLOAT,
+            max_lifetime FLOAT,
+            PRIMARY KEY (day)
+        )
+    """)
+    # The same totals as rollup.backfill, as of this version of the schema;
+    # lifetimes are in days, from exact microsecond timestamps
+    conn.exec_driver_sql("DELETE FROM roll_daily_rollup")
+    conn.exec_driver_sql("""
+        INSERT INTO roll_daily_rollup (
+            day, added_count, added_weight, added_length, min_length, max_length, min_weight, max_weight,
+            removed_count, removed_weight, min_lifetime, max_lifetime
+        )
+        SELECT day, SUM(added_count), TOTAL(added_weight), TOTAL(added_length),
+               MIN(min_length), MAX(max_length), MIN(min_weight), MAX(max_weight),
+               SUM(removed_count), TOTAL(removed_weight), MIN(min_lifetime), MAX(max_lifetime)
+        FROM (
+            SELECT date(added_at) AS day, COUNT(id) AS added_count, TOTAL(weight) AS added_weight,
+                   TOTAL(length) AS added_length, MIN(length) AS min_length, MAX(length) AS max_length,
+                   MIN(weight) AS min_weight, MAX(weight) AS max_weight, 0 AS removed_count,
+                   0.0 AS removed_weight, NULL AS min_lifetime, NULL AS max_lifetime
+            FROM rolls
+            GROUP BY date(added_at)
+            UNION ALL
+            SELECT date(removed_at), 0, 0.0, 0.0, NULL, NULL, NULL, NULL,
+                   COUNT(id), TOTAL(weight), MIN(lifetime), MAX(lifetime)
+            FROM (
+                SELECT id, removed_at, weight,
+                       ((CAST(strftime('%s', removed_at) AS INTEGER) * 1000000
+                         + CAST(substr(removed_at, 21, 6) AS INTEGER))
+                        - (CAST(strftime('%s', added_at) AS INTEGER) * 1000000
+                           + CAST(substr(added_at, 21, 6) AS INTEGER))) / 86400000000.0 AS lifetime
+                FROM rolls
+                WHERE removed_at IS NOT NULL
+            )
+            GROUP BY date(removed_at)
+        )
+        GROUP BY day
+    """)
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "create rolls table", _create_rolls),
+    (2, "add rolls indexes", _create_roll_indexes),
+    (3, "add roll_daily_rollup table", _create_daily_rollup),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn: Connection) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate(engine: Engine) -> int:
+    try:
+        with engine.begin() as conn:
+            version = get_version(conn)
+            for target, description, upgrade in MIGRATIONS:
+                if target <= version:
+                    continue
+                logger.info("Applying migration %d: %s", target, description)
+                upgrade(conn)
+                conn.exec_driver_sql(f"PRAGMA user_version = {target}")
+                version = target
+        logger.info("Database schema at version %d", version)
+        return version
+    except SQLAlchemyError as e:
+        logger.critical("Database migration failed: %s", str(e))
+        raise
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    migrate(engine)
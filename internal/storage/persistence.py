@@ -0,0 +1,183 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from ..logger.logger import logger
+
+# Journal records are a header (kind, item count, timestamp), the payload
+# and a CRC32 of both. A record torn by a crash fails its CRC and ends the
+# replay; the file is cut back to the last whole record.
+RECORD = struct.Struct("<cIq")
+CRC = struct.Struct("<I")
+ADDED = b"A"    # payload: the lengths, then the weights, as doubles
+REMOVED = b"R"  # payload: row numbers as int64
+ITEM_SIZE = {ADDED: 16, REMOVED: 8}
+ROLL = struct.Struct("<dd")
+ROW = struct.Struct("<q")
+
+SNAPSHOT_MAGIC = b"ROLLSNP1"
+SNAPSHOT_FILE = "snapshot.bin"
+# Elements copied per step while a snapshot is written, so the thread
+# writing it only holds the GIL for a fraction of a millisecond at a time
+SNAPSHOT_CHUNK = 256 * 1024
+
+# (name, typecode, element count, chunks of the column to write)
+Section = Tuple[str, str, int, Iterable[array]]
+
+
+def segment_path(directory: str, segment: int) -> str:
+    return os.path.join(directory, f"journal.{segment:08d}")
+
+
+def journal_segments(directory: str) -> List[int]:
+    return sorted(int(name[8:]) for name in os.listdir(directory)
+                  if name.startswith("journal.") and name[8:].isdigit())
+
+
+def replay_journal(directory: str, first_segment: int) -> Iterator[Tuple[bytes, int, memoryview]]:
+    for segment in journal_segments(directory):
+        if segment < first_segment:
+            continue
+        path = segment_path(directory, segment)
+        with open(path, "rb") as f:
+            data = f.read()
+        view, offset = memoryview(data), 0
+        while offset + RECORD.size <= len(data):
+            kind, count, timestamp = RECORD.unpack_from(data, offset)
+            end = offset + RECORD.size + count * ITEM_SIZE.get(kind, 0)
+            if kind not in ITEM_SIZE or end + CRC.size > len(data) \
+                    or CRC.unpack_from(data, end)[0] != zlib.crc32(view[offset:end]):
+                break
+            yield kind, timestamp, view[offset + RECORD.size:end]
+            offset = end + CRC.size
+        if offset < len(data):
+            logger.warning("Truncating torn journal record", extra={"segment": path, "offset": offset})
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+
+
+class Journal:
+    # Appends go straight to the OS with one write() each, which survives a
+    # process crash; a background thread fsyncs every fsync_interval seconds,
+    # so one fsync covers every record written in that interval.
+    def __init__(self, directory: str, fsync_interval: float):
+        self.directory = directory
+        segments = journal_segments(directory)
+        self.segment = segments[-1] + 1 if segments else 1
+        self._fd = self._open(self.segment)
+        self._dirty = False
+        # Earlier segments' files, fsynced and closed by the next sync()
+        self._retired: List[int] = []
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, args=(fsync_interval,),
+                                         name="journal-fsync", daemon=True)
+        self._flusher.start()
+
+    def _open(self, segment: int) -> int:
+        return os.open(segment_path(self.directory, segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def write(self, kind: bytes, timestamp: int, count: int, payload: bytes) -> None:
+        record = RECORD.pack(kind, count, timestamp) + payload
+        record += CRC.pack(zlib.crc32(record))
+        with self._lock:
+            view = memoryview(record)
+            while view:
+                view = view[os.write(self._fd, view):]
+            self._dirty = True
+
+    def rotate(self) -> int:
+        # Later records go to a new segment; returns its number
+        with self._lock:
+            self._retired.append(self._fd)
+            self.segment += 1
+            self._fd = self._open(self.segment)
+        return self.segment
+
+    def sync(self) -> None:
+        with self._sync_lock:
+            with self._lock:
+                fd, dirty, self._dirty = self._fd, self._dirty, False
+                retired, self._retired = self._retired, []
+            for old in retired:
+                os.fsync(old)
+                os.close(old)
+            if dirty:
+                os.fsync(fd)
+
+    def _flush_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.sync()
+            except OSError as e:
+                logger.critical("Journal fsync failed: %s", str(e))
+
+    def close(self) -> None:
+        self._stop.set()
+        self._flusher.join()
+        self.sync()
+        os.close(self._fd)
+
+    def drop_before(self, segment: int) -> None:
+        for old in journal_segments(self.directory):
+            if old < segment:
+                os.remove(segment_path(self.directory, old))
+
+
+def write_snapshot(directory: str, header: dict, sections: List[Section]) -> None:
+    # Layout: magic, header length, JSON header padded to 8 bytes, then the
+    # sections back to back. Written to a temporary file and renamed over
+    # the previous snapshot once it is on disk.
+    offset, layout = 0, {}
+    for name, typecode, count, _ in sections:
+        layout[name] = [offset, typecode, count]
+        offset += count * array(typecode).itemsize
+    meta = json.dumps({**header, "sections": layout}).encode()
+    meta += b" " * (-len(meta) % 8)
+    path = os.path.join(directory, SNAPSHOT_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(SNAPSHOT_MAGIC + struct.pack("<Q", len(meta)) + meta)
+        for _, _, _, chunks in sections:
+            for chunk in chunks:
+                f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_snapshot(directory: str) -> Optional[Tuple[dict, Dict[str, array]]]:
+    # Sections are copied straight out of the mapping into growable arrays
+    path = os.path.join(directory, SNAPSHOT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if mapped[:8] != SNAPSHOT_MAGIC:
+            raise ValueError(f"Not a roll snapshot: {path}")
+        meta_size = struct.unpack_from("<Q", mapped, 8)[0]
+        start = 16 + meta_size
+        header = json.loads(mapped[16:start])
+        sections = {}
+        with memoryview(mapped) as view:
+            for name, (offset, typecode, count) in header.pop("sections").items():
+                column = array(typecode)
+                end = start + offset + count * column.itemsize
+                with view[start + offset:end] as data:
+                    column.frombytes(data)
+                sections[name] = column
+    return header, sections
+
+
+def column_chunks(column: array, stop: int) -> Iterator[array]:
+    for lo in range(0, stop, SNAPSHOT_CHUNK):
+        yield column[lo:min(lo + SNAPSHOT_CHUNK, stop)]
@@ -0,0 +1,152 @@
+from datetime import date, datetime
+from typing import List
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from ..models.models import Roll, RollDailyRollup
+from ..logger.logger import logger
+from .timestamps import DAY_US, MICROSECOND, as_naive_utc, lifetime_days
+
+EMPTY_DAY = {
+    "added_count": 0, "added_weight": 0.0, "added_length": 0.0,
+    "min_length": None, "max_length": None, "min_weight": None, "max_weight": None,
+    "removed_count": 0, "removed_weight": 0.0, "min_lifetime": None, "max_lifetime": None,
+}
+
+
+def _least(column, value):
+    # SQLite's two-argument min() is NULL when either side is
+    return func.coalesce(func.min(column, value), value)
+
+
+def _greatest(column, value):
+    return func.coalesce(func.max(column, value), value)
+
+
+def record_added(db: Session, added_at: datetime, length: float, weight: float) -> None:
+    record_added_many(db, added_at, [length], [weight])
+
+
+def record_added_many(db: Session, added_at: datetime, lengths: List[float], weights: List[float]) -> None:
+    # One upsert for a whole batch of rolls added at the same instant
+    count, total_weight, total_length = len(lengths), sum(weights), sum(lengths)
+    min_length, max_length = min(lengths), max(lengths)
+    min_weight, max_weight = min(weights), max(weights)
+    stmt = insert(RollDailyRollup).values(
+        day=as_naive_utc(added_at).date(),
+        added_count=count,
+        added_weight=total_weight,
+        added_length=total_length,
+        min_length=min_length,
+        max_length=max_length,
+        min_weight=min_weight,
+        max_weight=max_weight
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[RollDailyRollup.day],
+        set_={
+            "added_count": RollDailyRollup.added_count + count,
+            "added_weight": RollDailyRollup.added_weight + total_weight,
+            "added_length": RollDailyRollup.added_length + total_length,
+            "min_length": _least(RollDailyRollup.min_length, min_length),
+            "max_length": _greatest(RollDailyRollup.max_length, max_length),
+            "min_weight": _least(RollDailyRollup.min_weight, min_weight),
+            "max_weight": _greatest(RollDailyRollup.max_weight, max_weight),
+        }
+    ))
+
+
+def record_removed(db: Session, added_at: datetime, removed_at: datetime, weight: float) -> None:
+    record_removed_many(db, removed_at, [added_at], [weight])
+
+
+def record_removed_many(db: Session, removed_at: datetime, added_at: List[datetime], weights: List[float]) -> None:
+    # One upsert for a whole batch of rolls removed at the same instant
+    removed_at = as_naive_utc(removed_at)
+    lifetimes = [(removed_at - as_naive_utc(added)) // MICROSECOND / DAY_US for added in added_at]
+    count, total_weight = len(weights), sum(weights)
+    min_lifetime, max_lifetime = min(lifetimes), max(lifetimes)
+    stmt = insert(RollDailyRollup).values(
+        day=removed_at.date(),
+        removed_count=count,
+        removed_weight=total_weight,
+        min_lifetime=min_lifetime,
+        max_lifetime=max_lifetime
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[RollDailyRollup.day],
+        set_={
+            "removed_count": RollDailyRollup.removed_count + count,
+            "removed_weight": RollDailyRollup.removed_weight + total_weight,
+            "min_lifetime": _least(RollDailyRollup.min_lifetime, min_lifetime),
+            "max_lifetime": _greatest(RollDailyRollup.max_lifetime, max_lifetime),
+        }
+    ))
+
+
+def backfill(db: Session) -> int:
+    # Rebuilds every rollup row from the rolls table in one transaction
+    try:
+        logger.info("Backfilling %s", RollDailyRollup.__tablename__)
+        days = {}
+
+        added_day = func.date(Roll.added_at)
+        for day, count, weight, length, min_length, max_length, min_weight, max_weight in db.execute(
+            select(
+                added_day,
+                func.count(Roll.id),
+                func.total(Roll.weight),
+                func.total(Roll.length),
+                func.min(Roll.length),
+                func.max(Roll.length),
+                func.min(Roll.weight),
+                func.max(Roll.weight)
+            ).group_by(added_day)
+        ):
+            days[day] = {
+                **EMPTY_DAY,
+                "added_count": count, "added_weight": weight, "added_length": length,
+                "min_length": min_length, "max_length": max_length,
+                "min_weight": min_weight, "max_weight": max_weight,
+            }
+
+        removed_day = func.date(Roll.removed_at)
+        lifetime = lifetime_days(Roll.added_at, Roll.removed_at)
+        for day, count, weight, min_lifetime, max_lifetime in db.execute(
+            select(
+                removed_day,
+                func.count(Roll.id),
+                func.total(Roll.weight),
+                func.min(lifetime),
+                func.max(lifetime)
+            ).where(Roll.removed_at.is_not(None)).group_by(removed_day)
+        ):
+            days.setdefault(day, dict(EMPTY_DAY)).update({
+                "removed_count": count, "removed_weight": weight,
+                "min_lifetime": min_lifetime, "max_lifetime": max_lifetime,
+            })
+
+        db.query(RollDailyRollup).delete()
+        if days:
+            db.execute(insert(RollDailyRollup), [
+                {"day": date.fromisoformat(day), **values} for day, values in days.items()
+            ])
+        db.commit()
+        logger.info("Backfilled %d rollup days", len(days))
+        return len(days)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Rollup backfill failed: %s", str(e))
+        raise
+
+
+if __name__ == "__main__":
+    from .database import engine, SessionLocal
+
+    RollDailyRollup.__table__.create(bind=engine, checkfirst=True)
+    session = SessionLocal()
+    try:
+        backfill(session)
+    finally:
+        session.close()
@@ -0,0 +1,227 @@
+import fcntl
+import functools
+import mmap
+import os
+import secrets
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from itertools import accumulate
+from typing import Iterator, Optional
+from .in_memory_storage import NOT_REMOVED, InMemoryStorage
+from .sorted_index import SortedIndex
+from .timestamps import DAY_US
+from ..logger.logger import logger
+
+# POSIX shared memory, the same place multiprocessing.shared_memory puts it
+SHM_DIR = "/dev/shm"
+# Segment layout: a header of int64 fields, then one column after another,
+# each `capacity` 8-byte elements long
+MAGIC = 0x524F4C4C53484D31  # "ROLLSHM1"
+HEADER_SIZE = 64
+MAGIC_FIELD, CAPACITY_FIELD, TOKEN_FIELD, ROWS_FIELD, REMOVED_FIELD = range(5)
+COLUMNS = (("lengths", "d"), ("weights", "d"), ("added_at", "q"), ("removed_at", "q"), ("removed_rows", "q"))
+
+
+class SharedColumns:
+    # Roll columns in one shared memory segment that every worker process
+    # maps. Writers take an flock on the segment; rows and removals become
+    # visible when the header counts are bumped, after the data they cover
+    # is in place, so readers never lock. A row below the published count
+    # never changes except its removed_at, which goes from NOT_REMOVED to a
+    # time once. The segment outlives the processes using it until unlink().
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.path = os.path.join(SHM_DIR, name)
+        try:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            with self.locked():
+                created = os.fstat(self._fd).st_size == 0
+                if created:
+                    os.ftruncate(self._fd, HEADER_SIZE + len(COLUMNS) * 8 * capacity)
+                self._mmap = mmap.mmap(self._fd, 0)
+                self._header = memoryview(self._mmap)[:HEADER_SIZE].cast("q")
+                if created:
+                    self._header[CAPACITY_FIELD] = capacity
+                    self._header[TOKEN_FIELD] = secrets.randbits(62)
+                    self._header[MAGIC_FIELD] = MAGIC
+                elif self._header[MAGIC_FIELD] != MAGIC:
+                    raise ValueError(f"{self.path} does not hold rolls")
+            # The creator's capacity wins over the one asked for
+            self.capacity = self._header[CAPACITY_FIELD]
+            self.token = f"{self._header[TOKEN_FIELD]:x}"
+            for i, (column, typecode) in enumerate(COLUMNS):
+                start = HEADER_SIZE + i * 8 * self.capacity
+                setattr(self, column, memoryview(self._mmap)[start:start + 8 * self.capacity].cast(typecode))
+            logger.info("%s shared roll segment %s for %d rolls", "Created" if created else "Attached",
+                        self.path, self.capacity)
+        except (OSError, ValueError) as e:
+            logger.critical("Failed to map shared roll segment %s: %s", self.path, str(e))
+            raise
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @property
+    def rows(self) -> int:
+        return self._header[ROWS_FIELD]
+
+    @property
+    def removed(self) -> int:
+        return self._header[REMOVED_FIELD]
+
+    def publish(self, rows: int, removed: int) -> None:
+        # Aligned 8-byte stores, made after the data they cover
+        self._header[ROWS_FIELD] = rows
+        self._header[REMOVED_FIELD] = removed
+
+    def close(self) -> None:
+        # The mapping itself goes away with the last view of it
+        os.close(self._fd)
+
+    def unlink(self) -> None:
+        os.unlink(self.path)
+
+
+def _reading(method):
+    @functools.wraps(method)
+    def call(self, *args, **kwargs):
+        self._catch_up()
+        return method(self, *args, **kwargs)
+    return call
+
+
+def _writing(method):
+    @functools.wraps(method)
+    def call(self, *args, **kwargs):
+        # The flock is per open file, so threads of one worker queue on the lock first
+        with self._write_lock, self._shared.locked():
+            self._refresh()
+            return method(self, *args, **kwargs)
+    return call
+
+
+class SharedInMemoryStorage(InMemoryStorage):
+    # InMemoryStorage over SharedColumns, one per worker process. The columns
+    # are views of the shared segment; the prefix sums, daily rollups and
+    # sorted indexes are per worker and catch up with the published counts
+    # before every call when there is something new and the write lock is
+    # free; otherwise the call reads the last version published in this
+    # worker. Writes hold the segment lock from that catch-up until
+    # they are published, so ids stay dense across workers.
+    def __init__(self, shared: SharedColumns):
+        super().__init__()
+        self._shared = shared
+        self._rows = self._removed = 0
+        # Indexes only look at rows below the size they are asked about
+        self._weight_index = SortedIndex(shared.weights)
+        self._length_index = SortedIndex(shared.lengths)
+        self._refresh()
+
+    def _catch_up(self) -> None:
+        # Never waits: while a writer of this worker holds the lock, possibly
+        # queued on another worker's flock, reads are served at the counts
+        # last published here, and the writer catches up for them
+        if self._shared.rows != self._rows or self._shared.removed != self._removed:
+            if self._write_lock.acquire(blocking=False):
+                try:
+                    self._refresh()
+                finally:
+                    self._write_lock.release()
+
+    def _refresh(self) -> None:
+        shared = self._shared
+        rows, removed = shared.rows, shared.removed
+        since = []
+        if rows > self._rows:
+            start = self._rows
+            self._lengths, self._weights = shared.lengths[:rows], shared.weights[:rows]
+            self._added_at, self._removed_at = shared.added_at[:rows], shared.removed_at[:rows]
+            self._added_weight_sums.extend(accumulate(self._weights[start:rows], initial=self._added_weight_sums[-1]))
+            del self._added_weight_sums[start + 1]
+            # One add_many per UTC day the new rows span
+            first = start
+            while first < rows:
+                at = self._added_at[first]
+                last = bisect_left(self._added_at, (at // DAY_US + 1) * DAY_US, first, rows)
+                rollup = self._rollup(at)
+                rollup.add_many(self._lengths[first:last], self._weights[first:last])
+                self._put_rollup(at, rollup)
+                first = last
+            self._rows = rows
+            since.append(self._added_at[start])
+        if removed > self._removed:
+            start = self._removed
+            self._removed_rows = shared.removed_rows[:removed]
+            for row in self._removed_rows[start:removed]:
+                removed_at = self._removed_at[row]
+                self._removed_weight_sums.append(self._removed_weight_sums[-1] + self._weights[row])
+                rollup = self._rollup(removed_at)
+                rollup.remove(self._weights[row], (removed_at - self._added_at[row]) / DAY_US)
+                self._put_rollup(removed_at, rollup)
+            self._removed = removed
+            since.append(self._removed_at[self._removed_rows[start]])
+        if since:
+            self._publish()
+            self.stats_cache.invalidate(min(since))
+
+    def _append(self, added_at: int, lengths: array, weights: array) -> None:
+        shared = self._shared
+        start = self._rows
+        stop = start + len(lengths)
+        if stop > shared.capacity:
+            raise ValueError(f"Shared roll storage is full: {shared.capacity} rolls")
+        shared.lengths[start:stop] = lengths
+        shared.weights[start:stop] = weights
+        shared.added_at[start:stop] = array("q", [added_at]) * len(lengths)
+        shared.removed_at[start:stop] = array("q", [NOT_REMOVED]) * len(lengths)
+        shared.publish(stop, self._removed)
+        self._refresh()
+
+    def _add_roll(self, added_at: int, length: float, weight: float) -> None:
+        self._append(added_at, array("d", [length]), array("d", [weight]))
+
+    def _add_rolls(self, added_at: int, lengths: array, weights: array) -> None:
+        self._append(added_at, lengths, weights)
+
+    def _remove_row(self, row: int, removed_at: int) -> None:
+        shared = self._shared
+        removed = self._removed
+        if removed:
+            removed_at = max(removed_at, self._removed_at[self._removed_rows[-1]] + 1)
+        shared.removed_at[row] = removed_at
+        shared.removed_rows[removed] = row
+        shared.publish(self._rows, removed + 1)
+        self._refresh()
+
+    def __len__(self) -> int:
+        self._catch_up()
+        return self._version.rows
+
+    create_roll = _writing(InMemoryStorage.create_roll)
+    create_rolls = _writing(InMemoryStorage.create_rolls)
+    delete_roll = _writing(InMemoryStorage.delete_roll)
+    remove_rolls = _writing(InMemoryStorage.remove_rolls)
+    get_rolls = _reading(InMemoryStorage.get_rolls)
+    iter_rolls = _reading(InMemoryStorage.iter_rolls)
+    get_stats = _reading(InMemoryStorage.get_stats)
+    get_inventory = _reading(InMemoryStorage.get_inventory)
+    get_inventory_series = _reading(InMemoryStorage.get_inventory_series)
+    get_stats_series = _reading(InMemoryStorage.get_stats_series)
+
+    def write_version(self) -> Optional[str]:
+        # The same in every worker: the published counts only grow, and a
+        # response built after reading them is at least as new
+        self._catch_up()
+        version = self._version
+        return f"{self._shared.token}-{version.rows}-{version.removed}"
+
+    def enable_persistence(self, directory: str, fsync_interval_ms: float = 10.0,
+                           snapshot_every: int = 100_000) -> None:
+        logger.critical("Persistence is not supported for shared in-memory storage")
+        raise ValueError("Persistence is not supported for shared in-memory storage")
@@ -0,0 +1,72 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterator, List, Sequence, Tuple
+
+# Rows newer than the last full chunk are kept unsorted and scanned directly
+TAIL_SIZE = 4096
+
+
+class SortedIndex:
+    # Secondary index over one append-only column. Rows are kept in sorted runs
+    # ordered by (value, row); runs are merged like a binary counter, so there
+    # are O(log n) of them and a range lookup costs O(log² n + k).
+    def __init__(self, column: Sequence[float]):
+        self._column = column
+        # (runs, rows they cover), replaced as a whole so a search never
+        # locks; one thread at a time extends it and the rest scan the tail
+        self._state: Tuple[Tuple[array, ...], int] = ((), 0)
+        self._merging = threading.Lock()
+
+    def state(self) -> Tuple[List[array], int]:
+        # Runs are replaced, never changed in place, so this stays valid
+        runs, indexed = self._state
+        return list(runs), indexed
+
+    def restore(self, runs: List[array], indexed: int) -> None:
+        self._state = (tuple(runs), indexed)
+
+    def _catch_up(self, size: int) -> None:
+        if size - self._state[1] < TAIL_SIZE or not self._merging.acquire(blocking=False):
+            return
+        try:
+            key = self._column.__getitem__
+            runs, indexed = self._state
+            runs = list(runs)
+            while size - indexed >= TAIL_SIZE:
+                chunk = range(indexed, indexed + TAIL_SIZE)
+                runs.append(array("q", sorted(chunk, key=key)))
+                indexed += TAIL_SIZE
+                while len(runs) > 1 and len(runs[-2]) <= 2 * len(runs[-1]):
+                    newer = runs.pop()
+                    # Timsort merges the two sorted runs and keeps older rows first on ties
+                    runs[-1] = array("q", sorted(runs[-1] + newer, key=key))
+                self._state = (tuple(runs), indexed)
+        finally:
+            self._merging.release()
+
+    def search(self, low: float, high: float, size: int) -> Tuple[List[Tuple[array, int, int]], List[int]]:
+        # Runs may cover rows at or past size when another reader has caught
+        # up further; callers bound the rows they take by their own size
+        self._catch_up(size)
+        runs, indexed = self._state
+        key = self._column.__getitem__
+        spans = []
+        for run in runs:
+            lo = bisect_left(run, low, key=key)
+            hi = bisect_right(run, high, key=key, lo=lo)
+            if hi > lo:
+                spans.append((run, lo, hi))
+        column = self._column
+        tail = [r for r in range(indexed, size) if low <= column[r] <= high]
+        return spans, tail
+
+    @staticmethod
+    def count(spans: List[Tuple[array, int, int]], tail: List[int]) -> int:
+        return sum(hi - lo for _, lo, hi in spans) + len(tail)
+
+    @staticmethod
+    def rows(spans: List[Tuple[array, int, int]], tail: List[int]) -> Iterator[int]:
+        for run, lo, hi in spans:
+            yield from run[lo:hi]
+        yield from tail
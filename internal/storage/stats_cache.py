@@ -0,0 +1,109 @@
+import secrets
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+from typing import Any, Iterator, Optional, Tuple
+from weakref import WeakKeyDictionary
+from sqlalchemy.engine import Engine
+from config.config import settings
+from ..metrics.metrics import STATS_CACHE_LOOKUPS
+from .timestamps import to_us
+
+# Writes remembered for results that were being computed while they landed
+WRITE_HISTORY = 64
+
+
+class StatsCache:
+    # LRU of get_stats results keyed by window. A window only counts rolls
+    # added or removed inside it, and writes are stamped no earlier than the
+    # moment they begin, so a write evicts just the windows ending at or after
+    # that moment; windows in the past survive it. Every write bumps the
+    # generation, and a result computed across a write is only stored if none
+    # of the writes since could have changed it. The generation, prefixed
+    # with a per-process token, is also the backend's write version.
+    def __init__(self, name: str, size: Optional[int] = None):
+        self.name = name
+        self.size = settings.stats_cache_size if size is None else size
+        self.generation = 0
+        self.token = secrets.token_hex(4)
+        self._writing = 0
+        self._entries: "OrderedDict[Tuple[int, int], Any]" = OrderedDict()
+        # Start of each write, one per generation, newest last
+        self._writes = deque(maxlen=WRITE_HISTORY)
+        self._lock = threading.Lock()
+
+    def get(self, start_date: datetime, end_date: datetime) -> Tuple[Optional[Any], int]:
+        if not self.size:
+            return None, self.generation
+        key = (to_us(start_date), to_us(end_date))
+        with self._lock:
+            stats = self._entries.get(key)
+            if stats is not None:
+                self._entries.move_to_end(key)
+            generation = self.generation
+        STATS_CACHE_LOOKUPS.inc(self.name, "miss" if stats is None else "hit")
+        return stats, generation
+
+    def put(self, start_date: datetime, end_date: datetime, generation: int, stats: Any) -> None:
+        if not self.size:
+            return
+        key = (to_us(start_date), to_us(end_date))
+        with self._lock:
+            missed = self.generation - generation
+            if missed > len(self._writes):
+                return
+            if any(since <= key[1] for since in islice(reversed(self._writes), missed)):
+                return
+            self._entries[key] = stats
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    @property
+    def version(self) -> Optional[str]:
+        # None while a write is in progress: it may be committed before the bump
+        if self._writing:
+            return None
+        return f"{self.token}-{self.generation}"
+
+    @contextmanager
+    def writing(self, since: int) -> Iterator[None]:
+        # For writes that other threads or tasks can observe before they return
+        with self._lock:
+            self._writing += 1
+        try:
+            yield
+        finally:
+            # Bumped before the count drops, so version never shows the old
+            # generation once the write is visible
+            with self._lock:
+                self._invalidate(since)
+                self._writing -= 1
+
+    def invalidate(self, since: int) -> None:
+        # since: microseconds since the epoch, no later than any stamp the write set
+        with self._lock:
+            self._invalidate(since)
+
+    def _invalidate(self, since: int) -> None:
+        self.generation += 1
+        self._writes.append(since)
+        for key in [key for key in self._entries if key[1] >= since]:
+            del self._entries[key]
+
+
+# Database backends share one cache per engine, whichever session they use
+_database_caches: "WeakKeyDictionary[Engine, StatsCache]" = WeakKeyDictionary()
+_database_caches_lock = threading.Lock()
+
+
+def database_stats_cache(engine: Engine) -> StatsCache:
+    cache = _database_caches.get(engine)
+    if cache is None:
+        with _database_caches_lock:
+            cache = _database_caches.get(engine)
+            if cache is None:
+                cache = _database_caches[engine] = StatsCache("database")
+    return cache
@@ -1,7 +1,41 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict
-from datetime import datetime
-from ..models.schemas import RollStats, RollCreate, RollResponse
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence
+from datetime import datetime, timedelta
+from ..models.schemas import (RollStats, RollCreate, RollResponse, RollRemoveResponse,
+                              InventoryPoint, InventorySnapshot, StatsBucket)
+from ..models.serialization import ROLL_FIELDS
+from .timestamps import DAY_US, to_us
+
+MAX_SERIES_POINTS = 10_000
+# Stats series bucket widths in microseconds; weeks start on Monday, like ISO weeks
+BUCKET_US = {"hour": 3_600_000_000, "day": DAY_US, "week": 7 * DAY_US}
+# 1970-01-05, the first Monday after the epoch
+WEEK_ORIGIN_US = 4 * DAY_US
+
+
+def series_points(start_date: datetime, end_date: datetime, step: timedelta) -> List[datetime]:
+    if step <= timedelta(0):
+        raise ValueError("Step must be positive")
+    count = (end_date - start_date) // step + 1
+    if count > MAX_SERIES_POINTS:
+        raise ValueError(f"Series is limited to {MAX_SERIES_POINTS} points")
+    return [start_date + i * step for i in range(max(count, 0))]
+
+
+def stats_buckets(start_date: datetime, end_date: datetime, bucket: str) -> List[int]:
+    # Boundaries in microseconds of the UTC-aligned buckets that overlap
+    # [start_date, end_date]: the start of each bucket, then the end of the last
+    size = BUCKET_US.get(bucket)
+    if size is None:
+        raise ValueError(f"Bucket must be one of {', '.join(BUCKET_US)}")
+    origin = WEEK_ORIGIN_US if bucket == "week" else 0
+    start_us, end_us = to_us(start_date), to_us(end_date)
+    first = (start_us - origin) // size * size + origin
+    count = (end_us - first) // size + 1 if end_us >= start_us else 0
+    if count > MAX_SERIES_POINTS:
+        raise ValueError(f"Series is limited to {MAX_SERIES_POINTS} buckets")
+    return [first + i * size for i in range(count + 1)] if count else []
+
 
 class StorageInterface(ABC):
     @abstractmethod
@@ -9,13 +43,98 @@ class StorageInterface(ABC):
         pass
 
     @abstractmethod
-    def get_rolls(self, filters: Dict[str, Optional[str]]) -> List[RollResponse]:
+    def create_rolls(self, rolls: List[RollCreate]) -> range:
+        pass
+
+    @abstractmethod
+    def get_rolls(self, filters: Dict[str, Optional[str]], after_id: Optional[int] = None,
+                  limit: Optional[int] = None, fields: Sequence[str] = ROLL_FIELDS) -> List[tuple]:
+        pass
+
+    @abstractmethod
+    def iter_rolls(self, filters: Dict[str, Optional[str]], after_id: Optional[int] = None,
+                   limit: Optional[int] = None, fields: Sequence[str] = ROLL_FIELDS) -> Iterator[tuple]:
         pass
 
     @abstractmethod
     def delete_roll(self, roll_id: int) -> Optional[RollResponse]:
         pass
 
+    @abstractmethod
+    def remove_rolls(self, ids: Optional[List[int]] = None,
+                     filters: Optional[Dict[str, Optional[str]]] = None) -> RollRemoveResponse:
+        pass
+
     @abstractmethod
     def get_stats(self, start_date: datetime, end_date: datetime) -> RollStats:
         pass
+
+    @abstractmethod
+    def get_inventory(self, at: datetime, include_rolls: bool = False) -> InventorySnapshot:
+        pass
+
+    @abstractmethod
+    def get_inventory_series(self, start_date: datetime, end_date: datetime,
+                             step: timedelta) -> List[InventoryPoint]:
+        pass
+
+    @abstractmethod
+    def get_stats_series(self, start_date: datetime, end_date: datetime,
+                         bucket: str) -> List[StatsBucket]:
+        pass
+
+    @abstractmethod
+    def write_version(self) -> Optional[str]:
+        # Changes with every write; None while one is in progress
+        pass
+
+
+class AsyncStorageInterface(ABC):
+    @abstractmethod
+    async def create_roll(self, roll: RollCreate) -> RollResponse:
+        pass
+
+    @abstractmethod
+    async def create_rolls(self, rolls: List[RollCreate]) -> range:
+        pass
+
+    @abstractmethod
+    async def get_rolls(self, filters: Dict[str, Optional[str]], after_id: Optional[int] = None,
+                        limit: Optional[int] = None, fields: Sequence[str] = ROLL_FIELDS) -> List[tuple]:
+        pass
+
+    @abstractmethod
+    def iter_rolls(self, filters: Dict[str, Optional[str]], after_id: Optional[int] = None,
+                   limit: Optional[int] = None, fields: Sequence[str] = ROLL_FIELDS) -> AsyncIterator[tuple]:
+        pass
+
+    @abstractmethod
+    async def delete_roll(self, roll_id: int) -> Optional[RollResponse]:
+        pass
+
+    @abstractmethod
+    async def remove_rolls(self, ids: Optional[List[int]] = None,
+                           filters: Optional[Dict[str, Optional[str]]] = None) -> RollRemoveResponse:
+        pass
+
+    @abstractmethod
+    async def get_stats(self, start_date: datetime, end_date: datetime) -> RollStats:
+        pass
+
+    @abstractmethod
+    async def get_inventory(self, at: datetime, include_rolls: bool = False) -> InventorySnapshot:
+        pass
+
+    @abstractmethod
+    async def get_inventory_series(self, start_date: datetime, end_date: datetime,
+                                   step: timedelta) -> List[InventoryPoint]:
+        pass
+
+    @abstractmethod
+    async def get_stats_series(self, start_date: datetime, end_date: datetime,
+                               bucket: str) -> List[StatsBucket]:
+        pass
+
+    @abstractmethod
+    def write_version(self) -> Optional[str]:
+        pass
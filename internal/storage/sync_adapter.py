@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+from starlette.concurrency import run_in_threadpool
+from ..models.schemas import (RollStats, RollCreate, RollResponse, RollRemoveResponse,
+                              InventoryPoint, InventorySnapshot, StatsBucket)
+from ..models.serialization import ROLL_FIELDS
+from ..profiling.profiler import current_profile
+from .crud import STREAM_BATCH_SIZE
+from .storage import AsyncStorageInterface, StorageInterface
+
+
+class SyncStorageAdapter(AsyncStorageInterface):
+    # Exposes a blocking StorageInterface to async endpoints. Backends that wait
+    # on I/O run in the thread pool; CPU-bound ones (InMemoryStorage) gain
+    # nothing from a thread hop under the GIL and are called inline.
+    def __init__(self, storage: StorageInterface, offload: bool = True):
+        self.storage = storage
+        self.offload = offload
+
+    async def _call(self, method, *args):
+        if self.offload:
+            profile = current_profile.get()
+            if profile is not None:
+                return await run_in_threadpool(profile.runcall, method, *args)
+            return await run_in_threadpool(method, *args)
+        return method(*args)
+
+    async def create_roll(self, roll: RollCreate) -> RollResponse:
+        return await self._call(self.storage.create_roll, roll)
+
+    async def create_rolls(self, rolls: List[RollCreate]) -> range:
+        return await self._call(self.storage.create_rolls, rolls)
+
+    async def get_rolls(self, filters: Dict[str, Optional[str]], after_id: Optional[int] = None,
+                        limit: Optional[int] = None, fields: Sequence[str] = ROLL_FIELDS) -> List[tuple]:
+        return await self._call(self.storage.get_rolls, filters, after_id, limit, fields)
+
+    async def iter_rolls(self, filters: Dict[str, Optional[str]], after_id: Optional[int] = None,
+                         limit: Optional[int] = None, fields: Sequence[str] = ROLL_FIELDS) -> AsyncIterator[tuple]:
+        # Pulled in batches so an offloaded backend costs one thread hop per batch
+        rolls = self.storage.iter_rolls(filters, after_id, limit, fields)
+        while batch := await self._call(list, islice(rolls, STREAM_BATCH_SIZE)):
+            for roll in batch:
+                yield roll
+
+    async def delete_roll(self, roll_id: int) -> Optional[RollResponse]:
+        return await self._call(self.storage.delete_roll, roll_id)
+
+    async def remove_rolls(self, ids: Optional[List[int]] = None,
+                           filters: Optional[Dict[str, Optional[str]]] = None) -> RollRemoveResponse:
+        return await self._call(self.storage.remove_rolls, ids, filters)
+
+    async def get_stats(self, start_date: datetime, end_date: datetime) -> RollStats:
+        return await self._call(self.storage.get_stats, start_date, end_date)
+
+    async def get_inventory(self, at: datetime, include_rolls: bool = False) -> InventorySnapshot:
+        return await self._call(self.storage.get_inventory, at, include_rolls)
+
+    async def get_inventory_series(self, start_date: datetime, end_date: datetime,
+                                   step: timedelta) -> List[InventoryPoint]:
+        return await self._call(self.storage.get_inventory_series, start_date, end_date, step)
+
+    async def get_stats_series(self, start_date: datetime, end_date: datetime,
+                               bucket: str) -> List[StatsBucket]:
+        return await self._call(self.storage.get_stats_series, start_date, end_date, bucket)
+
+    def write_version(self) -> Optional[str]:
+        return self.storage.write_version()
@@ -0,0 +1,54 @@
+from datetime import date, datetime, timedelta, UTC
+from typing import List, Tuple
+from sqlalchemy import Integer, cast, func
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+MICROSECOND = timedelta(microseconds=1)
+DAY_US = 86_400_000_000
+
+
+def to_us(value: datetime) -> int:
+    # Naive datetimes are taken as UTC, like the values SQLite hands back
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return (value - EPOCH) // MICROSECOND
+
+
+def from_us(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+def as_naive_utc(value: datetime) -> datetime:
+    # The rolls table stores UTC wall-clock time without an offset
+    if value.tzinfo is not None:
+        value = value.astimezone(UTC).replace(tzinfo=None)
+    return value
+
+
+def epoch_us(column):
+    # SQLite keeps DateTime as 'YYYY-MM-DD HH:MM:SS.ffffff'; unlike julianday(),
+    # which rounds to milliseconds, this is exact
+    return (cast(func.strftime('%s', column), Integer) * 1_000_000
+            + cast(func.substr(column, 21, 6), Integer))
+
+
+def lifetime_days(added_at, removed_at):
+    return (epoch_us(removed_at) - epoch_us(added_at)) / float(DAY_US)
+
+
+def day_to_date(day: int) -> date:
+    return EPOCH.date() + timedelta(days=day)
+
+
+def split_days(start_us: int, end_us: int) -> Tuple[range, List[Tuple[int, int]]]:
+    # Whole UTC days inside [start_us, end_us] are answered from daily rollups;
+    # the partial days at either end come back as inclusive raw ranges
+    first, stop = -(-start_us // DAY_US), (end_us + 1) // DAY_US
+    if first >= stop:
+        return range(0), [(start_us, end_us)] if start_us <= end_us else []
+    edges = []
+    if start_us < first * DAY_US:
+        edges.append((start_us, first * DAY_US - 1))
+    if stop * DAY_US <= end_us:
+        edges.append((stop * DAY_US, end_us))
+    return range(first, stop), edges
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+from typing import List, Optional
+from weakref import WeakKeyDictionary
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+from config.config import settings
+from ..models.schemas import RollCreate, RollResponse
+from ..logger.logger import logger
+from . import crud
+
+
+class _Group:
+    # Rolls that go into one transaction; results line up with rolls
+    __slots__ = ("rolls", "full", "done", "results", "error")
+
+    def __init__(self, full, done):
+        self.rolls: List[RollCreate] = []
+        self.full = full
+        self.done = done
+        self.results: List[RollResponse] = []
+        self.error: Optional[Exception] = None
+
+
+class WriteCoalescer:
+    # Group commit for create_roll on the sync backend. The first caller of a
+    # group leads it. With no other group committing it flushes at once;
+    # otherwise it waits up to write_coalesce_ms, or until
+    # write_coalesce_max_rolls have joined, then inserts them all with its
+    # own session in one transaction. The others block until it is done and
+    # get their own rows back, or the leader's error.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._group: Optional[_Group] = None
+        # Groups being committed
+        self._flushing = 0
+
+    def create_roll(self, db: Session, roll: RollCreate) -> RollResponse:
+        with self._lock:
+            group = self._group
+            leader = group is None
+            if leader:
+                group = self._group = _Group(threading.Event(), threading.Event())
+                busy = self._flushing > 0
+            index = len(group.rolls)
+            group.rolls.append(roll)
+            if len(group.rolls) >= settings.write_coalesce_max_rolls:
+                self._group = None
+                group.full.set()
+        if leader:
+            # Whatever happens from here, the followers are released
+            flushing = False
+            try:
+                if busy:
+                    group.full.wait(settings.write_coalesce_ms / 1000)
+                with self._lock:
+                    if self._group is group:
+                        self._group = None
+                    self._flushing += 1
+                    flushing = True
+                group.results = crud.create_roll_group(db, group.rolls)
+                logger.debug("Committed %d coalesced rolls", len(group.rolls))
+            except Exception as e:
+                group.error = e
+            except BaseException:
+                group.error = RuntimeError("Group commit was interrupted")
+                raise
+            finally:
+                with self._lock:
+                    if self._group is group:
+                        self._group = None
+                    if flushing:
+                        self._flushing -= 1
+                group.done.set()
+        else:
+            group.done.wait()
+        if group.error is not None:
+            raise group.error
+        return group.results[index]
+
+
+class AsyncWriteCoalescer:
+    # The same for AsyncDatabaseStorage. The group is flushed by a task of
+    # its own on a session of its own, so a caller that goes away cannot
+    # strand the rest; callers only await the task. Creates made before the
+    # task first runs always share it.
+    def __init__(self):
+        self._group: Optional[_Group] = None
+        self._flushing = 0
+
+    async def create_roll(self, engine: AsyncEngine, roll: RollCreate) -> RollResponse:
+        group = self._group
+        if group is None:
+            group = self._group = _Group(asyncio.Event(), None)
+            group.done = asyncio.get_running_loop().create_task(self._flush(engine, group))
+        index = len(group.rolls)
+        group.rolls.append(roll)
+        if len(group.rolls) >= settings.write_coalesce_max_rolls:
+            self._group = None
+            group.full.set()
+        results = await asyncio.shield(group.done)
+        return results[index]
+
+    async def _flush(self, engine: AsyncEngine, group: _Group) -> List[RollResponse]:
+        try:
+            if self._flushing:
+                try:
+                    await asyncio.wait_for(group.full.wait(), settings.write_coalesce_ms / 1000)
+                except TimeoutError:
+                    pass
+        finally:
+            if self._group is group:
+                self._group = None
+        self._flushing += 1
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                results = await session.run_sync(crud.create_roll_group, group.rolls)
+        finally:
+            self._flushing -= 1
+        logger.debug("Committed %d coalesced rolls", len(group.rolls))
+        return results
+
+
+# One coalescer per engine, whichever session its callers hold
+_coalescers: "WeakKeyDictionary[Engine, WriteCoalescer]" = WeakKeyDictionary()
+_async_coalescers: "WeakKeyDictionary[AsyncEngine, AsyncWriteCoalescer]" = WeakKeyDictionary()
+_coalescers_lock = threading.Lock()
+
+
+def database_write_coalescer(engine: Engine) -> WriteCoalescer:
+    coalescer = _coalescers.get(engine)
+    if coalescer is None:
+        with _coalescers_lock:
+            coalescer = _coalescers.get(engine)
+            if coalescer is None:
+                coalescer = _coalescers[engine] = WriteCoalescer()
+    return coalescer
+
+
+def async_write_coalescer(engine: AsyncEngine) -> AsyncWriteCoalescer:
+    # Only ever called on the event loop, so no lock
+    coalescer = _async_coalescers.get(engine)
+    if coalescer is None:
+        coalescer = _async_coalescers[engine] = AsyncWriteCoalescer()
+    return coalescer
@@ -28,9 +28,10 @@ def db_session():
 @pytest.fixture(scope="function")
 def client(db_session):
     from internal.storage.database_storage import DatabaseStorage
+    from internal.storage.sync_adapter import SyncStorageAdapter
 
     def override_get_storage():
-        return DatabaseStorage(db_session)
+        return SyncStorageAdapter(DatabaseStorage(db_session))
 
     app.dependency_overrides[get_storage] = override_get_storage
 
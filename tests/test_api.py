@@ -0,0 +1,257 @@
+import json
+from datetime import datetime, timedelta, UTC
+import pytest
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+from app.main import app
+from internal.metrics.metrics import STORAGE_SECONDS
+from internal.models.schemas import RollCreate, RollResponse
+from internal.storage import crud, database
+from internal.storage.database import get_storage
+from internal.storage.in_memory_storage import InMemoryStorage
+from internal.storage.migrations import migrate
+from internal.storage.sync_adapter import SyncStorageAdapter
+
+
+@pytest.fixture
+def storage():
+    return InMemoryStorage()
+
+
+@pytest.fixture
+def client(storage):
+    app.dependency_overrides[get_storage] = lambda: SyncStorageAdapter(storage, offload=False)
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_create_rolls_batch(client, storage, monkeypatch):
+    monkeypatch.setattr(database.settings, "batch_chunk_size", 2)
+    rolls = [{"length": i, "weight": 10 * i} for i in range(1, 6)]
+
+    response = client.post("/rolls/batch", json=rolls)
+
+    assert response.status_code == 200
+    assert response.json() == {"count": 5, "id_ranges": [[1, 5]]}
+    assert [r.weight for r in storage.get_rolls({})] == [10.0, 20.0, 30.0, 40.0, 50.0]
+
+    body = "\n".join(json.dumps(roll) for roll in rolls[:3]) + "\n\n"
+    response = client.post("/rolls/batch", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.json() == {"count": 3, "id_ranges": [[6, 8]]}
+
+
+def test_create_rolls_batch_rejects_invalid_rolls(client, storage, monkeypatch):
+    monkeypatch.setattr(database.settings, "batch_chunk_size", 2)
+
+    response = client.post("/rolls/batch", json=[{"length": 1, "weight": 1}, {"length": "x"}])
+    assert response.status_code == 422
+    assert len(storage) == 0
+
+    body = '{"length": 1, "weight": 1}\n{"length": 2, "weight": 2}\n{"length": "x"}'
+    response = client.post("/rolls/batch", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 422
+    assert response.json()["detail"]["created"] == {"count": 2, "id_ranges": [[1, 2]]}
+
+
+def test_create_rolls_batch_rejects_malformed_bodies(client, storage, monkeypatch):
+    monkeypatch.setattr(database.settings, "batch_chunk_size", 2)
+
+    for body in ("not json", '[{"length": 1, "weight": 1}, {"length": 2,'):
+        response = client.post("/rolls/batch", content=body, headers={"content-type": "application/json"})
+        assert response.status_code == 422
+        assert response.json()["detail"]["created"] == {"count": 0, "id_ranges": []}
+    assert len(storage) == 0
+
+    body = '{"length": 1, "weight": 1}\n{"length": 2, "weight": 2}\n{"length": 3, "weig'
+    response = client.post("/rolls/batch", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert detail["created"] == {"count": 2, "id_ranges": [[1, 2]]}
+    assert detail["errors"][0]["type"] == "json_invalid" and "input" not in detail["errors"][0]
+
+
+def test_delete_roll_twice(client, storage):
+    client.post("/rolls/", json={"length": 1, "weight": 2})
+
+    response = client.delete("/rolls/1")
+    assert response.status_code == 200
+    assert response.json()["removed_at"] is not None
+    response = client.delete("/rolls/1")
+    assert (response.status_code, response.json()) == (404, {"detail": "Roll not found"})
+    assert client.delete("/rolls/99").status_code == 404
+
+
+def test_remove_rolls(client, storage):
+    client.post("/rolls/batch", json=[{"length": i, "weight": 10 * i} for i in range(1, 6)])
+
+    response = client.post("/rolls/remove", json={"ids": [1, 3, 42]})
+    assert response.json() == {"removed": [1, 3], "not_found": [42]}
+
+    response = client.post("/rolls/remove", json={"filters": {"weight_range": "0,40"}})
+    assert response.json() == {"removed": [2, 4], "not_found": []}
+
+    for body in ({}, {"ids": [1], "filters": {"id_range": "1,2"}}, {"filters": {}}):
+        assert client.post("/rolls/remove", json=body).status_code == 422
+    assert [r.id for r in storage.get_rolls({}) if r.removed_at is None] == [5]
+
+
+def test_get_rolls_keyset_pagination(client, storage):
+    storage.create_rolls([RollCreate(length=i, weight=10 * i) for i in range(1, 8)])
+
+    response = client.get("/rolls/", params={"limit": 3})
+    assert [r["id"] for r in response.json()] == [1, 2, 3]
+    assert response.headers["X-Next-After-Id"] == "3"
+
+    response = client.get("/rolls/", params={"after_id": 3, "limit": 3, "weight_range": "20,70"})
+    assert [r["id"] for r in response.json()] == [4, 5, 6]
+    response = client.get("/rolls/", params={"after_id": 6, "limit": 3, "weight_range": "20,70"})
+    assert [r["id"] for r in response.json()] == [7]
+    assert "X-Next-After-Id" not in response.headers
+
+    assert client.get("/rolls/", params={"limit": 0}).status_code == 422
+
+
+def test_get_rolls_ndjson_stream(client, storage):
+    storage.create_rolls([RollCreate(length=i, weight=10 * i) for i in range(1, 8)])
+    headers = {"accept": "application/x-ndjson"}
+
+    response = client.get("/rolls/", params={"after_id": 2, "weight_range": "0,60"}, headers=headers)
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [3, 4, 5, 6]
+    assert client.get("/rolls/", params={"after_id": 7}, headers=headers).text == ""
+    assert client.get("/rolls/", params={"weight_range": "x"}, headers=headers).status_code == 400
+
+
+def test_get_rolls_wire_format_matches_response_model(client, storage):
+    storage.create_rolls([RollCreate(length=i, weight=10 * i) for i in range(1, 4)])
+    storage.delete_roll(2)
+    rolls = [RollResponse(**roll._asdict()) for roll in storage.get_rolls({})]
+
+    response = client.get("/rolls/")
+
+    assert response.content == TypeAdapter(list[RollResponse]).dump_json(rolls)
+    response = client.get("/rolls/", headers={"accept": "application/x-ndjson"})
+    assert response.content == b"".join(roll.model_dump_json().encode() + b"\n" for roll in rolls)
+    stats = client.get("/rolls/stats/", params={"start_date": "2000-01-01", "end_date": "2100-01-01"})
+    assert stats.json()["total_removed"] == 1
+
+
+def test_get_rolls_fields_projection(client, storage):
+    storage.create_rolls([RollCreate(length=i, weight=10 * i) for i in range(1, 6)])
+    storage.delete_roll(1)
+
+    response = client.get("/rolls/", params={"fields": "weight,removed_at", "limit": 2})
+    assert [list(r) for r in response.json()] == [["weight", "removed_at"]] * 2
+    assert [r["weight"] for r in response.json()] == [10.0, 20.0]
+    assert response.headers["X-Next-After-Id"] == "2"
+
+    response = client.get("/rolls/", params={"fields": "id, weight,id", "after_id": 3},
+                          headers={"accept": "application/x-ndjson"})
+    assert [json.loads(line) for line in response.text.splitlines()] == [{"id": 4, "weight": 40.0},
+                                                                          {"id": 5, "weight": 50.0}]
+    for fields in ("id,color", "", ","):
+        assert client.get("/rolls/", params={"fields": fields}).status_code == 422
+
+
+@pytest.mark.parametrize("storage_type", ["database_sync", "database"])
+def test_get_rolls_ndjson_stream_from_database(tmp_path, storage_type, monkeypatch):
+    monkeypatch.setattr(crud, "STREAM_BATCH_SIZE", 10)
+    monkeypatch.setattr(database.settings, "storage_type", storage_type)
+    url = f"sqlite:///{tmp_path / 'rolls.db'}"
+    engine = database.create_db_engine(url)
+    migrate(engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine, autoflush=False))
+    async_engine = database.create_async_db_engine(url)
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(bind=async_engine, expire_on_commit=False),
+                        raising=False)
+
+    with TestClient(app) as client:
+        client.post("/rolls/batch", json=[{"length": i, "weight": i} for i in range(1, 101)])
+        response = client.get("/rolls/", params={"after_id": 5, "length_range": "1,95"},
+                              headers={"accept": "application/x-ndjson"})
+        assert [json.loads(line)["id"] for line in response.text.splitlines()] == list(range(6, 96))
+        response = client.get("/rolls/", params={"after_id": 5, "limit": 2})
+        assert [r["id"] for r in response.json()] == [6, 7]
+        response = client.get("/rolls/", params={"after_id": 5, "limit": 2, "fields": "length"})
+        assert (response.json(), response.headers["X-Next-After-Id"]) == ([{"length": 6.0}, {"length": 7.0}], "7")
+
+    # The stream finished before the request's session was closed
+    assert engine.pool.checkedout() == 0
+    assert async_engine.sync_engine.pool.checkedout() == 0
+    engine.dispose()
+
+
+def check_conditional_gets(client, backend):
+    def storage_calls():
+        return sum(STORAGE_SECONDS.snapshot(backend, method)[0] for method in ("get_rolls", "iter_rolls", "get_stats",
+                                                                          "get_stats_series"))
+
+    client.post("/rolls/batch", json=[{"length": i, "weight": i} for i in range(1, 6)])
+    window = {"start_date": "2000-01-01T00:00:00Z", "end_date": "2100-01-01T00:00:00Z"}
+    now = datetime.now(UTC)
+    series_window = {"start_date": (now - timedelta(days=1)).isoformat(),
+                     "end_date": (now + timedelta(days=1)).isoformat(), "bucket": "day"}
+    requests = [
+        ("/rolls/", {"weight_range": "2,4"}, {}),
+        ("/rolls/", {"weight_range": "2,4"}, {"accept": "application/x-ndjson"}),
+        ("/rolls/", {"weight_range": "2,5"}, {}),
+        ("/rolls/stats/", window, {}),
+        ("/rolls/stats/series", series_window, {}),
+    ]
+    responses = [client.get(path, params=params, headers=headers) for path, params, headers in requests]
+    etags = [response.headers["ETag"] for response in responses]
+    assert len(set(etags)) == len(etags)
+
+    calls = storage_calls()
+    for (path, params, headers), etag in zip(requests, etags):
+        response = client.get(path, params=params, headers={**headers, "if-none-match": f'"other", {etag}'})
+        assert (response.status_code, response.content, response.headers["ETag"]) == (304, b"", etag)
+    assert storage_calls() == calls
+
+    client.delete("/rolls/3")
+    for (path, params, headers), etag in zip(requests, etags):
+        response = client.get(path, params=params, headers={**headers, "if-none-match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+    assert client.get("/rolls/stats/", params=window).json()["total_removed"] == 1
+    series = client.get("/rolls/stats/series", params=series_window).json()
+    assert len(series) == 3
+    assert sum(b["added_count"] for b in series) == 5 and sum(b["removed_count"] for b in series) == 1
+    assert series[-1]["on_hand"] == 4
+
+
+def test_stats_series_rejects_invalid_buckets(client):
+    window = {"start_date": "2000-01-01T00:00:00Z", "end_date": "2100-01-01T00:00:00Z"}
+    assert client.get("/rolls/stats/series", params={**window, "bucket": "month"}).status_code == 422
+    response = client.get("/rolls/stats/series", params={**window, "bucket": "hour"})
+    assert response.status_code == 400
+    response = client.get("/rolls/stats/series", params={"start_date": "2024-01-03T00:00:00Z",
+                                                          "end_date": "2024-03-01T00:00:00Z", "bucket": "week"})
+    assert [b["start"] for b in response.json()][::8] == ["2024-01-01T00:00:00Z", "2024-02-26T00:00:00Z"]
+
+
+def test_conditional_gets_in_memory(client):
+    check_conditional_gets(client, "InMemoryStorage")
+
+
+@pytest.mark.parametrize("storage_type, backend", [("database_sync", "DatabaseStorage"),
+                                                   ("database", "AsyncDatabaseStorage")])
+def test_conditional_gets_from_database(tmp_path, storage_type, backend, monkeypatch):
+    monkeypatch.setattr(database.settings, "storage_type", storage_type)
+    url = f"sqlite:///{tmp_path / 'rolls.db'}"
+    engine = database.create_db_engine(url)
+    migrate(engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine, autoflush=False))
+    async_engine = database.create_async_db_engine(url)
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(bind=async_engine, expire_on_commit=False),
+                        raising=False)
+
+    with TestClient(app) as client:
+        check_conditional_gets(client, backend)
+    engine.dispose()
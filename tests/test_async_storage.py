@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime, timedelta, UTC
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from internal.models.models import Base
+from internal.models.schemas import RollCreate
+from internal.storage.async_database_storage import AsyncDatabaseStorage
+from internal.storage.database import async_database_url
+from internal.storage.in_memory_storage import InMemoryStorage
+from internal.storage.sync_adapter import SyncStorageAdapter
+
+
+def field(result, name):
+    # crud returns dicts, InMemoryStorage returns models
+    return result[name] if isinstance(result, dict) else getattr(result, name)
+
+
+async def exercise(storage):
+    for length, weight in [(10.0, 100.0), (20.0, 200.0), (30.0, 300.0)]:
+        await storage.create_roll(RollCreate(length=length, weight=weight))
+    removed = await storage.delete_roll(2)
+    assert removed.id == 2 and removed.removed_at is not None
+    assert await storage.delete_roll(2) is None
+    assert await storage.delete_roll(99) is None
+
+    result = await storage.remove_rolls(ids=[3, 2, 42])
+    assert (field(result, "removed"), field(result, "not_found")) == ([3], [2, 42])
+    await storage.create_roll(RollCreate(length=30.0, weight=300.0))
+
+    rolls = await storage.get_rolls({"weight_range": "150,350"})
+    assert [r.id for r in rolls] == [2, 3, 4]
+
+    now = datetime.now(UTC)
+    stats = await storage.get_stats(now - timedelta(days=1), now + timedelta(days=1))
+    assert (field(stats, "total_added"), field(stats, "total_removed")) == (4, 2)
+    inventory = await storage.get_inventory(now + timedelta(seconds=1))
+    assert field(inventory, "count") == 2
+
+
+def test_async_database_storage(tmp_path):
+    async def run():
+        engine = create_async_engine(async_database_url(f"sqlite:///{tmp_path / 'rolls.db'}"))
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        async with session_factory() as session:
+            await exercise(AsyncDatabaseStorage(session))
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("offload", [True, False])
+def test_sync_storage_adapter(offload):
+    asyncio.run(exercise(SyncStorageAdapter(InMemoryStorage(), offload=offload)))
@@ -0,0 +1,243 @@
+from datetime import datetime, timedelta, UTC
+import random
+import pytest
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from internal.models.models import Base, Roll, RollDailyRollup
+from internal.models.schemas import RollCreate, RollResponse, StatsBucket
+from internal.models.serialization import encode_rolls, encode_stats_series
+from internal.storage import crud, rollup
+
+
+T0 = datetime(2024, 1, 1, 8, 0, 0)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def history(db):
+    # (length, weight, added hours after T0, removed hours after T0)
+    rolls = [
+        (10.0, 100.0, 0, 5),
+        (20.0, 200.0, 1, None),
+        (30.0, 300.0, 2, 3),
+        (40.0, 400.0, 6, None),
+    ]
+    for length, weight, added, removed in rolls:
+        db.add(Roll(
+            length=length,
+            weight=weight,
+            added_at=T0 + timedelta(hours=added),
+            removed_at=T0 + timedelta(hours=removed) if removed is not None else None
+        ))
+    db.commit()
+    return db
+
+
+def test_get_inventory(history):
+    snapshot = crud.get_inventory(history, T0 + timedelta(hours=2), include_rolls=True)
+
+    assert snapshot["count"] == 3
+    assert snapshot["total_weight"] == 600.0
+    assert [r.id for r in snapshot["rolls"]] == [1, 2, 3]
+
+    # A roll is no longer in stock at the instant it is removed
+    snapshot = crud.get_inventory(history, T0 + timedelta(hours=5))
+    assert snapshot["count"] == 1
+    assert snapshot["total_weight"] == 200.0
+    assert snapshot["rolls"] is None
+
+    assert crud.get_inventory(history, T0 - timedelta(hours=1))["count"] == 0
+
+
+def test_get_inventory_series_matches_points(history):
+    series = crud.get_inventory_series(history, T0 - timedelta(minutes=30), T0 + timedelta(hours=7),
+                                       timedelta(minutes=30))
+
+    assert len(series) == 16
+    for point in series:
+        expected = crud.get_inventory(history, point["at"])
+        assert (point["count"], point["total_weight"]) == (expected["count"], expected["total_weight"])
+
+    with pytest.raises(ValueError):
+        crud.get_inventory_series(history, T0, T0 + timedelta(days=1), timedelta(0))
+
+
+def test_get_stats_series_groups_by_bucket(history):
+    series = crud.get_stats_series(history, T0 - timedelta(minutes=30), T0 + timedelta(hours=6, minutes=10), "hour")
+
+    assert [b["start"] for b in series] == [T0.replace(tzinfo=UTC) + timedelta(hours=h) for h in range(-1, 7)]
+    assert [b["added_count"] for b in series] == [0, 1, 1, 1, 0, 0, 0, 1]
+    assert [b["removed_count"] for b in series] == [0, 0, 0, 0, 1, 0, 1, 0]
+    assert [b["on_hand"] for b in series] == [0, 1, 2, 3, 2, 2, 1, 2]
+    assert series[3]["total_weight"] == 300.0 and series[3]["avg_length"] == 30.0
+    assert series[0]["avg_weight"] == 0
+
+    # Rolls added and removed before the first bucket only count towards on_hand
+    series = crud.get_stats_series(history, T0 + timedelta(hours=4, minutes=20), T0 + timedelta(hours=4), "hour")
+    assert series == []
+    series = crud.get_stats_series(history, T0 + timedelta(hours=4, minutes=20), T0 + timedelta(hours=4, minutes=50),
+                                   "hour")
+    assert [(b["added_count"], b["removed_count"], b["on_hand"]) for b in series] == [(0, 0, 2)]
+
+    # 2024-01-01 is a Monday
+    series = crud.get_stats_series(history, T0 + timedelta(hours=4), T0 + timedelta(days=1), "week")
+    assert [(b["start"], b["added_count"], b["removed_count"], b["on_hand"]) for b in series] == [
+        (datetime(2024, 1, 1, tzinfo=UTC), 4, 2, 2)]
+    series = crud.get_stats_series(history, T0 + timedelta(hours=4), T0 + timedelta(days=1), "day")
+    assert [b["total_length"] for b in series] == [100.0, 0.0]
+
+    with pytest.raises(ValueError):
+        crud.get_stats_series(history, T0, T0 + timedelta(days=1), "month")
+
+
+def test_get_stats_is_scoped_to_window(history):
+    stats = crud.get_stats(history, T0, T0 + timedelta(hours=4))
+
+    assert stats["total_added"] == 3
+    assert stats["total_removed"] == 1
+    assert stats["avg_length"] == 20.0
+    assert stats["max_weight"] == 300.0
+    assert stats["min_weight"] == 100.0
+    assert stats["total_weight"] == 600.0
+    assert stats["max_time_diff"] == pytest.approx(1 / 24)
+    assert stats["min_rolls_day"] == stats["max_rolls_day"] == "2024-01-01"
+
+    stats = crud.get_stats(history, T0 + timedelta(days=1), T0 + timedelta(days=2))
+    assert stats["total_added"] == 0
+    assert stats["avg_weight"] == 0
+    assert stats["max_rolls_day"] is None
+
+
+def rollup_rows(db):
+    return [
+        (r.day, r.added_count, r.added_weight, r.min_length, r.max_weight, r.removed_count,
+         r.removed_weight, pytest.approx(r.min_lifetime), pytest.approx(r.max_lifetime))
+        for r in db.query(RollDailyRollup).order_by(RollDailyRollup.day)
+    ]
+
+
+def test_rollup_maintained_on_write_matches_backfill(db):
+    for i in range(6):
+        crud.create_roll(db, RollCreate(length=10.0 + i, weight=100.0 * (i + 1)))
+    crud.delete_roll(db, 2)
+    crud.delete_roll(db, 5)
+    assert crud.delete_roll(db, 5) is None
+
+    maintained = rollup_rows(db)
+    assert maintained[-1][1] == 6
+    assert maintained[-1][5] == 2
+
+    rollup.backfill(db)
+    assert rollup_rows(db) == maintained
+
+
+def test_get_stats_combines_rollup_and_edge_days(db):
+    rnd = random.Random(3)
+    rolls = []
+    for _ in range(300):
+        added_at = T0 + timedelta(minutes=rnd.randint(0, 10 * 24 * 60))
+        removed_at = added_at + timedelta(minutes=rnd.randint(1, 3 * 24 * 60)) if rnd.random() < 0.6 else None
+        rolls.append(Roll(length=rnd.randint(1, 100), weight=rnd.randint(1, 1000),
+                          added_at=added_at, removed_at=removed_at))
+    db.add_all(rolls)
+    db.commit()
+    rollup.backfill(db)
+
+    windows = [
+        (T0 + timedelta(days=1, hours=5), T0 + timedelta(days=6, hours=1)),
+        (T0 - timedelta(hours=8), T0 + timedelta(days=3, hours=16) - timedelta(microseconds=1)),
+        (T0 + timedelta(hours=1), T0 + timedelta(hours=20)),
+    ]
+    for start, end in windows:
+        added = [r for r in rolls if start <= r.added_at <= end]
+        removed = [r for r in rolls if r.removed_at and start <= r.removed_at <= end]
+        lifetimes = [(r.removed_at - r.added_at) / timedelta(days=1) for r in removed]
+        per_day = {}
+        for r in added:
+            per_day[r.added_at.date().isoformat()] = per_day.get(r.added_at.date().isoformat(), 0) + 1
+
+        stats = crud.get_stats(db, start, end)
+
+        assert stats["total_added"] == len(added)
+        assert stats["total_removed"] == len(removed)
+        assert stats["total_weight"] == sum(r.weight for r in added)
+        assert stats["avg_length"] == pytest.approx(sum(r.length for r in added) / len(added))
+        assert stats["min_length"] == min(r.length for r in added)
+        assert stats["max_weight"] == max(r.weight for r in added)
+        assert stats["max_time_diff"] == pytest.approx(max(lifetimes))
+        assert stats["min_time_diff"] == pytest.approx(min(lifetimes))
+        assert stats["max_rolls_day"] == max(sorted(per_day), key=per_day.get)
+        assert stats["min_rolls_day"] == min(sorted(per_day), key=per_day.get)
+
+
+def test_create_rolls_assigns_consecutive_ids(db):
+    crud.create_roll(db, RollCreate(length=100, weight=1))
+    ids = crud.create_rolls(db, [RollCreate(length=i, weight=10 * i) for i in range(1, 6)])
+
+    assert ids == range(2, 7)
+    rolls = crud.get_rolls(db, {"id_range": "2,6"})
+    assert [(r.id, r.length, r.weight) for r in rolls] == [(i + 1, i, 10 * i) for i in range(1, 6)]
+    assert len({r.added_at for r in rolls}) == 1
+    assert crud.create_rolls(db, []) == range(0)
+
+    # The batch upsert leaves the rollup as the row-by-row writes would
+    maintained = {row.day: (row.added_count, row.added_weight, row.min_length, row.max_weight)
+                  for row in db.query(RollDailyRollup)}
+    rollup.backfill(db)
+    assert maintained == {row.day: (row.added_count, row.added_weight, row.min_length, row.max_weight)
+                          for row in db.query(RollDailyRollup)}
+
+
+def test_remove_rolls(history):
+    result = crud.remove_rolls(history, ids=[2, 99, 1, 2, 4])
+
+    # Roll 1 was already removed in the fixture
+    assert result == {"removed": [2, 4], "not_found": [99, 1]}
+    assert crud.get_inventory(history, datetime.now(UTC) + timedelta(seconds=1))["count"] == 0
+    rollup_row = history.query(RollDailyRollup).filter(RollDailyRollup.day == datetime.now(UTC).date()).one()
+    assert (rollup_row.removed_count, rollup_row.removed_weight) == (2, 600.0)
+
+    crud.create_rolls(history, [RollCreate(length=i, weight=100 * i) for i in range(1, 5)])
+    result = crud.remove_rolls(history, filters={"weight_range": "150,350", "length_range": None})
+    assert result == {"removed": [6, 7], "not_found": []}
+    assert crud.remove_rolls(history, filters={"weight_range": "150,350"})["removed"] == []
+
+
+def test_get_rolls_rows_encode_like_response_model(history):
+    rows = crud.get_rolls(history, {})
+
+    rolls = [RollResponse.model_validate(roll, from_attributes=True) for roll in history.query(Roll).order_by(Roll.id)]
+    assert encode_rolls(rows) == TypeAdapter(list[RollResponse]).dump_json(rolls)
+    assert encode_rolls(crud.iter_rolls(history, {}, after_id=2)) == TypeAdapter(list[RollResponse]).dump_json(rolls[2:])
+
+
+def test_get_stats_series_encodes_like_response_model(history):
+    series = crud.get_stats_series(history, T0 - timedelta(minutes=30), T0 + timedelta(hours=6, minutes=10), "hour")
+
+    buckets = TypeAdapter(list[StatsBucket]).validate_python(series)
+    assert encode_stats_series(series) == TypeAdapter(list[StatsBucket]).dump_json(buckets)
+    assert encode_stats_series(buckets) == encode_stats_series(series)
+    assert encode_stats_series([]) == b"[]"
+
+
+def test_get_rolls_selects_only_requested_fields(history):
+    statements = []
+    event.listen(history.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    rows = crud.get_rolls(history, {"weight_range": "150,450"}, fields=("weight", "id"))
+
+    assert rows == [(200.0, 2), (300.0, 3), (400.0, 4)]
+    select_list = statements[-1].split("FROM")[0]
+    assert "weight" in select_list and "added_at" not in select_list and "length" not in select_list
@@ -0,0 +1,357 @@
+from datetime import datetime, timedelta, UTC
+import logging
+import random
+import sys
+import threading
+import time
+import pytest
+from internal.models.schemas import RollCreate
+from internal.storage import in_memory_storage
+from internal.storage.in_memory_storage import InMemoryStorage
+from internal.storage.sorted_index import TAIL_SIZE
+from internal.logger.logger import logger
+
+
+@pytest.fixture
+def storage():
+    storage = InMemoryStorage()
+    for length, weight in [(10.0, 100.0), (20.0, 200.0), (30.0, 300.0)]:
+        storage.create_roll(RollCreate(length=length, weight=weight))
+    return storage
+
+
+def test_create_roll_assigns_sequential_ids(storage):
+    roll = storage.create_roll(RollCreate(length=5.0, weight=50.0))
+
+    assert roll.id == 4
+    assert roll.length == 5.0
+    assert roll.weight == 50.0
+    assert roll.added_at.tzinfo is not None
+    assert roll.removed_at is None
+
+
+def test_create_rolls(storage):
+    ids = storage.create_rolls([RollCreate(length=i, weight=10 * i) for i in range(1, 4)])
+
+    assert ids == range(4, 7)
+    assert [(r.id, r.weight) for r in storage.get_rolls({"id_range": "4,6"})] == [(4, 10.0), (5, 20.0), (6, 30.0)]
+    assert storage.create_rolls([]) == range(0)
+    assert storage.get_inventory(datetime.now(UTC) + timedelta(seconds=1)).total_weight == 660.0
+    assert storage.get_stats(datetime.now(UTC) - timedelta(days=1), datetime.now(UTC)).min_length == 1.0
+
+
+def test_get_rolls_filters(storage):
+    storage.delete_roll(3)
+    today = datetime.now(UTC).date()
+    day_range = f"{today - timedelta(days=1)},{today + timedelta(days=1)}"
+
+    test_cases = [
+        ({}, [1, 2, 3]),
+        ({"id_range": "2,10"}, [2, 3]),
+        ({"id_range": "0,1"}, [1]),
+        ({"weight_range": "150,350"}, [2, 3]),
+        ({"length_range": "15,25", "weight_range": "0,1000"}, [2]),
+        ({"added_at_range": day_range}, [1, 2, 3]),
+        ({"removed_at_range": day_range}, [3]),
+    ]
+    for filters, expected_ids in test_cases:
+        assert [r.id for r in storage.get_rolls(filters)] == expected_ids
+
+    with pytest.raises(ValueError):
+        storage.get_rolls({"weight_range": "invalid"})
+
+
+def test_delete_roll(storage):
+    roll = storage.delete_roll(2)
+
+    assert roll.id == 2
+    assert roll.removed_at is not None
+    assert roll.removed_at >= roll.added_at
+    assert storage.get_rolls({"id_range": "2,2"})[0].removed_at == roll.removed_at
+    assert storage.delete_roll(99) is None
+    assert storage.delete_roll(0) is None
+
+
+def test_get_stats(storage):
+    storage.delete_roll(1)
+    now = datetime.now(UTC)
+
+    stats = storage.get_stats(now - timedelta(days=1), now + timedelta(days=1))
+
+    assert stats.total_added == 3
+    assert stats.total_removed == 1
+    assert stats.avg_length == 20.0
+    assert stats.min_weight == 100.0
+    assert stats.max_weight == 300.0
+    assert stats.total_weight == 600.0
+
+    empty = storage.get_stats(now + timedelta(days=1), now + timedelta(days=2))
+    assert empty.total_added == 0
+    assert empty.max_time_diff is None
+
+
+def test_remove_rolls(storage):
+    result = storage.remove_rolls(ids=[2, 99, 2, 0])
+
+    assert (result.removed, result.not_found) == ([2], [99, 0])
+    assert storage.delete_roll(2) is None
+    storage.create_rolls([RollCreate(length=i, weight=100 * i) for i in range(1, 5)])
+    result = storage.remove_rolls(filters={"weight_range": "150,350", "length_range": None})
+    assert (result.removed, result.not_found) == ([3, 5, 6], [])
+    assert storage.get_inventory(datetime.now(UTC) + timedelta(seconds=1)).count == 3
+    removed = [r.removed_at for r in storage.get_rolls({}) if r.removed_at]
+    assert removed == sorted(removed) and len(set(removed)) == 4
+
+
+def test_delete_roll_twice(storage):
+    assert storage.delete_roll(1) is not None
+    assert storage.delete_roll(1) is None
+
+
+def test_get_rolls_indexes_match_full_scan():
+    rnd = random.Random(7)
+    storage = InMemoryStorage()
+    for _ in range(3 * TAIL_SIZE + 100):
+        storage.create_roll(RollCreate(length=rnd.randint(1, 50), weight=rnd.randint(1, 500)))
+    for roll_id in rnd.sample(range(1, 3 * TAIL_SIZE), 500):
+        storage.delete_roll(roll_id)
+    rolls = storage.get_rolls({})
+    removed = sorted(r.removed_at for r in rolls if r.removed_at)
+    removed_range = f"{removed[100].isoformat()},{removed[300].isoformat()}"
+
+    test_cases = [
+        {"weight_range": "100,120"},
+        {"length_range": "10,10", "id_range": "2000,9000"},
+        {"weight_range": "1,250", "length_range": "1,3"},
+        {"removed_at_range": removed_range, "weight_range": "1,400"},
+        {"weight_range": "120,100"},
+    ]
+    for filters in test_cases:
+        weight_min, weight_max = map(float, filters.get("weight_range", "0,1000").split(","))
+        length_min, length_max = map(float, filters.get("length_range", "0,1000").split(","))
+        id_min, id_max = map(int, filters.get("id_range", f"0,{len(rolls)}").split(","))
+        expected = [
+            r.id for r in rolls
+            if weight_min <= r.weight <= weight_max
+            and length_min <= r.length <= length_max
+            and id_min <= r.id <= id_max
+            and ("removed_at_range" not in filters or (r.removed_at and removed[100] <= r.removed_at <= removed[300]))
+        ]
+        assert [r.id for r in storage.get_rolls(filters)] == expected
+
+
+def test_iter_rolls_streams_in_chunks(monkeypatch):
+    monkeypatch.setattr(in_memory_storage, "STREAM_CHUNK", 50)
+    rnd = random.Random(11)
+    storage = InMemoryStorage()
+    storage.create_rolls([RollCreate(length=rnd.randint(1, 50), weight=rnd.randint(1, 500)) for _ in range(1000)])
+    storage.remove_rolls(ids=rnd.sample(range(1, 1001), 200))
+    rolls = storage.get_rolls({})
+    removed = sorted(r.removed_at for r in rolls if r.removed_at)
+    cases = [
+        ({"weight_range": "1,400"}, None, None),
+        ({"weight_range": "1,400", "length_range": "5,45"}, 300, 120),
+        ({"removed_at_range": f"{removed[0].isoformat()},{removed[-1].isoformat()}"}, 100, None),
+        ({"weight_range": "100,104"}, None, None),
+        ({"id_range": "10,900", "length_range": "1,30"}, 500, 3),
+    ]
+    expected = [storage.get_rolls(*case) for case in cases]
+    matched = []
+    matching = storage._matching
+
+    def count_matches(*args):
+        rows = matching(*args)
+        matched.append(len(rows))
+        return rows
+
+    monkeypatch.setattr(storage, "_matching", count_matches)
+    assert [list(storage.iter_rolls(*case)) for case in cases] == expected
+    # Only the narrow weight filter, with fewer candidates than a chunk, was matched in one go
+    assert len(matched) == 1 and 0 < matched[0] <= 50
+
+
+def test_get_inventory(storage):
+    before = datetime.now(UTC) - timedelta(seconds=1)
+    removed = storage.delete_roll(2)
+    after = datetime.now(UTC) + timedelta(seconds=1)
+
+    snapshot = storage.get_inventory(after, include_rolls=True)
+    assert snapshot.count == 2
+    assert snapshot.total_weight == 400.0
+    assert [r.id for r in snapshot.rolls] == [1, 3]
+
+    snapshot = storage.get_inventory(removed.removed_at - timedelta(microseconds=1), include_rolls=True)
+    assert [r.id for r in snapshot.rolls] == [1, 2, 3]
+    assert storage.get_inventory(removed.removed_at).count == 2
+    assert storage.get_inventory(before).count == 0
+
+    series = storage.get_inventory_series(before, after, timedelta(milliseconds=100))
+    assert series[0].count == 0
+    assert series[-1].count == 2
+    for point in series:
+        expected = storage.get_inventory(point.at)
+        assert (point.count, point.total_weight) == (expected.count, expected.total_weight)
+
+
+def test_get_stats_combines_rollup_and_edge_days(monkeypatch):
+    clock = [datetime(2024, 1, 1, 8, tzinfo=UTC)]
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock[0]
+
+    monkeypatch.setattr(in_memory_storage, "datetime", FakeDatetime)
+    rnd = random.Random(5)
+    storage = InMemoryStorage()
+    for _ in range(400):
+        clock[0] += timedelta(minutes=rnd.randint(1, 60))
+        if rnd.random() < 0.3 and len(storage):
+            storage.delete_roll(rnd.randint(1, len(storage)))
+        else:
+            storage.create_roll(RollCreate(length=rnd.randint(1, 100), weight=rnd.randint(1, 1000)))
+    rolls = storage.get_rolls({})
+
+    for start, end in [
+        (datetime(2024, 1, 2, 5, tzinfo=UTC), datetime(2024, 1, 7, 1, tzinfo=UTC)),
+        (datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 4, tzinfo=UTC) - timedelta(microseconds=1)),
+        (datetime(2024, 1, 3, 1, tzinfo=UTC), datetime(2024, 1, 3, 20, tzinfo=UTC)),
+    ]:
+        added = [r for r in rolls if start <= r.added_at <= end]
+        removed = [r for r in rolls if r.removed_at and start <= r.removed_at <= end]
+        lifetimes = [(r.removed_at - r.added_at) / timedelta(days=1) for r in removed]
+
+        stats = storage.get_stats(start, end)
+
+        assert stats.total_added == len(added)
+        assert stats.total_removed == len(removed)
+        assert stats.total_weight == sum(r.weight for r in added)
+        assert stats.avg_length == pytest.approx(sum(r.length for r in added) / len(added))
+        assert stats.min_weight == min(r.weight for r in added)
+        assert stats.max_length == max(r.length for r in added)
+        assert stats.max_time_diff == pytest.approx(max(lifetimes))
+        assert stats.min_time_diff == pytest.approx(min(lifetimes))
+
+
+def test_get_stats_series_matches_full_scan(monkeypatch):
+    clock = [datetime(2024, 1, 1, 8, tzinfo=UTC)]
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock[0]
+
+    monkeypatch.setattr(in_memory_storage, "datetime", FakeDatetime)
+    rnd = random.Random(7)
+    storage = InMemoryStorage()
+    for _ in range(600):
+        clock[0] += timedelta(minutes=rnd.randint(1, 90))
+        if rnd.random() < 0.3 and len(storage):
+            storage.delete_roll(rnd.randint(1, len(storage)))
+        else:
+            storage.create_roll(RollCreate(length=rnd.randint(1, 100), weight=rnd.randint(1, 1000)))
+    rolls = storage.get_rolls({})
+
+    for start, end, bucket, count in [
+        (datetime(2024, 1, 3, 5, 30, tzinfo=UTC), datetime(2024, 1, 4, 2, tzinfo=UTC), "hour", 22),
+        (datetime(2024, 1, 5, 12, tzinfo=UTC), datetime(2024, 1, 20, tzinfo=UTC), "day", 16),
+        (datetime(2024, 1, 3, tzinfo=UTC), datetime(2024, 3, 1, tzinfo=UTC), "week", 9),
+    ]:
+        series = storage.get_stats_series(start, end, bucket)
+
+        assert len(series) == count
+        assert series[0].start <= start < series[0].end and series[-1].start <= end < series[-1].end
+        for b in series:
+            added = [r for r in rolls if b.start <= r.added_at < b.end]
+            assert b.added_count == len(added)
+            assert b.removed_count == sum(1 for r in rolls if r.removed_at and b.start <= r.removed_at < b.end)
+            assert b.total_length == sum(r.length for r in added)
+            assert b.total_weight == pytest.approx(sum(r.weight for r in added))
+            assert b.on_hand == storage.get_inventory(b.end - timedelta(microseconds=1)).count
+    assert series[0].start.weekday() == 0
+
+    with pytest.raises(ValueError):
+        storage.get_stats_series(datetime(2000, 1, 1, tzinfo=UTC), datetime(2100, 1, 1, tzinfo=UTC), "hour")
+
+
+def test_stats_read_the_rollups_of_their_version(storage):
+    storage.delete_roll(1)
+    published = storage._version
+    storage.create_rolls([RollCreate(length=i, weight=i) for i in range(1, 4)])
+    storage.delete_roll(2)
+    now = datetime.now(UTC)
+
+    # As if a reader had taken its version before the writes; today is a full day of the window
+    latest, storage._version = storage._version, published
+    stats = storage._compute_stats(now - timedelta(days=2), now + timedelta(days=2))
+    assert (stats.total_added, stats.total_removed, stats.total_weight) == (3, 1, 600.0)
+    storage._version = latest
+    stats = storage._compute_stats(now - timedelta(days=2), now + timedelta(days=2))
+    assert (stats.total_added, stats.total_removed, stats.total_weight) == (6, 2, 606.0)
+
+
+def test_concurrent_writers_and_readers_see_consistent_snapshots():
+    # Readers check invariants that only hold within one published version
+    switch_interval, log_level = sys.getswitchinterval(), logger.level
+    sys.setswitchinterval(1e-5)
+    # Misses on delete are logged as warnings; thousands of them only slow the test down
+    logger.setLevel(logging.ERROR)
+    storage = InMemoryStorage()
+    now = datetime.now(UTC)
+    window = f"{(now - timedelta(days=1)).isoformat()},{(now + timedelta(days=1)).isoformat()}"
+    stop, errors = threading.Event(), []
+    created, removed = [], []
+
+    def write(seed):
+        rnd = random.Random(seed)
+        while not stop.is_set():
+            choice = rnd.random()
+            if choice < 0.4:
+                value = rnd.randint(1, 100)
+                created.append(storage.create_roll(RollCreate(length=value, weight=value)).id)
+            elif choice < 0.6:
+                values = [rnd.randint(1, 100) for _ in range(rnd.randint(1, 20))]
+                created.extend(storage.create_rolls([RollCreate(length=v, weight=v) for v in values]))
+            elif choice < 0.8 and len(storage):
+                roll = storage.delete_roll(rnd.randint(1, len(storage)))
+                if roll is not None:
+                    removed.append(roll.id)
+            elif len(storage):
+                removed.extend(storage.remove_rolls(ids=[rnd.randint(1, len(storage)) for _ in range(5)]).removed)
+
+    def read():
+        added = 0
+        while not stop.is_set():
+            try:
+                rolls = storage.get_rolls({})
+                assert [r.id for r in rolls] == list(range(1, len(rolls) + 1))
+                assert all(r.length == r.weight for r in rolls)
+                matching = storage.get_rolls({"weight_range": "1,50", "removed_at_range": window})
+                assert all(r.removed_at is not None and r.weight <= 50 for r in matching)
+                inventory = storage.get_inventory(now + timedelta(days=1), include_rolls=True)
+                assert inventory.count == len(inventory.rolls)
+                assert inventory.total_weight == sum(r.weight for r in inventory.rolls)
+                stats = storage.get_stats(now - timedelta(days=1), now + timedelta(days=1))
+                assert added <= stats.total_added and stats.total_removed <= stats.total_added
+                added = stats.total_added
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+    threads = [threading.Thread(target=write, args=(seed,)) for seed in range(4)]
+    threads += [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        time.sleep(1.5)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        sys.setswitchinterval(switch_interval)
+        logger.setLevel(log_level)
+
+    assert errors == []
+    assert sorted(created) == list(range(1, len(storage) + 1))
+    assert len(removed) == len(set(removed))
+    assert sorted(removed) == [r.id for r in storage.get_rolls({"removed_at_range": window})]
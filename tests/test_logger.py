@@ -0,0 +1,133 @@
+import io
+import logging
+import os
+import queue
+import sys
+import pytest
+from internal.logger.handlers import (DroppingQueueHandler, LogListener, ReopeningRotatingFileHandler, StdoutHandler,
+                                     lazy)
+
+
+@pytest.fixture
+def make_logger(request):
+    def make(handler):
+        log = logging.getLogger(f"test.{request.node.name}")
+        log.setLevel(logging.DEBUG)
+        log.propagate = False
+        log.handlers = [handler]
+        return log
+    return make
+
+
+def drain(q):
+    records = []
+    while not q.empty():
+        records.append(q.get_nowait())
+    return records
+
+
+def test_queue_handler_samples_debug_and_reports_drops(make_logger):
+    q = queue.Queue(maxsize=8)
+    handler = DroppingQueueHandler(q, debug_sample_rate=3, block_timeout=0.01)
+    log = make_logger(handler)
+
+    for i in range(4):
+        log.debug("below pressure %d", i)
+    for i in range(9):
+        log.debug("sampled %d", i)
+    log.info("fills the queue")
+    log.info("queue is full")
+    log.warning("cannot wait")
+
+    assert q.full()
+    assert handler.dropped == 6 + 1 + 1
+    messages = [r.getMessage() for r in list(q.queue)]
+    assert messages == [f"below pressure {i}" for i in range(4)] + ["sampled 2", "sampled 5", "sampled 8",
+                                                                    "fills the queue"]
+
+    drain(q)
+    log.info("room again")
+    summary = drain(q)[-1]
+    assert (summary.levelno, summary.dropped) == (logging.WARNING, 8)
+    assert summary.getMessage() == "Dropped 8 log records under load (8 in total)"
+
+
+def test_lazy_values_are_only_computed_when_emitted(make_logger):
+    calls = []
+    q = queue.Queue()
+    log = make_logger(DroppingQueueHandler(q))
+    log.setLevel(logging.INFO)
+
+    def payload():
+        calls.append(1)
+        return {"length": 1.0}
+
+    log.debug("Creating roll: %s", lazy(payload), extra={"data": lazy(payload)})
+    assert calls == []
+    log.info("Creating roll: %s", lazy(payload), extra={"data": lazy(payload)})
+    record = q.get_nowait()
+    assert (record.msg, record.args, record.data) == ("Creating roll: {'length': 1.0}", None, {"length": 1.0})
+    assert len(calls) == 2
+
+
+def test_dropped_records_are_not_prepared(make_logger):
+    q = queue.Queue(maxsize=4)
+    handler = DroppingQueueHandler(q, debug_sample_rate=2, block_timeout=0.01)
+    log = make_logger(handler)
+    calls = []
+
+    def payload():
+        calls.append(1)
+        return 1
+
+    for _ in range(2):
+        log.debug("below pressure %s", lazy(payload))
+    for _ in range(4):
+        log.debug("sampled %s", lazy(payload))
+    log.info("queue is full %s", lazy(payload))
+
+    assert q.full()
+    assert handler.dropped == 3
+    # Two below pressure, two sampled in, and nothing for the dropped ones
+    assert len(calls) == 4
+
+
+def test_listener_writes_through_rotation(tmp_path, make_logger):
+    path = tmp_path / "api.log"
+    file_handler = ReopeningRotatingFileHandler(path, maxBytes=200, backupCount=2, encoding="utf-8")
+    q = queue.Queue()
+    listener = LogListener(q, file_handler, respect_handler_level=True)
+    log = make_logger(DroppingQueueHandler(q))
+    listener.start()
+    try:
+        for i in range(40):
+            log.info("size rollover %02d", i)
+        listener.stop()
+        assert os.path.exists(f"{path}.1") and os.path.exists(f"{path}.2")
+
+        # Moved away by logrotate: the next record goes to a new file
+        os.rename(path, tmp_path / "moved.log")
+        listener.start()
+        log.error("after external rotation", exc_info=ValueError("boom"))
+    finally:
+        listener.stop()
+        file_handler.close()
+
+    written = path.read_text()
+    assert written.startswith("after external rotation") and "ValueError: boom" in written
+    assert "size rollover 39" in (tmp_path / "moved.log").read_text()
+
+
+def test_stdout_handler_follows_replaced_stdout(make_logger, monkeypatch):
+    captured = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", captured)
+    log = make_logger(StdoutHandler())
+    log.info("captured")
+    assert captured.getvalue() == "captured\n"
+
+    # A runner that captured stdout closes its stream and puts the real one back
+    captured.close()
+    restored = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", restored)
+    log.info("after capture")
+    assert restored.getvalue() == "after capture\n"
@@ -0,0 +1,93 @@
+import threading
+import pytest
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+from app.main import app
+from internal.metrics.metrics import (Counter, Histogram, HTTP_REQUEST_SECONDS, POOL_CHECKOUT_SECONDS, REGISTRY,
+                                      STORAGE_ROWS, STORAGE_SECONDS)
+from internal.storage import database
+from internal.storage.migrations import migrate
+
+
+@pytest.fixture
+def registry():
+    registered = list(REGISTRY)
+    try:
+        yield
+    finally:
+        REGISTRY[:] = registered
+
+
+def test_thread_shards_add_up(registry):
+    hits = Counter("test_hits_total", "Hits", ("kind",))
+    latency = Histogram("test_latency_seconds", "Latency", ("kind",), buckets=(0.1, 1.0))
+
+    def work():
+        for i in range(1000):
+            hits.inc("a")
+            latency.observe(0.05 if i % 2 else 0.5, "a")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    hits.inc("b", amount=2)
+
+    assert (hits.value("a"), hits.value("b")) == (4000, 2)
+    assert latency.snapshot("a") == (4000, pytest.approx(2000 * 0.55))
+    assert list(latency.collect()) == [
+        'test_latency_seconds_bucket{kind="a",le="0.1"} 2000',
+        'test_latency_seconds_bucket{kind="a",le="1.0"} 4000',
+        'test_latency_seconds_bucket{kind="a",le="+Inf"} 4000',
+        f'test_latency_seconds_sum{{kind="a"}} {latency.snapshot("a")[1]}',
+        'test_latency_seconds_count{kind="a"} 4000',
+    ]
+
+
+def test_exited_threads_shards_are_retired(registry):
+    hits = Counter("test_retired_total", "Hits", ("kind",))
+    latency = Histogram("test_retired_seconds", "Latency", ("kind",), buckets=(0.1, 1.0))
+
+    def work():
+        hits.inc("a", amount=2)
+        latency.observe(0.5, "a")
+
+    for _ in range(200):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+    hits.inc("a")
+
+    assert (len(hits._shards), len(latency._shards)) == (1, 0)
+    assert hits.value("a") == 401
+    assert latency.snapshot("a") == (200, pytest.approx(100.0))
+
+
+def test_metrics_endpoint_reports_requests_storage_and_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(database.settings, "storage_type", "database_sync")
+    engine = database.create_db_engine(f"sqlite:///{tmp_path / 'rolls.db'}")
+    migrate(engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine, autoflush=False))
+    before = {
+        "requests": HTTP_REQUEST_SECONDS.snapshot("GET", "/rolls/", "200")[0],
+        "storage": STORAGE_SECONDS.snapshot("DatabaseStorage", "get_rolls")[0],
+        "rows": STORAGE_ROWS.snapshot("DatabaseStorage", "get_rolls")[1],
+        "checkouts": POOL_CHECKOUT_SECONDS.snapshot("sync")[0],
+    }
+
+    with TestClient(app) as client:
+        client.post("/rolls/batch", json=[{"length": i, "weight": i} for i in range(1, 6)])
+        client.get("/rolls/")
+        client.get("/rolls/", params={"limit": 2})
+        response = client.get("/metrics")
+    engine.dispose()
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert HTTP_REQUEST_SECONDS.snapshot("GET", "/rolls/", "200")[0] - before["requests"] == 2
+    assert STORAGE_SECONDS.snapshot("DatabaseStorage", "get_rolls")[0] - before["storage"] == 2
+    assert STORAGE_ROWS.snapshot("DatabaseStorage", "get_rolls")[1] - before["rows"] == 7
+    assert POOL_CHECKOUT_SECONDS.snapshot("sync")[0] - before["checkouts"] >= 3
+    assert 'http_request_duration_seconds_count{method="POST",route="/rolls/batch",status="200"}' in response.text
+    assert 'storage_operation_duration_seconds_count{backend="DatabaseStorage",method="create_rolls"}' in response.text
+    assert "log_records_dropped " in response.text
@@ -0,0 +1,79 @@
+import json
+import logging
+import pytest
+from fastapi import FastAPI, Request
+from starlette.testclient import TestClient
+from app.middleware import RequestLoggingMiddleware, redact_body
+from internal.logger.logger import logger
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def records():
+    handler = Records()
+    logger.addHandler(handler)
+    try:
+        yield handler.records
+    finally:
+        logger.removeHandler(handler)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    app.add_middleware(RequestLoggingMiddleware, max_body_size=64)
+    return TestClient(app)
+
+
+def test_redact_body():
+    assert json.loads(redact_body(b'{"user": "a", "password": "p\\"w", "token": 12}')) == {
+        "user": "a", "password": "***", "token": "***"
+    }
+    assert redact_body(b'{"secret": {"key": 1}, "rows": [{"token": "t"}]}') == {
+        "secret": "***", "rows": [{"token": "***"}]
+    }
+    assert redact_body(b'[{"length": 1}]') == '[{"length": 1}]'
+
+
+def test_logs_small_json_body_and_replays_it(client, records):
+    response = client.post("/echo", json={"name": "x", "password": "hunter2"})
+
+    assert response.json() == {"size": len(b'{"name":"x","password":"hunter2"}')}
+    received, finished = [r for r in records if r.getMessage().startswith("Request")]
+    assert json.loads(received.body) == {"name": "x", "password": "***"}
+    assert (finished.status_code, finished.getMessage()) == (200, "Request succeeded")
+    assert finished.process_time_ms >= 0
+
+
+def test_skips_large_and_non_json_bodies(client, records):
+    big = [{"length": i, "weight": i} for i in range(50)]
+    assert client.post("/echo", json=big).json() == {"size": len(json.dumps(big, separators=(",", ":")))}
+    assert client.post("/echo", content=b"password=x", headers={"content-type": "text/plain"}).status_code == 200
+
+    received = [r for r in records if r.getMessage() == "Request received"]
+    assert len(received) == 2 and not any(hasattr(r, "body") for r in received)
+
+
+def test_unhandled_exception_returns_500(client, records):
+    response = client.get("/boom", params={"a": "1"})
+
+    assert (response.status_code, response.json()) == (500, {"detail": "Internal server error"})
+    assert [r.getMessage() for r in records if r.levelno >= logging.ERROR] == ["Unhandled exception", "Request failed"]
+    assert [r.params for r in records if r.getMessage() == "Request received"] == [{"a": "1"}]
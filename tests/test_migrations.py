@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import sessionmaker
+from internal.models.models import Base
+from internal.storage import crud, rollup
+from internal.storage.migrations import LATEST_VERSION, get_version, migrate
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rolls.db'}")
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+def test_migrate_upgrades_baseline_database(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE rolls (id INTEGER NOT NULL, length FLOAT NOT NULL, weight FLOAT NOT NULL, "
+            "added_at DATETIME NOT NULL, removed_at DATETIME, PRIMARY KEY (id))"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO rolls (length, weight, added_at, removed_at) VALUES "
+            "(10, 100, '2024-01-01 08:00:00.000000', '2024-01-02 08:00:00.000000'), "
+            "(20, 200, '2024-01-01 09:00:00.000000', NULL), "
+            "(30, 50, '2024-01-02 10:30:00.250000', '2024-01-02 16:00:00.000001'), "
+            "(5, 75, '2024-01-02 23:59:59.999999', '2024-01-04 00:00:00.000000')"
+        )
+
+    assert migrate(engine) == LATEST_VERSION
+    assert migrate(engine) == LATEST_VERSION
+
+    with engine.connect() as conn:
+        assert get_version(conn) == LATEST_VERSION
+        days = conn.exec_driver_sql(
+            "SELECT day, added_count, added_weight, removed_count FROM roll_daily_rollup ORDER BY day"
+        ).all()
+        migrated_rollup = conn.exec_driver_sql("SELECT * FROM roll_daily_rollup ORDER BY day").all()
+    assert days == [("2024-01-01", 2, 300.0, 0), ("2024-01-02", 2, 125.0, 2), ("2024-01-04", 0, 0.0, 1)]
+
+    # The frozen SQL agrees with the backfill written against the models
+    db = sessionmaker(bind=engine)()
+    rollup.backfill(db)
+    db.close()
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT * FROM roll_daily_rollup ORDER BY day").all() == migrated_rollup
+
+    migrated = {ix["name"]: ix["column_names"] for ix in inspect(engine).get_indexes("rolls")}
+    expected = {ix.name: [c.name for c in ix.columns] for ix in Base.metadata.tables["rolls"].indexes}
+    assert migrated == expected
+
+
+def test_queries_do_not_scan_rolls(engine):
+    migrate(engine)
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append((statement, parameters))
+
+    db = sessionmaker(bind=engine)()
+    start = datetime(2024, 1, 1, 6)
+    filters = ["id_range", "weight_range", "length_range", "added_at_range", "removed_at_range"]
+    ranges = {"id_range": "1,10", "added_at_range": "2024-01-01,2024-01-05",
+              "removed_at_range": "2024-01-01,2024-01-05"}
+    for name in filters:
+        crud.get_rolls(db, {name: ranges.get(name, "10,20")})
+    crud.get_stats(db, start, start + timedelta(days=3, hours=5))
+    crud.get_inventory(db, start)
+    crud.get_inventory_series(db, start, start + timedelta(days=1), timedelta(hours=1))
+    db.close()
+    event.remove(engine, "before_cursor_execute", capture)
+
+    assert len(statements) == len(filters) + 3
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+            assert not [step for step in plan if step.startswith("SCAN rolls")], (statement, plan)
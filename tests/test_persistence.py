@@ -0,0 +1,105 @@
+import os
+import random
+from datetime import datetime, timedelta, UTC
+import pytest
+from internal.models.schemas import RollCreate
+from internal.storage import in_memory_storage, persistence
+from internal.storage.in_memory_storage import InMemoryStorage
+from internal.storage.sorted_index import TAIL_SIZE
+
+
+def reopen(directory, **options):
+    storage = InMemoryStorage()
+    storage.enable_persistence(str(directory), **options)
+    return storage
+
+
+def state(storage, now):
+    return (
+        storage.get_rolls({}),
+        storage.get_rolls({"weight_range": "100,400", "length_range": "5,50"}),
+        storage.get_rolls({"removed_at_range": f"{(now - timedelta(days=1)).isoformat()},{now.isoformat()}"}),
+        storage.get_stats(now - timedelta(days=1), now + timedelta(days=1)),
+        storage.get_inventory_series(now - timedelta(hours=1), now + timedelta(hours=1), timedelta(minutes=10)),
+    )
+
+
+def write(storage, rnd, count):
+    for _ in range(count):
+        choice = rnd.random()
+        if choice < 0.5:
+            storage.create_roll(RollCreate(length=rnd.randint(1, 100), weight=rnd.randint(1, 1000)))
+        elif choice < 0.7:
+            storage.create_rolls([RollCreate(length=rnd.randint(1, 100), weight=rnd.randint(1, 1000))
+                                  for _ in range(rnd.randint(1, 50))])
+        elif choice < 0.9:
+            storage.delete_roll(rnd.randint(1, len(storage) + 1))
+        else:
+            storage.remove_rolls(ids=[rnd.randint(1, len(storage)) for _ in range(5)])
+
+
+def test_restart_restores_snapshot_and_journal_tail(tmp_path):
+    rnd = random.Random(3)
+    storage = reopen(tmp_path, snapshot_every=3 * TAIL_SIZE)
+    storage.create_rolls([RollCreate(length=rnd.randint(1, 100), weight=rnd.randint(1, 1000))
+                          for _ in range(2 * TAIL_SIZE)])
+    write(storage, rnd, 200)
+    # Sorted index runs exist, so they go into the snapshot too
+    storage.get_rolls({"weight_range": "1,10"})
+    # A small snapshot can finish within the write that started it
+    while storage._snapshot_thread is None:
+        write(storage, rnd, 1)
+    storage._snapshot_thread.join()
+    write(storage, rnd, 50)
+    now = datetime.now(UTC)
+    expected = state(storage, now)
+    storage.close()
+
+    # The segment covered by the snapshot is gone
+    assert sorted(os.listdir(tmp_path)) == ["journal.00000002", persistence.SNAPSHOT_FILE]
+    restored = reopen(tmp_path, snapshot_every=3 * TAIL_SIZE)
+    assert restored._journaled > 0
+    assert state(restored, now) == expected
+
+    # Keeps going where it stopped
+    assert restored.create_roll(RollCreate(length=1, weight=1)).id == len(expected[0]) + 1
+    restored.close()
+
+
+def test_torn_journal_tail_is_dropped(tmp_path):
+    storage = reopen(tmp_path)
+    storage.create_rolls([RollCreate(length=i, weight=i) for i in range(1, 11)])
+    storage.delete_roll(3)
+    storage.close()
+    segment = persistence.segment_path(tmp_path, persistence.journal_segments(tmp_path)[-1])
+    size = os.path.getsize(segment)
+    with open(segment, "ab") as f:
+        f.write(persistence.RECORD.pack(persistence.ADDED, 1, 0) + b"\x00" * 5)
+
+    restored = reopen(tmp_path)
+    assert len(restored) == 10
+    assert restored.get_rolls({"id_range": "3,3"})[0].removed_at is not None
+    assert os.path.getsize(segment) == size
+    restored.close()
+
+
+def test_snapshot_leaves_out_rolls_removed_after_it_started(tmp_path, monkeypatch):
+    monkeypatch.setattr(in_memory_storage, "SNAPSHOT_CHUNK", 4)
+    storage = InMemoryStorage()
+    storage.create_rolls([RollCreate(length=i, weight=i) for i in range(1, 11)])
+    storage.delete_roll(2)
+
+    chunks = storage._removed_at_chunks(len(storage), 1)
+    first = next(chunks)
+    storage.delete_roll(1)
+    storage.delete_roll(9)
+    removed_at = [value for chunk in (first, *chunks) for value in chunk]
+
+    assert [i for i, value in enumerate(removed_at) if value != in_memory_storage.NOT_REMOVED] == [1]
+
+
+def test_enable_persistence_needs_an_empty_storage(tmp_path):
+    storage = InMemoryStorage()
+    storage.create_roll(RollCreate(length=1, weight=1))
+    with pytest.raises(ValueError):
+        storage.enable_persistence(str(tmp_path))
@@ -0,0 +1,50 @@
+import pstats
+import pytest
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+from app.main import app
+from app.middleware import ProfilingMiddleware
+from internal.storage import database
+from internal.storage.migrations import migrate
+
+
+@pytest.fixture
+def database_sync(tmp_path, monkeypatch):
+    monkeypatch.setattr(database.settings, "storage_type", "database_sync")
+    engine = database.create_db_engine(f"sqlite:///{tmp_path / 'rolls.db'}")
+    migrate(engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine, autoflush=False))
+    yield
+    engine.dispose()
+
+
+def functions(path):
+    return {(filename.replace("\\", "/"), name) for filename, _, name in pstats.Stats(str(path)).stats}
+
+
+def test_profiles_requests_sending_the_header(database_sync, tmp_path):
+    profiles = tmp_path / "profiles"
+    with TestClient(ProfilingMiddleware(app, directory=str(profiles))) as client:
+        client.post("/rolls/batch", json=[{"length": i, "weight": i} for i in range(1, 6)])
+        assert not profiles.exists()
+
+        response = client.get("/rolls/", headers={"X-Profile": "1", "X-Request-ID": "slow-listing"})
+
+    assert len(response.json()) == 5
+    assert response.headers["X-Profile-Id"] == "slow-listing"
+    profiled = functions(profiles / "slow-listing.prof")
+    # The loop thread and the thread pool call that ran crud
+    assert any(f.endswith("app/middleware.py") and name == "__call__" for f, name in profiled)
+    assert any(f.endswith("internal/api/endpoints.py") and name == "get_rolls" for f, name in profiled)
+    assert any(f.endswith("internal/storage/crud.py") and name == "get_rolls" for f, name in profiled)
+
+
+def test_sampling_and_unsafe_request_ids(tmp_path):
+    profiles = tmp_path / "profiles"
+    with TestClient(ProfilingMiddleware(app, directory=str(profiles), sample_rate=1.0)) as client:
+        response = client.get("/rolls/", headers={"X-Request-ID": "../../etc/passwd"})
+
+    request_id = response.headers["X-Profile-Id"]
+    assert "/" not in request_id
+    assert [p.name for p in profiles.iterdir()] == [f"{request_id}.prof"]
+    assert any(f.endswith("internal/storage/in_memory_storage.py") for f, _ in functions(profiles / f"{request_id}.prof"))
@@ -0,0 +1,72 @@
+import logging
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+from app.main import app
+from internal.storage import database
+from internal.storage.migrations import migrate
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture(params=["database_sync", "database"])
+def client(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(database.settings, "storage_type", request.param)
+    monkeypatch.setattr(database.settings, "db_stats_header", True)
+    url = f"sqlite:///{tmp_path / 'rolls.db'}"
+    engine = database.create_db_engine(url)
+    migrate(engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine, autoflush=False))
+    async_engine = database.create_async_db_engine(url)
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(bind=async_engine, expire_on_commit=False),
+                        raising=False)
+    with TestClient(app) as client:
+        client.post("/rolls/batch", json=[{"length": i, "weight": i} for i in range(1, 11)])
+        yield client
+    engine.dispose()
+
+
+@pytest.fixture
+def slow_queries():
+    handler = Records()
+    database.slow_query_logger.addHandler(handler)
+    try:
+        yield handler.records
+    finally:
+        database.slow_query_logger.removeHandler(handler)
+
+
+def test_query_count_and_time_headers(client):
+    response = client.get("/rolls/", params={"weight_range": "2,5"})
+
+    assert len(response.json()) == 4
+    assert response.headers["X-DB-Query-Count"] == "1"
+    assert float(response.headers["X-DB-Time-Ms"]) > 0
+
+    response = client.get("/rolls/stats/", params={"start_date": "2000-01-01", "end_date": "2100-01-01"})
+    assert int(response.headers["X-DB-Query-Count"]) >= 1
+    assert "X-DB-Query-Count" in client.post("/rolls/", json={"length": 1, "weight": 1}).headers
+
+
+def test_slow_queries_are_logged_with_plan(client, slow_queries, monkeypatch):
+    monkeypatch.setattr(database.settings, "slow_query_ms", 1e-6)
+
+    client.get("/rolls/", params={"weight_range": "2,5"})
+
+    record, = [r for r in slow_queries if r.statement.lstrip().startswith("SELECT")]
+    assert record.request == "GET /rolls/"
+    assert record.duration_ms > 0
+    assert any("ix_rolls_weight" in step for step in record.plan), record.plan
+
+    monkeypatch.setattr(database.settings, "slow_query_ms", 0)
+    slow_queries.clear()
+    client.get("/rolls/")
+    assert slow_queries == []
@@ -0,0 +1,70 @@
+import os
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+from app.main import app
+from internal.storage import database
+from internal.storage.migrations import migrate
+
+# Set SOAK_REQUESTS=100000 for the full soak run
+SOAK_REQUESTS = int(os.environ.get("SOAK_REQUESTS", 2_000))
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    url = f"sqlite:///{tmp_path / 'rolls.db'}"
+    engine = database.create_db_engine(url)
+    migrate(engine)
+    engine.dispose()
+    return url
+
+
+def test_sqlite_pragmas_applied(db_url):
+    engine = database.create_db_engine(db_url)
+    with engine.connect() as conn:
+        pragmas = {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+                   for name in ("journal_mode", "synchronous", "mmap_size", "cache_size")}
+    engine.dispose()
+
+    assert pragmas == {"journal_mode": "wal", "synchronous": 1,
+                       "mmap_size": database.settings.sqlite_mmap_size,
+                       "cache_size": database.settings.sqlite_cache_size}
+
+
+@pytest.mark.parametrize("storage_type", ["database_sync", "database"])
+def test_connections_stay_flat(db_url, storage_type, monkeypatch):
+    if storage_type == "database_sync":
+        engine = database.create_db_engine(db_url)
+        pool_engine = engine
+        monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine, autoflush=False))
+    else:
+        engine = database.create_async_db_engine(db_url)
+        pool_engine = engine.sync_engine
+        monkeypatch.setattr(database, "AsyncSessionLocal",
+                            async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False),
+                            raising=False)
+    monkeypatch.setattr(database.settings, "storage_type", storage_type)
+    connects = []
+    event.listen(pool_engine, "connect", lambda *args: connects.append(1))
+
+    checked_out = []
+    with TestClient(app) as client:
+        for i in range(SOAK_REQUESTS):
+            if i % 4 == 0:
+                response = client.post("/rolls/", json={"length": 10, "weight": 100})
+            elif i % 4 == 1:
+                response = client.get("/rolls/", params={"id_range": f"{i // 4},{i // 4 + 10}"})
+            elif i % 4 == 2:
+                response = client.delete(f"/rolls/{i // 4 + 1}")
+            else:
+                response = client.get("/rolls/stats/", params={
+                    "start_date": "2020-01-01T00:00:00", "end_date": "2100-01-01T00:00:00"})
+            assert response.status_code == 200, response.text
+            if i % 100 == 0:
+                checked_out.append(pool_engine.pool.checkedout())
+
+    assert set(checked_out) == {0}
+    assert len(connects) <= database.settings.db_pool_size
+    pool_engine.dispose()
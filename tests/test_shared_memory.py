@@ -0,0 +1,101 @@
+import multiprocessing
+import threading
+import uuid
+from datetime import datetime, timedelta, UTC
+import pytest
+from internal.models.schemas import RollCreate
+from internal.storage.shared_memory import SharedColumns, SharedInMemoryStorage
+
+
+@pytest.fixture
+def segment():
+    name = f"rolls-test-{uuid.uuid4().hex[:8]}"
+    columns = SharedColumns(name, 10_000)
+    try:
+        yield name
+    finally:
+        columns.unlink()
+
+
+def worker(name):
+    return SharedInMemoryStorage(SharedColumns(name, 10_000))
+
+
+def create_in_child(name, count, ids):
+    storage = worker(name)
+    for i in range(count):
+        ids.put(storage.create_roll(RollCreate(length=i + 1, weight=i + 1)).id)
+
+
+def test_workers_see_each_others_writes(segment):
+    first, second = worker(segment), worker(segment)
+    now = datetime.now(UTC)
+    window = (now - timedelta(days=1), now + timedelta(days=1))
+
+    first.create_rolls([RollCreate(length=i, weight=i * 10) for i in range(1, 6)])
+    assert second.get_stats(*window).total_added == 5
+    version = second.write_version()
+    assert first.write_version() == version
+
+    assert second.create_roll(RollCreate(length=6, weight=60)).id == 6
+    assert second.delete_roll(2).removed_at is not None
+    assert first.delete_roll(2) is None
+    first.remove_rolls(ids=[3, 4])
+
+    assert [r.id for r in first.get_rolls({"weight_range": "20,60"})] == [2, 3, 4, 5, 6]
+    assert [r.id for r in second.get_rolls({"removed_at_range": f"{window[0].isoformat()},{window[1].isoformat()}"})] \
+        == [2, 3, 4]
+    stats = second.get_stats(*window)
+    assert (stats.total_added, stats.total_removed, stats.total_weight) == (6, 3, 210)
+    assert first.get_inventory(datetime.now(UTC)).total_weight == 120
+    assert first.write_version() == second.write_version() != version
+
+
+def test_reads_do_not_wait_for_a_writer(segment):
+    first, second = worker(segment), worker(segment)
+    first.create_rolls([RollCreate(length=i, weight=i) for i in range(1, 4)])
+    assert len(second) == 3
+
+    # As if a writer of the second worker were queued on the first one's flock
+    finished = threading.Event()
+
+    def read():
+        assert [r.id for r in second.get_rolls({})] == [1, 2, 3]
+        assert len(second) == 3
+        finished.set()
+
+    with second._write_lock:
+        first.create_roll(RollCreate(length=4, weight=4))
+        reader = threading.Thread(target=read)
+        reader.start()
+        assert finished.wait(5)
+        reader.join()
+    assert len(second) == 4
+
+
+def test_writers_in_two_processes_get_dense_ids(segment):
+    context = multiprocessing.get_context("spawn")
+    ids = context.Queue()
+    child = context.Process(target=create_in_child, args=(segment, 200, ids))
+    child.start()
+    storage = worker(segment)
+    mine = [storage.create_roll(RollCreate(length=1, weight=1)).id for _ in range(200)]
+    theirs = [ids.get(timeout=60) for _ in range(200)]
+    child.join(timeout=60)
+
+    assert child.exitcode == 0
+    assert sorted(mine + theirs) == list(range(1, 401))
+    assert len(storage) == 400
+    assert [r.id for r in storage.get_rolls({"length_range": "1,1"})] == sorted(mine + theirs[:1])
+
+
+def test_full_segment_refuses_writes():
+    name = f"rolls-test-{uuid.uuid4().hex[:8]}"
+    storage = SharedInMemoryStorage(SharedColumns(name, 2))
+    try:
+        storage.create_roll(RollCreate(length=1, weight=1))
+        with pytest.raises(ValueError):
+            storage.create_rolls([RollCreate(length=1, weight=1)] * 2)
+        assert len(storage) == 1
+    finally:
+        storage._shared.unlink()
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta, UTC
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+from app.main import app
+from internal.metrics.metrics import STATS_CACHE_LOOKUPS
+from internal.models.schemas import RollCreate
+from internal.storage import database
+from internal.storage.in_memory_storage import InMemoryStorage
+from internal.storage.migrations import migrate
+from internal.storage.stats_cache import StatsCache
+from internal.storage.timestamps import to_us
+
+T0 = datetime(2024, 1, 1, tzinfo=UTC)
+HOUR = timedelta(hours=1)
+
+
+def test_writes_evict_only_windows_they_can_change():
+    cache = StatsCache("test", size=2)
+    for hours in (1, 2):
+        stats, generation = cache.get(T0, T0 + hours * HOUR)
+        assert stats is None
+        cache.put(T0, T0 + hours * HOUR, generation, hours)
+
+    cache.invalidate(to_us(T0 + 90 * timedelta(minutes=1)))
+    assert cache.get(T0, T0 + HOUR) == (1, 1)
+    assert cache.get(T0, T0 + 2 * HOUR) == (None, 1)
+
+    # Least recently used goes first
+    cache.put(T0, T0 + 3 * HOUR, 1, 3)
+    cache.put(T0, T0 + 4 * HOUR, 1, 4)
+    assert cache.get(T0, T0 + HOUR)[0] is None
+    assert cache.get(T0, T0 + 3 * HOUR)[0] == 3
+
+
+def test_results_computed_across_a_write_are_kept_only_if_it_missed_them():
+    cache = StatsCache("test", size=8)
+    _, generation = cache.get(T0, T0 + HOUR)
+    cache.invalidate(to_us(T0 + 2 * HOUR))
+    cache.put(T0, T0 + HOUR, generation, "past")
+    cache.put(T0, T0 + 3 * HOUR, generation, "stale")
+
+    assert cache.get(T0, T0 + HOUR)[0] == "past"
+    assert cache.get(T0, T0 + 3 * HOUR)[0] is None
+
+
+def test_in_memory_stats_are_cached_until_a_write_lands_in_the_window():
+    storage = InMemoryStorage()
+    storage.create_roll(RollCreate(length=1, weight=1))
+    now = datetime.now(UTC)
+    past, current = (now - 2 * HOUR, now - HOUR), (now - HOUR, now + HOUR)
+    hits = STATS_CACHE_LOOKUPS.value("in_memory", "hit")
+
+    assert storage.get_stats(*current).total_added == 1
+    assert storage.get_stats(*current).total_added == 1
+    assert storage.get_stats(*past).total_added == 0
+    storage.create_roll(RollCreate(length=2, weight=2))
+    storage.delete_roll(1)
+
+    stats = storage.get_stats(*current)
+    assert (stats.total_added, stats.total_removed) == (2, 1)
+    assert storage.get_stats(*past).total_added == 0
+    assert STATS_CACHE_LOOKUPS.value("in_memory", "hit") - hits == 2
+
+
+@pytest.mark.parametrize("storage_type", ["database_sync", "database"])
+def test_database_stats_cache_through_the_api(tmp_path, storage_type, monkeypatch):
+    monkeypatch.setattr(database.settings, "storage_type", storage_type)
+    url = f"sqlite:///{tmp_path / 'rolls.db'}"
+    engine = database.create_db_engine(url)
+    migrate(engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine, autoflush=False))
+    async_engine = database.create_async_db_engine(url)
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(bind=async_engine, expire_on_commit=False),
+                        raising=False)
+    now = datetime.now(UTC)
+    current = {"start_date": (now - HOUR).isoformat(), "end_date": (now + HOUR).isoformat()}
+    past = {"start_date": (now - 2 * HOUR).isoformat(), "end_date": (now - HOUR).isoformat()}
+    hits = STATS_CACHE_LOOKUPS.value("database", "hit")
+
+    with TestClient(app) as client:
+        client.post("/rolls/", json={"length": 1, "weight": 1})
+        assert client.get("/rolls/stats/", params=current).json()["total_added"] == 1
+        assert client.get("/rolls/stats/", params=past).json()["total_added"] == 0
+        client.post("/rolls/batch", json=[{"length": 2, "weight": 2}] * 2)
+        client.delete("/rolls/1")
+
+        stats = client.get("/rolls/stats/", params=current).json()
+        assert (stats["total_added"], stats["total_removed"]) == (3, 1)
+        assert client.get("/rolls/stats/", params=current).json() == stats
+        assert client.get("/rolls/stats/", params=past).json()["total_added"] == 0
+    engine.dispose()
+
+    assert STATS_CACHE_LOOKUPS.value("database", "hit") - hits == 2
+
+
+def test_version_is_withheld_while_a_write_is_in_progress():
+    cache = StatsCache("test", size=0)
+    before = cache.version
+    with cache.writing(0):
+        assert cache.version is None
+    assert cache.version not in (None, before)
+
+
+def test_version_moves_on_before_the_write_is_released(monkeypatch):
+    cache = StatsCache("test", size=0)
+    seen = []
+    bump = cache._invalidate
+
+    def invalidate(since):
+        # What a concurrent reader would be given at the moment of the bump
+        seen.append(cache.version)
+        bump(since)
+
+    monkeypatch.setattr(cache, "_invalidate", invalidate)
+    with cache.writing(0):
+        pass
+    assert seen == [None]
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from internal.models.schemas import RollCreate
+from internal.storage import crud, database
+from internal.storage.async_database_storage import AsyncDatabaseStorage
+from internal.storage.database_storage import DatabaseStorage
+from internal.storage.migrations import migrate
+from internal.storage.write_coalescer import WriteCoalescer
+
+CREATORS = 50
+
+
+def count_inserts(engine):
+    inserts = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO rolls "):
+            inserts.append(len(parameters) if executemany else 1)
+    return inserts
+
+
+def check(results, rolls):
+    assert sorted(r.id for r in results) == list(range(1, len(rolls) + 1))
+    assert [(r.length, r.weight) for r in results] == [(roll.length, roll.weight) for roll in rolls]
+    assert all(r.removed_at is None for r in results)
+
+
+@pytest.fixture
+def coalescing(monkeypatch):
+    monkeypatch.setattr(database.settings, "write_coalesce_ms", 50.0)
+    monkeypatch.setattr(database.settings, "write_coalesce_max_rolls", CREATORS)
+
+
+def test_concurrent_creates_share_a_transaction(tmp_path, coalescing):
+    engine = database.create_db_engine(f"sqlite:///{tmp_path / 'rolls.db'}")
+    migrate(engine)
+    sessions = sessionmaker(bind=engine, autoflush=False)
+    inserts = count_inserts(engine)
+    rolls = [RollCreate(length=i, weight=i * 10) for i in range(1, CREATORS + 1)]
+    results = [None] * CREATORS
+
+    def create(i):
+        with sessions() as db:
+            results[i] = DatabaseStorage(db).create_roll(rolls[i])
+
+    threads = [threading.Thread(target=create, args=(i,)) for i in range(CREATORS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    check(results, rolls)
+    assert sum(inserts) == CREATORS and len(inserts) < CREATORS / 5
+    with sessions() as db:
+        assert [r.id for r in DatabaseStorage(db).get_rolls({"weight_range": "100,120"})] == [10, 11, 12]
+    engine.dispose()
+
+
+def test_async_concurrent_creates_share_a_transaction(tmp_path, coalescing):
+    url = f"sqlite:///{tmp_path / 'rolls.db'}"
+    migrate(database.create_db_engine(url))
+    rolls = [RollCreate(length=i, weight=i * 10) for i in range(1, CREATORS + 1)]
+
+    async def run():
+        engine = database.create_async_db_engine(url)
+        inserts = count_inserts(engine.sync_engine)
+        sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+        async def create(roll):
+            async with sessions() as db:
+                return await AsyncDatabaseStorage(db).create_roll(roll)
+
+        results = await asyncio.gather(*map(create, rolls))
+        await engine.dispose()
+        return results, inserts
+
+    results, inserts = asyncio.run(run())
+    check(results, rolls)
+    # max_rolls closes the group without waiting out the window
+    assert inserts == [CREATORS]
+
+
+def test_failed_group_fails_every_caller(tmp_path, coalescing):
+    # No migration, so there is no rolls table
+    engine = database.create_db_engine(f"sqlite:///{tmp_path / 'rolls.db'}")
+    sessions = sessionmaker(bind=engine, autoflush=False)
+    errors = []
+
+    def create():
+        with sessions() as db:
+            try:
+                DatabaseStorage(db).create_roll(RollCreate(length=1, weight=1))
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=create) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 5
+    engine.dispose()
+
+
+def test_lone_create_does_not_wait_out_the_window(monkeypatch):
+    monkeypatch.setattr(database.settings, "write_coalesce_ms", 5_000.0)
+    monkeypatch.setattr(crud, "create_roll_group", lambda db, rolls: list(rolls))
+    coalescer = WriteCoalescer()
+    roll = RollCreate(length=1, weight=1)
+
+    started = time.perf_counter()
+    assert coalescer.create_roll(None, roll) is roll
+    assert time.perf_counter() - started < 1
+
+
+def test_interrupted_leader_releases_its_group(coalescing, monkeypatch):
+    class Interrupted(BaseException):
+        pass
+
+    monkeypatch.setattr(database.settings, "write_coalesce_ms", 500.0)
+    in_flight, release = threading.Event(), threading.Event()
+    groups = []
+
+    def create_roll_group(db, rolls):
+        groups.append(len(rolls))
+        if len(groups) == 1:
+            # Keeps the first group committing, so the next one gathers
+            in_flight.set()
+            release.wait(5)
+            return list(rolls)
+        raise Interrupted()
+
+    monkeypatch.setattr(crud, "create_roll_group", create_roll_group)
+    coalescer = WriteCoalescer()
+    outcomes = {}
+
+    def create(name):
+        try:
+            coalescer.create_roll(None, RollCreate(length=1, weight=1))
+            outcomes[name] = "created"
+        except Interrupted:
+            outcomes[name] = "interrupted"
+        except RuntimeError:
+            outcomes[name] = "released"
+
+    first = threading.Thread(target=create, args=("first",))
+    first.start()
+    assert in_flight.wait(5)
+    leader = threading.Thread(target=create, args=("leader",))
+    leader.start()
+    while coalescer._group is None:
+        time.sleep(0.001)
+    follower = threading.Thread(target=create, args=("follower",))
+    follower.start()
+    leader.join(5)
+    follower.join(5)
+    release.set()
+    first.join(5)
+
+    assert groups == [1, 2]
+    assert outcomes == {"first": "created", "leader": "interrupted", "follower": "released"}